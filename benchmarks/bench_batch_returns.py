@@ -0,0 +1,69 @@
+"""
+Benchmark calculating the returns of many portfolios with the batch functions, against
+calling each ReturnCalculator once per portfolio.
+
+Usage:
+    python benchmarks/bench_batch_returns.py [n_portfolios] [n_snapshots]
+"""
+import sys
+import time
+
+import numpy as np
+
+from portfolio_manager.batch import (PackedHistories, modified_dietz_returns,
+                                     money_weighted_returns, simple_returns,
+                                     time_weighted_returns)
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (ModifiedDietzReturnCalculator,
+                                                  MoneyWeightedReturnCalculator,
+                                                  ReturnCalculator,
+                                                  SimpleReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+
+
+def make_portfolios(n_portfolios: int, n_snapshots: int):
+    """ Portfolios with a deposit every 10 snapshots and value updates in between. """
+    rng = np.random.default_rng(0)
+    is_deposit = np.arange(n_snapshots) % 10 == 0
+    portfolios = []
+    for _ in range(n_portfolios):
+        values = 100.0 * np.cumsum(is_deposit) * rng.uniform(0.95, 1.1, n_snapshots)
+        portfolios.append(InvestmentPortfolio.from_records({
+            'date': np.datetime64('2000-01-01') + np.arange(n_snapshots),
+            'transaction_type': np.where(is_deposit, 'deposit',
+                                         'update_portfolio_value'),
+            'amount': np.where(is_deposit, 100.0, np.nan),
+            'value': np.where(is_deposit, np.nan, values)
+        }))
+    return portfolios
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(n_portfolios: int = 10_000, n_snapshots: int = 100):
+    portfolios = make_portfolios(n_portfolios, n_snapshots)
+    ReturnCalculator.set_cache_size(0)
+
+    packing = timed(PackedHistories.from_portfolios, portfolios)
+    packed = PackedHistories.from_portfolios(portfolios)
+    print(f'{n_portfolios} portfolios x {n_snapshots} snapshots, packed in '
+          f'{packing * 1e3:.1f}ms')
+
+    for batch_function, calculator in [
+            (simple_returns, SimpleReturnCalculator()),
+            (time_weighted_returns, TimeWeightedReturnCalculator()),
+            (money_weighted_returns, MoneyWeightedReturnCalculator()),
+            (modified_dietz_returns, ModifiedDietzReturnCalculator())]:
+        batch = timed(batch_function, packed)
+        one_at_a_time = timed(lambda: [calculator.calculate_return(portfolio)
+                                       for portfolio in portfolios])
+        print(f'{type(calculator).__name__}: batch {batch * 1e3:.1f}ms, '
+              f'one at a time {one_at_a_time * 1e3:.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,37 @@
+"""
+Benchmark opening a large portfolio and reading its latest value and time-weighted
+return, from a pickle against from the memory-mapped binary history format.
+
+Usage:
+    python benchmarks/bench_binary_history.py [n_snapshots]
+"""
+import sys
+import tempfile
+import time
+
+from bench_time_weighted_return import make_portfolio
+from portfolio_manager.portfolio import load_portfolio
+from portfolio_manager.return_calculators import TimeWeightedReturnCalculator
+
+
+def open_and_read(name: str, directory: str) -> float:
+    start = time.perf_counter()
+    portfolio = load_portfolio(name, directory)
+    portfolio.current_portfolio_value
+    TimeWeightedReturnCalculator().calculate_return(portfolio)
+    return time.perf_counter() - start
+
+
+def main(n_snapshots: int = 1_000_000):
+    portfolio = make_portfolio(n_snapshots)
+    with tempfile.TemporaryDirectory() as directory:
+        portfolio.save_portfolio(directory)
+        portfolio.save_portfolio(directory, binary=True)
+        pickled = open_and_read(f'{portfolio.name}.pkl', directory)
+        binary = open_and_read(f'{portfolio.name}.pmh', directory)
+    print(f'{n_snapshots} snapshots: pickle {pickled * 1e3:.1f}ms, '
+          f'binary {binary * 1e3:.1f}ms ({pickled / binary:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
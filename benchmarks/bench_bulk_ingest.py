@@ -0,0 +1,43 @@
+"""
+Benchmark rebuilding a portfolio from a table of transactions in one step, using
+InvestmentPortfolio.from_records.
+
+Usage:
+    python benchmarks/bench_bulk_ingest.py [n_transactions]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+def make_records(n_transactions: int) -> pd.DataFrame:
+    """ Synthetic broker export: monthly deposits with daily valuations in between. """
+    rng = np.random.default_rng(0)
+    is_deposit = np.arange(n_transactions) % 30 == 0
+    total_deposited = 100.0 * np.cumsum(is_deposit)
+    values = total_deposited * rng.uniform(1.0, 1.2, n_transactions)
+    return pd.DataFrame({
+        'date': pd.date_range('1900-01-01', periods=n_transactions, freq='h'),
+        'transaction_type': np.where(is_deposit, 'deposit', 'update_portfolio_value'),
+        'amount': np.where(is_deposit, 100.0, np.nan),
+        'value': np.where(is_deposit, np.nan, values)
+    })
+
+
+def main(n_transactions: int = 500_000):
+    records = make_records(n_transactions)
+
+    start = time.perf_counter()
+    portfolio = InvestmentPortfolio.from_records(records)
+    elapsed = time.perf_counter() - start
+
+    print(f'{n_transactions} transactions -> {len(portfolio.history)} snapshots '
+          f'in {elapsed:.3f}s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
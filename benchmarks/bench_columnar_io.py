@@ -0,0 +1,51 @@
+"""
+Benchmark exporting many portfolio histories to Parquet, against converting each
+portfolio_history to a DataFrame and writing it one portfolio at a time, and reading
+back one portfolio with a filter against reading the whole file.
+
+Usage:
+    python benchmarks/bench_columnar_io.py [n_portfolios] [n_snapshots]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from bench_batch_returns import make_portfolios
+from portfolio_manager.columnar_io import read_packed_histories, write_histories
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(n_portfolios: int = 1_000, n_snapshots: int = 1_000):
+    portfolios = make_portfolios(n_portfolios, n_snapshots)
+    for i, portfolio in enumerate(portfolios):
+        portfolio.name = f'portfolio_{i}'
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'histories.parquet')
+
+        def write_with_pandas():
+            for portfolio in portfolios:
+                pd.DataFrame(portfolio.portfolio_history).to_parquet(
+                    os.path.join(directory, f'{portfolio.name}.parquet'))
+
+        written = timed(write_histories, portfolios, path)
+        print(f'{n_portfolios} portfolios x {n_snapshots} snapshots')
+        print(f'Write: write_histories {written * 1e3:.0f}ms, '
+              f'pandas per portfolio {timed(write_with_pandas) * 1e3:.0f}ms')
+
+        everything = timed(read_packed_histories, path)
+        one = timed(read_packed_histories, path, ['portfolio_500'])
+        print(f'Read: everything {everything * 1e3:.0f}ms, '
+              f'one portfolio with a filter {one * 1e3:.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
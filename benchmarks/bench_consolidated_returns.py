@@ -0,0 +1,86 @@
+"""
+Benchmark the time-weighted return of a household's combined portfolios with
+ConsolidatedPortfolio, against concatenating the members' portfolio_history lists,
+re-sorting them and recomputing the running totals by hand. Also times streaming the
+merge with ConsolidatedPortfolio.snapshots.
+
+Usage:
+    python benchmarks/bench_consolidated_returns.py [n_members] [n_snapshots]
+"""
+import sys
+import time
+
+import numpy as np
+
+from portfolio_manager.consolidated import ConsolidatedPortfolio
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (ReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+
+
+def make_member(n_snapshots: int, seed: int) -> InvestmentPortfolio:
+    """ A member with a snapshot most days: mostly value updates, some deposits. """
+    rng = np.random.default_rng(seed)
+    transaction_types = rng.choice(['deposit', 'update_portfolio_value'], n_snapshots,
+                                   p=[0.1, 0.9])
+    transaction_types[0] = 'deposit'
+    values = 10.0 * np.arange(1, n_snapshots + 1) * rng.uniform(0.9, 1.1, n_snapshots)
+    return InvestmentPortfolio.from_records({
+        'date': np.datetime64('1900-01-01') + np.cumsum(rng.integers(1, 3,
+                                                                     n_snapshots)),
+        'transaction_type': transaction_types,
+        'amount': np.full(n_snapshots, 100.0),
+        'value': np.where(transaction_types == 'deposit', np.nan, values)
+    }, name=f'member_{seed}')
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def by_hand(members: list) -> float:
+    """ Concatenate and re-sort the snapshot lists, and recompute the running totals. """
+    tagged = sorted(((snapshot['date'], i, snapshot)
+                     for i, member in enumerate(members)
+                     for snapshot in member.portfolio_history),
+                    key=lambda item: item[:2])
+    latest = [(0.0, 0.0)] * len(members)
+    snapshots = []
+    for date, i, snapshot in tagged:
+        latest[i] = (snapshot['total_deposited'], snapshot['current_portfolio_value'])
+        snapshots.append({'date': date,
+                          'total_deposited': sum(total for total, _ in latest),
+                          'current_portfolio_value': sum(value for _, value in latest),
+                          'transaction_type': snapshot['transaction_type']})
+    combined = InvestmentPortfolio(portfolio_history=snapshots)
+    return TimeWeightedReturnCalculator().calculate_return(combined)
+
+
+def consolidated(members: list) -> float:
+    return TimeWeightedReturnCalculator().calculate_return(
+        ConsolidatedPortfolio(members))
+
+
+def streamed(members: list):
+    for _ in ConsolidatedPortfolio(members).snapshots():
+        pass
+
+
+def main(n_members: int = 3, n_snapshots: int = 100_000):
+    members = [make_member(n_snapshots, seed) for seed in range(n_members)]
+    ReturnCalculator.set_cache_size(0)
+    assert abs(by_hand(members) - consolidated(members)) < 0.011
+
+    merged = timed(consolidated, members)
+    hand = timed(by_hand, members)
+    stream = timed(streamed, members)
+    print(f'{n_members} members x {n_snapshots} snapshots: ConsolidatedPortfolio '
+          f'{merged * 1e3:.0f}ms, by hand {hand * 1e3:.0f}ms '
+          f'({hand / merged:.1f}x faster), streaming the snapshots '
+          f'{stream * 1e3:.0f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,39 @@
+"""
+Benchmark the time taken to build up a portfolio history one transaction at a time.
+
+Each run makes an initial deposit followed by daily value updates, so the history grows
+by one snapshot per call. Ingest time should grow linearly with the number of snapshots.
+
+Usage:
+    python benchmarks/bench_history_ingest.py [max_power_of_ten]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+def ingest(n_snapshots: int) -> float:
+    """ Record n_snapshots snapshots in a new portfolio, returning the time taken. """
+    portfolio = InvestmentPortfolio(name='benchmark')
+    start_date = datetime(2000, 1, 1)
+    dates = [start_date + timedelta(minutes=i) for i in range(n_snapshots)]
+
+    start = time.perf_counter()
+    portfolio.deposit(100, date=dates[0])
+    for i, date in enumerate(dates[1:], start=1):
+        portfolio.update_portfolio_value(100 + i % 50, date=date)
+    return time.perf_counter() - start
+
+
+def main(max_power: int = 6):
+    print(f'{"snapshots":>10} {"seconds":>10} {"us/snapshot":>12}')
+    for power in range(3, max_power + 1):
+        n_snapshots = 10 ** power
+        elapsed = ingest(n_snapshots)
+        print(f'{n_snapshots:>10} {elapsed:>10.3f} {elapsed / n_snapshots * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
@@ -0,0 +1,57 @@
+"""
+Benchmark revaluing many portfolios from one vector of prices with Holdings.revalue,
+against valuing each portfolio's positions separately and calling
+update_portfolio_value on each.
+
+Usage:
+    python benchmarks/bench_holdings_revaluation.py [n_portfolios] [n_assets]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from portfolio_manager.holdings import Holdings
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+def make_holdings(n_portfolios: int, n_assets: int) -> Holdings:
+    rng = np.random.default_rng(0)
+    portfolios = []
+    for i in range(n_portfolios):
+        portfolio = InvestmentPortfolio(name=f'portfolio_{i}')
+        portfolio.deposit(1000, date=datetime(2021, 1, 1))
+        portfolios.append(portfolio)
+    quantities = rng.uniform(0, 10, (n_portfolios, n_assets))
+    return Holdings(portfolios, [f'asset_{i}' for i in range(n_assets)], quantities)
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def one_at_a_time(holdings: Holdings, prices: np.ndarray, dates: list):
+    """ Value each portfolio's positions on each date, and update them one by one. """
+    for date, date_prices in zip(dates, prices):
+        for portfolio, quantities in zip(holdings.portfolios, holdings.quantities):
+            portfolio.update_portfolio_value(float(quantities @ date_prices), date)
+
+
+def main(n_portfolios: int = 20_000, n_assets: int = 500):
+    rng = np.random.default_rng(1)
+    for n_dates in (1, 30):
+        dates = [datetime(2021, 1, 2) + timedelta(days=day) for day in range(n_dates)]
+        prices = rng.uniform(1, 100, (n_dates, n_assets))
+        revalue = timed(make_holdings(n_portfolios, n_assets).revalue, prices, dates)
+        separately = timed(one_at_a_time, make_holdings(n_portfolios, n_assets), prices,
+                           dates)
+        print(f'{n_portfolios} portfolios x {n_assets} assets, {n_dates} day(s) of '
+              f'prices: revalue {revalue * 1e3:.0f}ms, one portfolio at a time '
+              f'{separately * 1e3:.0f}ms ({separately / revalue:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,33 @@
+"""
+Benchmark the time to import the return calculators in a fresh interpreter, against
+also importing pandas, as the return calculators used to.
+
+Usage:
+    python benchmarks/bench_import_time.py [repeats]
+"""
+import os
+import subprocess
+import sys
+
+
+def import_time(statement: str, repeats: int) -> float:
+    """ The best time to run an import statement in a fresh interpreter. """
+    script = (f'import time\nstart = time.perf_counter()\n{statement}\n'
+              f'print(time.perf_counter() - start)')
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return min(float(subprocess.run([sys.executable, '-c', script], env=environment,
+                                    check=True, stdout=subprocess.PIPE,
+                                    universal_newlines=True).stdout)
+               for _ in range(repeats))
+
+
+def main(repeats: int = 10):
+    lazy = import_time('import portfolio_manager.return_calculators', repeats)
+    eager = import_time('import pandas\nimport portfolio_manager.return_calculators',
+                        repeats)
+    print(f'Importing the return calculators: {lazy * 1e3:.0f}ms, '
+          f'with pandas {eager * 1e3:.0f}ms ({eager / lazy:.1f}x slower)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,41 @@
+"""
+Benchmark saving a portfolio after every transaction, by pickling the whole portfolio
+each time against appending to a journal.
+
+Usage:
+    python benchmarks/bench_journal.py [n_existing_snapshots] [n_transactions]
+"""
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from bench_time_weighted_return import make_portfolio
+from portfolio_manager.history import from_epoch
+
+
+def save_after_each_transaction(n_existing_snapshots: int, n_transactions: int,
+                                journal: bool) -> float:
+    portfolio = make_portfolio(n_existing_snapshots)
+    latest_date = from_epoch(portfolio.history.dates[-1])
+    with tempfile.TemporaryDirectory() as directory:
+        portfolio.save_portfolio(directory, journal=journal)
+        start = time.perf_counter()
+        for day in range(1, n_transactions + 1):
+            portfolio.update_portfolio_value(portfolio.current_portfolio_value + 1,
+                                             date=latest_date + timedelta(days=day))
+            portfolio.save_portfolio(directory, journal=journal)
+        portfolio.close_journal()
+        return time.perf_counter() - start
+
+
+def main(n_existing_snapshots: int = 100_000, n_transactions: int = 1_000):
+    pickled = save_after_each_transaction(n_existing_snapshots, n_transactions, False)
+    journaled = save_after_each_transaction(n_existing_snapshots, n_transactions, True)
+    print(f'{n_transactions} saves of a {n_existing_snapshots} snapshot portfolio: '
+          f'pickle {pickled * 1e3:.0f}ms, journal {journaled * 1e3:.0f}ms '
+          f'({pickled / journaled:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
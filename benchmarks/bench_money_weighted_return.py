@@ -0,0 +1,48 @@
+"""
+Benchmark solving the money-weighted return of many portfolios at once with xirr,
+against solving them one at a time with numpy_financial.irr (if it is installed).
+
+Usage:
+    python benchmarks/bench_money_weighted_return.py [n_portfolios] [n_cash_flows]
+"""
+import sys
+import time
+
+import numpy as np
+
+from portfolio_manager.solvers import xirr
+
+
+def make_cash_flows(n_portfolios: int, n_cash_flows: int):
+    """ Regular deposits into each portfolio, followed by a final withdrawal. """
+    rng = np.random.default_rng(0)
+    cash_flows = -rng.uniform(50, 150, (n_portfolios, n_cash_flows))
+    cash_flows[:, -1] = -cash_flows[:, :-1].sum(axis=1) * rng.uniform(0.8, 1.5,
+                                                                      n_portfolios)
+    times = np.cumsum(rng.uniform(0, 0.1, (n_portfolios, n_cash_flows)), axis=1)
+    offsets = np.arange(n_portfolios) * n_cash_flows
+    return cash_flows, times, offsets
+
+
+def main(n_portfolios: int = 10_000, n_cash_flows: int = 24):
+    cash_flows, times, offsets = make_cash_flows(n_portfolios, n_cash_flows)
+
+    start = time.perf_counter()
+    xirr(cash_flows.ravel(), times.ravel(), offsets)
+    elapsed = time.perf_counter() - start
+    print(f'xirr: {n_portfolios} portfolios x {n_cash_flows} cash flows in '
+          f'{elapsed * 1e3:.1f}ms')
+
+    try:
+        from numpy_financial import irr
+    except ImportError:
+        return
+    start = time.perf_counter()
+    for portfolio_cash_flows in cash_flows:
+        irr(portfolio_cash_flows)
+    elapsed = time.perf_counter() - start
+    print(f'numpy_financial.irr (equally spaced, one at a time): {elapsed * 1e3:.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
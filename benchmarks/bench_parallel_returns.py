@@ -0,0 +1,49 @@
+"""
+Benchmark ParallelReturnEngine with an increasing number of worker processes, against
+calculating the returns of every portfolio in one process with the batch functions.
+Times 1, 2, 4, ... workers up to max_workers (by default the number of CPUs, and at
+least 4), so the speedup levels off once there are more workers than CPUs.
+
+Usage:
+    python benchmarks/bench_parallel_returns.py [n_portfolios] [n_snapshots] [max_workers]
+"""
+import os
+import sys
+import time
+
+from bench_batch_returns import make_portfolios
+from portfolio_manager.batch import (PackedHistories, money_weighted_returns,
+                                     time_weighted_returns)
+from portfolio_manager.parallel import ParallelReturnEngine
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(n_portfolios: int = 20_000, n_snapshots: int = 100, max_workers: int = None):
+    if max_workers is None:
+        max_workers = max(os.cpu_count() or 1, 4)
+    packed = PackedHistories.from_portfolios(make_portfolios(n_portfolios, n_snapshots))
+    print(f'{n_portfolios} portfolios x {n_snapshots} snapshots, '
+          f'{os.cpu_count()} CPUs')
+
+    for batch_function in (time_weighted_returns, money_weighted_returns):
+        single = timed(batch_function, packed)
+        print(f'{batch_function.__name__}: single process {single * 1e3:.1f}ms')
+
+        workers = 1
+        while workers <= max_workers:
+            with ParallelReturnEngine(workers, chunk_size=1000) as engine:
+                # Start the worker processes before timing
+                engine.calculate(batch_function, packed)
+                parallel = timed(engine.calculate, batch_function, packed)
+            print(f'  {workers} workers: {parallel * 1e3:.1f}ms '
+                  f'({single / parallel:.1f}x)')
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
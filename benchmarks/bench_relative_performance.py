@@ -0,0 +1,68 @@
+"""
+Benchmark comparing many portfolios against one benchmark series with
+batch_relative_performance, against looking up the benchmark price for each snapshot
+by hand and calculating each portfolio's excess return and tracking error in a loop.
+
+Usage:
+    python benchmarks/bench_relative_performance.py [n_portfolios] [n_snapshots]
+"""
+import bisect
+import sys
+import time
+
+import numpy as np
+
+from portfolio_manager.batch import PackedHistories
+from portfolio_manager.relative_performance import (BenchmarkSeries,
+                                                    batch_relative_performance)
+
+from bench_batch_returns import make_portfolios
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def by_hand(portfolios: list, benchmark_dates: list, benchmark_prices: list):
+    """ One benchmark lookup per snapshot, then each portfolio's metrics in turn. """
+    performance = []
+    for portfolio in portfolios:
+        snapshots = portfolio.portfolio_history
+        prices = [benchmark_prices[bisect.bisect_right(benchmark_dates,
+                                                       snapshot['date']) - 1]
+                  for snapshot in snapshots]
+        active_returns, growth, benchmark_growth = [], 1.0, 1.0
+        for i in range(1, len(snapshots)):
+            if snapshots[i]['total_deposited'] != snapshots[i - 1]['total_deposited']:
+                continue
+            period_return = (snapshots[i]['current_portfolio_value']
+                             / snapshots[i - 1]['current_portfolio_value'] - 1)
+            benchmark_return = prices[i] / prices[i - 1] - 1
+            growth *= 1 + period_return
+            benchmark_growth *= 1 + benchmark_return
+            active_returns.append(period_return - benchmark_return)
+        performance.append(((growth - benchmark_growth) * 100,
+                            np.std(active_returns, ddof=1) * 100))
+    return performance
+
+
+def main(n_portfolios: int = 1_000, n_snapshots: int = 1_000):
+    portfolios = make_portfolios(n_portfolios, n_snapshots)
+    rng = np.random.default_rng(1)
+    dates = np.datetime64('1999-01-01') + np.arange(n_snapshots + 365)
+    benchmark = BenchmarkSeries(dates, np.cumprod(rng.uniform(0.98, 1.02, len(dates))),
+                                name='index')
+
+    packed = PackedHistories.from_portfolios(portfolios)
+    batch = timed(batch_relative_performance, packed, benchmark)
+    hand = timed(by_hand, portfolios, dates.astype('datetime64[us]').tolist(),
+                 benchmark.prices.tolist())
+    print(f'{n_portfolios} portfolios x {n_snapshots} snapshots against a benchmark of '
+          f'{len(benchmark)} prices: batch {batch * 1e3:.1f}ms, by hand '
+          f'{hand * 1e3:.0f}ms ({hand / batch:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,59 @@
+"""
+Benchmark the risk metrics: batch_risk_metrics over many portfolios against
+calculate_risk_metrics one portfolio at a time, and a RiskTracker kept up to date through
+100 valuations against recalculating the metrics after each one.
+
+Usage:
+    python benchmarks/bench_risk_metrics.py [n_portfolios] [n_snapshots]
+"""
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from portfolio_manager.batch import PackedHistories
+from portfolio_manager.risk_metrics import (RiskTracker, batch_risk_metrics,
+                                            calculate_risk_metrics)
+
+from bench_batch_returns import make_portfolios
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def track(portfolio, values: np.ndarray, recalculate: bool):
+    """ Record each valuation a minute apart, reading the metrics after each one. """
+    tracker = RiskTracker(portfolio)
+    date = portfolio.latest_transaction_date
+    for value in values:
+        date += timedelta(minutes=1)
+        portfolio.update_portfolio_value(value, date=date)
+        if recalculate:
+            calculate_risk_metrics(portfolio)
+        else:
+            tracker.metrics
+
+
+def main(n_portfolios: int = 10_000, n_snapshots: int = 100):
+    portfolios = make_portfolios(n_portfolios, n_snapshots)
+    packed = PackedHistories.from_portfolios(portfolios)
+    batch = timed(batch_risk_metrics, packed)
+    one_at_a_time = timed(lambda: [calculate_risk_metrics(portfolio)
+                                   for portfolio in portfolios])
+    print(f'{n_portfolios} portfolios x {n_snapshots} snapshots: batch '
+          f'{batch * 1e3:.1f}ms, one at a time {one_at_a_time * 1e3:.1f}ms')
+
+    long_history = make_portfolios(1, 1_000_000)
+    values = np.random.default_rng(1).uniform(1e7, 1.1e7, 100)
+    tracked = timed(track, long_history[0], values, False)
+    recalculated = timed(track, make_portfolios(1, 1_000_000)[0], values, True)
+    print(f'{len(values)} valuations of a portfolio with 10^6 snapshots: RiskTracker '
+          f'{tracked * 1e3:.0f}ms, recalculating each time {recalculated * 1e3:.0f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
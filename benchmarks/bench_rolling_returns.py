@@ -0,0 +1,55 @@
+"""
+Benchmark RollingReturns against calculating the time-weighted return of each window
+separately, by slicing the portfolio history and calling TimeWeightedReturnCalculator
+once per window.
+
+Usage:
+    python benchmarks/bench_rolling_returns.py [n_snapshots]
+"""
+import sys
+import time
+
+from bench_time_weighted_return import make_portfolio
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (ReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+from portfolio_manager.rolling import ONE_MONTH, ONE_YEAR, THREE_YEARS, RollingReturns
+
+
+def windowed_returns(portfolio: InvestmentPortfolio, window_days: int) -> list:
+    """ The time-weighted return of each window, calculated one window at a time. """
+    calculator = TimeWeightedReturnCalculator()
+    snapshots = portfolio.portfolio_history
+    returns = []
+    for end in range(window_days, len(snapshots)):
+        window = InvestmentPortfolio(portfolio_history=snapshots[end - window_days:end + 1])
+        returns.append(calculator.calculate_return(window, annualised=False))
+    return returns
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main(n_snapshots: int = 5_000):
+    # One snapshot per day
+    portfolio = make_portfolio(n_snapshots)
+    ReturnCalculator.set_cache_size(0)
+
+    def rolling_returns():
+        rolling = RollingReturns(portfolio)
+        return [rolling.time_weighted_returns(window)
+                for window in (ONE_MONTH, ONE_YEAR, THREE_YEARS)]
+
+    rolling = timed(rolling_returns)
+    one_at_a_time = timed(lambda: [windowed_returns(portfolio, days)
+                                   for days in (30, 365, 3 * 365)])
+    print(f'{n_snapshots} snapshots, 1M/1Y/3Y windows: rolling {rolling * 1e3:.1f}ms, '
+          f'one window at a time {one_at_a_time * 1e3:.0f}ms '
+          f'({one_at_a_time / rolling:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
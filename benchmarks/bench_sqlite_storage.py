@@ -0,0 +1,54 @@
+"""
+Benchmark saving many portfolios to an SQLiteStorage against pickling each one to its
+own file, then saving each again after one more transaction.
+
+Usage:
+    python benchmarks/bench_sqlite_storage.py [n_portfolios] [n_snapshots]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from bench_batch_returns import make_portfolios
+from portfolio_manager.storage import SQLiteStorage
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def add_transaction(portfolios):
+    for portfolio in portfolios:
+        portfolio.update_portfolio_value(
+            portfolio.current_portfolio_value + 1,
+            date=portfolio.latest_transaction_date + timedelta(days=1))
+
+
+def main(n_portfolios: int = 2_000, n_snapshots: int = 1_000):
+    portfolios = make_portfolios(n_portfolios, n_snapshots)
+    for i, portfolio in enumerate(portfolios):
+        portfolio.name = f'portfolio_{i}'
+
+    with tempfile.TemporaryDirectory() as directory:
+        def save_pickles():
+            for portfolio in portfolios:
+                portfolio.save_portfolio(directory)
+
+        with SQLiteStorage(os.path.join(directory, 'portfolios.db')) as storage:
+            print(f'{n_portfolios} portfolios x {n_snapshots} snapshots')
+            print(f'Initial save: pickles {timed(save_pickles) * 1e3:.0f}ms, '
+                  f'sqlite {timed(storage.save_many, portfolios) * 1e3:.0f}ms')
+
+            add_transaction(portfolios)
+            pickled = timed(save_pickles)
+            sqlite = timed(lambda: [storage.save(portfolio) for portfolio in portfolios])
+            print(f'Save one new snapshot each: pickles {pickled * 1e3:.0f}ms, '
+                  f'sqlite {sqlite * 1e3:.0f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
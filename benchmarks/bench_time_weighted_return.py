@@ -0,0 +1,78 @@
+"""
+Benchmark TimeWeightedReturnCalculator against the original implementation, which
+grouped a DataFrame of the history into sub-periods and looped over the groups. The
+calculator now reads the time-weighted return maintained by the portfolio history, so
+its cost doesn't depend on the number of snapshots. The result cache is disabled while
+timing the calculation, and cache hits are timed separately.
+
+Usage:
+    python benchmarks/bench_time_weighted_return.py [n_snapshots]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (ReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+
+
+def grouped_time_weighted_return(portfolio: InvestmentPortfolio) -> float:
+    """ The original per-group implementation, kept here for comparison. """
+    sub_period_returns = []
+    df = pd.DataFrame(portfolio.portfolio_history)
+    is_new_period_ser = pd.Series(
+        df['total_deposited'].shift() != df['total_deposited'])
+    for _, data in df.groupby(is_new_period_ser.cumsum()):
+        sub_period_data = pd.DataFrame(data)
+        start_value = sub_period_data['current_portfolio_value'].values[0]
+        end_value = sub_period_data['current_portfolio_value'].values[-1]
+        sub_period_returns.append((end_value - start_value) / start_value + 1)
+    return round((np.prod(sub_period_returns) - 1) * 100, 2)
+
+
+def make_portfolio(n_snapshots: int) -> InvestmentPortfolio:
+    """ A portfolio with a deposit every 10 snapshots and value updates in between. """
+    rng = np.random.default_rng(0)
+    is_deposit = np.arange(n_snapshots) % 10 == 0
+    values = 100.0 * np.cumsum(is_deposit) * rng.uniform(0.99, 1.02, n_snapshots)
+    return InvestmentPortfolio.from_records({
+        'date': np.datetime64('1900-01-01') + np.arange(n_snapshots),
+        'transaction_type': np.where(is_deposit, 'deposit', 'update_portfolio_value'),
+        'amount': np.where(is_deposit, 100.0, np.nan),
+        'value': np.where(is_deposit, np.nan, values)
+    })
+
+
+def best_of(function, *args, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_snapshots: int = 100_000):
+    portfolio = make_portfolio(n_snapshots)
+    calculator = TimeWeightedReturnCalculator()
+    assert (calculator.calculate_return(portfolio, annualised=False)
+            == grouped_time_weighted_return(portfolio))
+
+    # Measure the calculation itself, rather than the result cache
+    cache_size = ReturnCalculator.cache_info().maxsize
+    ReturnCalculator.set_cache_size(0)
+    calculated = best_of(calculator.calculate_return, portfolio, False)
+    ReturnCalculator.set_cache_size(cache_size)
+    cached = best_of(calculator.calculate_return, portfolio, False)
+
+    grouped = best_of(grouped_time_weighted_return, portfolio)
+    print(f'{n_snapshots} snapshots: calculator {calculated * 1e3:.3f}ms, '
+          f'grouped {grouped * 1e3:.2f}ms ({grouped / calculated:.0f}x faster), '
+          f'cache hit {cached * 1e3:.4f}ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
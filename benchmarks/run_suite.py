@@ -0,0 +1,159 @@
+"""
+Run the benchmark suite in benchmarks/suite without asv, recording the time of each
+time_* benchmark, the time of the code returned by each timeraw_* benchmark in a fresh
+interpreter, and the peak memory allocated by each peakmem_* benchmark, and optionally
+compare the results against a previous run to catch regressions.
+
+The suite follows asv's conventions, so with asv installed it can also be run with
+`asv run`, using asv.conf.json in the repository root. asv measures peak memory as the
+peak resident size of the whole process; this runner measures the peak of memory
+allocated during the benchmark call itself, with tracemalloc.
+
+Usage:
+    python benchmarks/run_suite.py [--filter REGEX] [--max-snapshots N]
+                                   [--output results.json] [--compare baseline.json]
+                                   [--threshold 1.5]
+"""
+import argparse
+import importlib
+import itertools
+import json
+import pkgutil
+import os
+import re
+import subprocess
+import sys
+import textwrap
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import suite  # noqa: E402
+
+BENCHMARK_PREFIXES = ('time_', 'timeraw_', 'peakmem_')
+
+# The number of fresh interpreters each timeraw_* benchmark is timed in
+RAW_REPEATS = 5
+
+# Peak memory increases smaller than this are noise, however large relative to baseline
+MIN_MEMORY_REGRESSION = 2 ** 20
+
+
+def discover(pattern: str = None):
+    """ Yield (name, class, method name) for each benchmark in the suite. """
+    for module_info in pkgutil.iter_modules(suite.__path__):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module(f'suite.{module_info.name}')
+        for class_name, cls in vars(module).items():
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for method_name in dir(cls):
+                name = f'{module_info.name}.{class_name}.{method_name}'
+                if (method_name.startswith(BENCHMARK_PREFIXES)
+                        and (pattern is None or re.search(pattern, name))):
+                    yield name, cls, method_name
+
+
+def parameter_sets(cls, max_snapshots: int = None):
+    """ Every combination of the benchmark's parameters, as asv runs them. """
+    params = getattr(cls, 'params', [])
+    if params and not isinstance(params[0], list):
+        params = [params]
+    names = getattr(cls, 'param_names', [])
+    for values in itertools.product(*params):
+        arguments = dict(zip(names, values))
+        if max_snapshots is None or arguments.get('n_snapshots', 0) <= max_snapshots:
+            yield values
+
+
+def run(cls, method_name: str, values: tuple) -> float:
+    """
+    Run one benchmark, returning the best time per call in seconds for time_* and
+    timeraw_* benchmarks, or the peak bytes allocated for peakmem_* benchmarks.
+    """
+    instance = cls()
+    if hasattr(instance, 'setup'):
+        instance.setup(*values)
+    try:
+        method = getattr(instance, method_name)
+        if method_name.startswith('peakmem_'):
+            tracemalloc.start()
+            try:
+                method(*values)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        if method_name.startswith('timeraw_'):
+            return min(run_raw(method(*values)) for _ in range(RAW_REPEATS))
+
+        timer = timeit.Timer(lambda: method(*values))
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat=5, number=number)) / number
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*values)
+
+
+def run_raw(code: str) -> float:
+    """ Time running `code` once in a fresh interpreter, excluding its startup. """
+    script = (f'import time\nstart = time.perf_counter()\n'
+              f'exec({textwrap.dedent(code)!r})\nprint(time.perf_counter() - start)')
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', script], env=environment, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return float(output)
+
+
+def format_result(method_name: str, result: float) -> str:
+    if method_name.startswith('peakmem_'):
+        return f'{result / 2 ** 20:.2f} MiB'
+    return f'{result * 1e6:.1f} us' if result < 1e-3 else f'{result * 1e3:.2f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filter', help='Only run benchmarks matching this regex.')
+    parser.add_argument('--max-snapshots', type=int,
+                        help='Skip benchmarks of histories larger than this.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--compare', help='Compare against results saved by --output.')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='Report a regression when a result is this many times '
+                             'the baseline.')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+
+    results = {}
+    regressions = []
+    for name, cls, method_name in discover(args.filter):
+        for values in parameter_sets(cls, args.max_snapshots):
+            key = f'{name}{values}'
+            results[key] = result = run(cls, method_name, values)
+            line = f'{key}: {format_result(method_name, result)}'
+            if key in baseline:
+                ratio = result / baseline[key] if baseline[key] else 1.0
+                line += f' ({ratio:.2f}x baseline)'
+                is_noise = (method_name.startswith('peakmem_')
+                            and result - baseline[key] < MIN_MEMORY_REGRESSION)
+                if ratio > args.threshold and not is_noise:
+                    regressions.append(key)
+                    line += ' REGRESSION'
+            print(line, flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold}x baseline.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+class Import:
+    """
+    Importing the package's modules in a fresh interpreter, as short-lived jobs do. The
+    return calculators only need NumPy; pandas and pyarrow are never imported.
+    """
+    def timeraw_import_portfolio(self):
+        return 'import portfolio_manager.portfolio'
+
+    def timeraw_import_return_calculators(self):
+        return 'import portfolio_manager.return_calculators'
+
+    def timeraw_simple_return(self):
+        return """
+        from datetime import datetime
+        from portfolio_manager.portfolio import InvestmentPortfolio
+        from portfolio_manager.return_calculators import SimpleReturnCalculator
+
+        portfolio = InvestmentPortfolio()
+        portfolio.deposit(100, date=datetime(2020, 1, 1))
+        portfolio.update_portfolio_value(110, datetime(2021, 1, 1))
+        SimpleReturnCalculator().calculate_return(portfolio)
+        """
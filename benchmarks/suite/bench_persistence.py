@@ -0,0 +1,44 @@
+import tempfile
+from datetime import timedelta
+
+from portfolio_manager.portfolio import load_portfolio
+
+from .common import N_SNAPSHOTS, make_portfolio
+
+FORMATS = ['pickle', 'journal', 'binary']
+
+
+class SaveLoad:
+    """ Saving and loading a portfolio in each file format. """
+    params = [N_SNAPSHOTS, FORMATS]
+    param_names = ['n_snapshots', 'file_format']
+
+    def setup(self, n_snapshots: int, file_format: str):
+        self.directory = tempfile.TemporaryDirectory()
+        self.portfolio = make_portfolio(n_snapshots)
+        self.save_kwargs = {} if file_format == 'pickle' else {file_format: True}
+        self.portfolio.save_portfolio(self.directory.name, **self.save_kwargs)
+        self.date = self.portfolio.latest_transaction_date
+
+    def teardown(self, n_snapshots: int, file_format: str):
+        self.portfolio.close_journal()
+        self.directory.cleanup()
+
+    def time_save_portfolio(self, n_snapshots: int, file_format: str):
+        # Save after each transaction, as an application recording transactions would
+        self.date += timedelta(minutes=1)
+        self.portfolio.update_portfolio_value(self.portfolio.current_portfolio_value,
+                                              date=self.date)
+        self.portfolio.save_portfolio(self.directory.name, **self.save_kwargs)
+
+    def time_load_portfolio(self, n_snapshots: int, file_format: str):
+        self.load()
+
+    def peakmem_load_portfolio(self, n_snapshots: int, file_format: str):
+        self.load()
+
+    def load(self):
+        # Each format is saved to its own directory, so load_portfolio finds it by name
+        portfolio = load_portfolio(self.portfolio.name, self.directory.name)
+        portfolio.close_journal()
+        return portfolio
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from .common import N_SNAPSHOTS, make_portfolio
+
+
+class Transactions:
+    """ Recording a single transaction in a portfolio with an existing history. """
+    params = N_SNAPSHOTS
+    param_names = ['n_snapshots']
+
+    def setup(self, n_snapshots: int):
+        self.portfolio = make_portfolio(n_snapshots)
+        self.date = self.portfolio.latest_transaction_date
+
+        # Enough funds to withdraw from on every call
+        self.portfolio.deposit(10 ** 9, date=self.next_date())
+
+    def next_date(self):
+        # Every call records a transaction, so each needs a later date than the last
+        self.date += timedelta(minutes=1)
+        return self.date
+
+    def time_deposit(self, n_snapshots: int):
+        self.portfolio.deposit(100, date=self.next_date())
+
+    def time_withdraw(self, n_snapshots: int):
+        self.portfolio.withdraw(0.01, date=self.next_date())
+
+    def time_update_portfolio_value(self, n_snapshots: int):
+        self.portfolio.update_portfolio_value(self.portfolio.current_portfolio_value,
+                                              date=self.next_date())
+
+
+class Ingest:
+    """ Building a portfolio of n_snapshots transactions in one step. """
+    params = N_SNAPSHOTS
+    param_names = ['n_snapshots']
+
+    def time_from_records(self, n_snapshots: int):
+        make_portfolio(n_snapshots)
+
+    def peakmem_from_records(self, n_snapshots: int):
+        make_portfolio(n_snapshots)
+
+
+class PointInTime:
+    """ Looking up the portfolio on a date in the middle of its history. """
+    params = N_SNAPSHOTS
+    param_names = ['n_snapshots']
+
+    def setup(self, n_snapshots: int):
+        self.portfolio = make_portfolio(n_snapshots)
+        self.start = self.portfolio.history.date_at(n_snapshots // 2)
+        self.end = self.start + timedelta(days=30)
+
+    def time_value_at(self, n_snapshots: int):
+        self.portfolio.value_at(self.start)
+
+    def time_history_between(self, n_snapshots: int):
+        self.portfolio.history_between(self.start, self.end)
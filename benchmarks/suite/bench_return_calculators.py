@@ -0,0 +1,61 @@
+import numpy as np
+
+from portfolio_manager.return_calculators import (ModifiedDietzReturnCalculator,
+                                                  MoneyWeightedReturnCalculator,
+                                                  ReturnCalculator,
+                                                  SimpleReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+
+from .common import N_SNAPSHOTS, make_portfolio
+
+CALCULATORS = {
+    'simple': SimpleReturnCalculator,
+    'time_weighted': TimeWeightedReturnCalculator,
+    'money_weighted': MoneyWeightedReturnCalculator,
+    'modified_dietz': ModifiedDietzReturnCalculator,
+}
+
+
+class CalculateReturn:
+    """ Calculating the annualised return of a portfolio with each calculator. """
+    params = [N_SNAPSHOTS, list(CALCULATORS)]
+    param_names = ['n_snapshots', 'calculator']
+
+    def setup(self, n_snapshots: int, calculator: str):
+        self.portfolio = make_portfolio(n_snapshots)
+        self.calculator = CALCULATORS[calculator]()
+
+        # Measure the calculation itself, rather than the result cache
+        self.cache_size = ReturnCalculator.cache_info().maxsize
+        ReturnCalculator.set_cache_size(0)
+
+    def teardown(self, n_snapshots: int, calculator: str):
+        ReturnCalculator.set_cache_size(self.cache_size)
+
+    def time_calculate_return(self, n_snapshots: int, calculator: str):
+        self.calculator.calculate_return(self.portfolio)
+
+    def peakmem_calculate_return(self, n_snapshots: int, calculator: str):
+        self.calculator.calculate_return(self.portfolio)
+
+
+class CalculateReturnAsOf:
+    """ Calculating the return of a portfolio as of each of the last 120 month-ends. """
+    params = [N_SNAPSHOTS, list(CALCULATORS)]
+    param_names = ['n_snapshots', 'calculator']
+
+    def setup(self, n_snapshots: int, calculator: str):
+        self.portfolio = make_portfolio(n_snapshots)
+        self.calculator = CALCULATORS[calculator]()
+        months = np.unique(self.portfolio.history.dates.astype(
+            'datetime64[us]').astype('datetime64[M]'))
+        self.month_ends = (months[-120:] + 1).astype('datetime64[D]') - 1
+
+        self.cache_size = ReturnCalculator.cache_info().maxsize
+        ReturnCalculator.set_cache_size(0)
+
+    def teardown(self, n_snapshots: int, calculator: str):
+        ReturnCalculator.set_cache_size(self.cache_size)
+
+    def time_calculate_return_as_of(self, n_snapshots: int, calculator: str):
+        self.calculator.calculate_return(self.portfolio, as_of=self.month_ends)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+# The history sizes each benchmark is run over
+N_SNAPSHOTS = [10 ** 2, 10 ** 4, 10 ** 6]
+
+
+def make_portfolio(n_snapshots: int, seed: int = 0) -> InvestmentPortfolio:
+    """
+    A portfolio with a snapshot a day: a deposit every 10 days, a withdrawal every 50,
+    and value updates in between.
+    """
+    rng = np.random.default_rng(seed)
+    days = np.arange(n_snapshots)
+    values = 100.0 * (days // 10 + 1) * rng.uniform(0.95, 1.1, n_snapshots)
+    transaction_types = np.where(days % 10 == 0, 'deposit',
+                                 np.where(days % 50 == 25, 'withdrawal',
+                                          'update_portfolio_value'))
+    return InvestmentPortfolio.from_records({
+        'date': np.datetime64('1900-01-01') + days,
+        'transaction_type': transaction_types,
+        'amount': np.where(transaction_types == 'deposit', 100.0, 10.0),
+        'value': np.where(transaction_types == 'update_portfolio_value', values, np.nan)
+    }, name=f'benchmark_{n_snapshots}')
@@ -21,6 +21,7 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     python_requires='>=3.7',
-    install_requires=['pandas', 'numpy', 'numpy-financial'],
+    install_requires=['numpy'],
+    extras_require={'arrow': ['pyarrow']},
     test_suite="tests"
 )
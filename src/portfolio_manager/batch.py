@@ -0,0 +1,330 @@
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+
+from portfolio_manager.history import (DEPOSIT, WITHDRAWAL, MICROSECONDS_PER_DAY,
+                                       TRANSACTION_TYPES)
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (_check_period,
+                                                  _modified_dietz_growth,
+                                                  _period_lasts)
+from portfolio_manager.solvers import xirr
+
+_DEPOSIT_CODE = TRANSACTION_TYPES.index(DEPOSIT)
+_WITHDRAWAL_CODE = TRANSACTION_TYPES.index(WITHDRAWAL)
+
+
+class PackedHistories:
+    def __init__(self,
+                 dates: np.ndarray,
+                 total_deposited: np.ndarray,
+                 current_portfolio_value: np.ndarray,
+                 transaction_codes: np.ndarray,
+                 offsets: np.ndarray):
+        """
+        The histories of many portfolios, concatenated into one set of arrays. The
+        history of portfolio i is held at [offsets[i], offsets[i + 1]) in each array,
+        in the same layout as the rows of a CSR matrix.
+
+        Parameters
+        ----------
+        dates : np.ndarray
+            The snapshot dates, in microseconds since the epoch.
+        total_deposited : np.ndarray
+            The total deposited at each snapshot.
+        current_portfolio_value : np.ndarray
+            The portfolio value at each snapshot.
+        transaction_codes : np.ndarray
+            The transaction type code of each snapshot. Codes 0, 1 and 2 are deposits,
+            withdrawals and value updates; any other code is specific to its portfolio.
+        offsets : np.ndarray
+            The index at which each portfolio's history starts, followed by the total
+            number of snapshots. i.e. one longer than the number of portfolios.
+        """
+        self.dates = dates
+        self.total_deposited = total_deposited
+        self.current_portfolio_value = current_portfolio_value
+        self.transaction_codes = transaction_codes
+        self.offsets = offsets
+
+    @classmethod
+    def from_portfolios(cls, portfolios: Iterable[InvestmentPortfolio]) -> 'PackedHistories':
+        """ Pack the histories of the given portfolios, in order. """
+        histories = [portfolio.history for portfolio in portfolios]
+        offsets = np.zeros(len(histories) + 1, dtype=np.int64)
+        np.cumsum([len(history) for history in histories], out=offsets[1:])
+
+        def pack(column: str, dtype: type) -> np.ndarray:
+            if not histories:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate([getattr(history, column) for history in histories])
+
+        return cls(pack('dates', np.int64), pack('total_deposited', np.float64),
+                   pack('current_portfolio_value', np.float64),
+                   pack('transaction_codes', np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """ The number of snapshots in each portfolio's history. """
+        return np.diff(self.offsets)
+
+    def portfolio_ids(self) -> np.ndarray:
+        """ The index of the portfolio that each snapshot belongs to. """
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+
+def simple_returns(histories: Union[PackedHistories, Sequence[InvestmentPortfolio]],
+                   annualised: bool = True) -> np.ndarray:
+    """
+    Calculate the simple rate of return of many portfolios at once. See
+    SimpleReturnCalculator. The total deposited and portfolio value are taken from the
+    latest snapshot of each portfolio.
+
+    Parameters
+    ----------
+    histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+        The portfolios, or their packed histories.
+    annualised : bool
+        If True, calculate the annualised returns.
+
+    Returns
+    -------
+    np.ndarray : The simple rate of return of each portfolio, as a percentage, in the
+        order given. NaN where SimpleReturnCalculator would raise an error, i.e. with
+        fewer than two snapshots or a total deposited <= 0.
+    """
+    packed = _pack(histories)
+    valid = packed.lengths > 1
+    last = packed.offsets[1:][valid] - 1
+
+    returns = np.full(len(packed), np.nan)
+    total_deposited = packed.total_deposited[last]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[valid] = np.where(
+            total_deposited > 0,
+            (packed.current_portfolio_value[last] - total_deposited)
+            / total_deposited * 100,
+            np.nan)
+
+    if annualised:
+        returns = _annualise(packed, returns)
+    return np.round(returns, 2)
+
+
+def time_weighted_returns(histories: Union[PackedHistories,
+                                           Sequence[InvestmentPortfolio]],
+                          annualised: bool = True) -> np.ndarray:
+    """
+    Calculate the time-weighted rate of return of many portfolios at once. See
+    TimeWeightedReturnCalculator.
+
+    Parameters
+    ----------
+    histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+        The portfolios, or their packed histories.
+    annualised : bool
+        If True, calculate the annualised returns.
+
+    Returns
+    -------
+    np.ndarray : The time-weighted rate of return of each portfolio, as a percentage, in
+        the order given. NaN for portfolios with fewer than two snapshots.
+    """
+    packed = _pack(histories)
+    returns = np.full(len(packed), np.nan)
+    if len(packed.dates) == 0:
+        return returns
+
+    # A sub-period starts with each portfolio's first snapshot, and whenever the total
+    # deposited changes
+    total_deposited = packed.total_deposited
+    is_new_period = np.empty(len(total_deposited), dtype=bool)
+    is_new_period[0] = True
+    np.not_equal(total_deposited[1:], total_deposited[:-1], out=is_new_period[1:])
+    is_new_period[packed.offsets[:-1][packed.lengths > 0]] = True
+
+    starts = np.flatnonzero(is_new_period)
+    ends = np.append(starts[1:] - 1, len(total_deposited) - 1)
+    values = packed.current_portfolio_value
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period_growth = (values[ends] - values[starts]) / values[starts] + 1
+
+    # Multiply together the growth of each portfolio's sub-periods
+    period_offsets = np.searchsorted(starts, packed.offsets)
+    valid = packed.lengths > 1
+    growth = _reduce_segments(np.multiply, period_growth, period_offsets, valid)
+    returns[valid] = (growth - 1) * 100
+
+    if annualised:
+        returns = _annualise(packed, returns)
+    return np.round(returns, 2)
+
+
+def money_weighted_returns(histories: Union[PackedHistories,
+                                            Sequence[InvestmentPortfolio]],
+                           annualised: bool = True) -> np.ndarray:
+    """
+    Calculate the money-weighted rate of return of many portfolios at once, solving for
+    all of the rates together. See MoneyWeightedReturnCalculator.
+
+    Parameters
+    ----------
+    histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+        The portfolios, or their packed histories.
+    annualised : bool
+        If True, calculate the annualised returns.
+
+    Returns
+    -------
+    np.ndarray : The money-weighted rate of return of each portfolio, as a percentage,
+        in the order given. NaN for portfolios with fewer than two snapshots, or where no
+        rate exists.
+    """
+    packed = _pack(histories)
+    returns = np.full(len(packed), np.nan)
+    valid = packed.lengths > 1
+    if not valid.any():
+        return returns
+
+    portfolio_ids = packed.portfolio_ids()
+    firsts = packed.offsets[:-1][valid]
+    lasts = packed.offsets[1:][valid] - 1
+
+    # Each deposit or withdrawal after a portfolio's first one is a cash flow of the
+    # change in total deposited since the previous one
+    cash_flow_rows = np.flatnonzero(
+        valid[portfolio_ids]
+        & ((packed.transaction_codes == _DEPOSIT_CODE)
+           | (packed.transaction_codes == _WITHDRAWAL_CODE)))
+    is_repeat = portfolio_ids[cash_flow_rows[1:]] == portfolio_ids[cash_flow_rows[:-1]]
+    repeat_rows = cash_flow_rows[1:][is_repeat]
+    repeat_flows = -np.diff(packed.total_deposited[cash_flow_rows])[is_repeat]
+
+    # Along with the initial total deposited, and the final value as a withdrawal
+    rows = np.concatenate([firsts, repeat_rows, lasts])
+    cash_flows = np.concatenate([-packed.total_deposited[firsts], repeat_flows,
+                                 packed.current_portfolio_value[lasts]])
+    order = np.argsort(portfolio_ids[rows], kind='stable')
+    rows, cash_flows = rows[order], cash_flows[order]
+
+    # Measure time as a fraction of each portfolio's lifetime, so the solved rates are
+    # the returns over each whole lifetime
+    row_ids = portfolio_ids[rows]
+    first_dates = np.zeros(len(packed), dtype=np.int64)
+    last_dates = np.zeros(len(packed), dtype=np.int64)
+    first_dates[valid] = packed.dates[firsts]
+    last_dates[valid] = packed.dates[lasts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        times = ((packed.dates[rows] - first_dates[row_ids])
+                 / (last_dates - first_dates)[row_ids])
+
+    cash_flow_offsets = np.flatnonzero(np.diff(row_ids, prepend=-1))
+    returns[valid] = xirr(cash_flows, times, cash_flow_offsets) * 100
+
+    if annualised:
+        returns = _annualise(packed, returns)
+    return np.round(returns, 2)
+
+
+def modified_dietz_returns(histories: Union[PackedHistories,
+                                            Sequence[InvestmentPortfolio]],
+                           annualised: bool = True, period: str = None) -> np.ndarray:
+    """
+    Calculate the Modified Dietz rate of return of many portfolios at once. See
+    ModifiedDietzReturnCalculator. This takes a few passes over the packed histories,
+    so suits ranking many portfolios before calculating the exact returns of a few.
+
+    Parameters
+    ----------
+    histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+        The portfolios, or their packed histories.
+    annualised : bool
+        If True, calculate the annualised returns.
+    period : str
+        If given, link the returns of each calendar period: DAILY, MONTHLY or YEARLY.
+
+    Returns
+    -------
+    np.ndarray : The Modified Dietz rate of return of each portfolio, as a percentage,
+        in the order given. NaN for portfolios with fewer than two snapshots, or where
+        the average capital invested is negative or zero.
+    """
+    _check_period(period)
+    packed = _pack(histories)
+    returns = np.full(len(packed), np.nan)
+    valid = packed.lengths > 1
+    if not valid.any():
+        return returns
+
+    # Each portfolio's history is one period, or is split after the latest snapshot of
+    # each calendar period. Each period starts from the last snapshot of the one before,
+    # or from its portfolio's first snapshot
+    has_snapshots = packed.lengths > 0
+    period_starts = packed.offsets[:-1][has_snapshots]
+    period_lasts = packed.offsets[1:][has_snapshots] - 1
+    if period is not None:
+        is_period_last = np.zeros(len(packed.dates), dtype=bool)
+        is_period_last[period_lasts] = True
+        is_period_last[_period_lasts(packed.dates, period)] = True
+        period_lasts = np.flatnonzero(is_period_last)
+
+        portfolio_ids = packed.portfolio_ids()
+        period_ids = portfolio_ids[period_lasts]
+        period_starts = np.concatenate(([0], period_lasts[:-1]))
+        period_starts = np.where(portfolio_ids[period_starts] == period_ids,
+                                 period_starts, packed.offsets[period_ids])
+    period_growth = _modified_dietz_growth(packed.dates, packed.total_deposited,
+                                           packed.current_portfolio_value,
+                                           period_starts, period_lasts)
+
+    # Link each portfolio's periods
+    period_offsets = np.searchsorted(period_lasts, packed.offsets)
+    growth = _reduce_segments(np.multiply, period_growth, period_offsets, valid)
+    returns[valid] = (growth - 1) * 100
+
+    if annualised:
+        returns = _annualise(packed, returns)
+    return np.round(returns, 2)
+
+
+def _pack(histories: Union[PackedHistories,
+                           Sequence[InvestmentPortfolio]]) -> PackedHistories:
+    if isinstance(histories, PackedHistories):
+        return histories
+    return PackedHistories.from_portfolios(histories)
+
+
+def _reduce_segments(ufunc: np.ufunc, values: np.ndarray, offsets: np.ndarray,
+                     valid: np.ndarray) -> np.ndarray:
+    """
+    Reduce each valid segment [offsets[i], offsets[i + 1]) of `values` with a ufunc,
+    e.g. np.multiply. Valid segments must be non-empty.
+    """
+    starts = offsets[:-1][valid]
+    if len(starts) == 0:
+        return np.empty(0, dtype=values.dtype)
+
+    # reduceat reduces up to the next index given, so reduce over every segment start
+    # (including invalid ones) and then keep the valid segments
+    non_empty = offsets[:-1] < offsets[1:]
+    reduced = ufunc.reduceat(values, offsets[:-1][non_empty])
+    return reduced[np.cumsum(non_empty)[valid] - 1]
+
+
+def _annualise(packed: PackedHistories, returns: np.ndarray) -> np.ndarray:
+    """
+    Annualise the total return percentage of each portfolio, as
+    ReturnCalculator.calculate_annualised_return does.
+    """
+    has_snapshots = packed.lengths > 0
+    first_dates = packed.dates[packed.offsets[:-1][has_snapshots]]
+    last_dates = packed.dates[packed.offsets[1:][has_snapshots] - 1]
+
+    ages = np.full(len(packed), np.nan)
+    ages[has_snapshots] = (last_dates - first_dates) // MICROSECONDS_PER_DAY / 365.25
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annualised_returns = ((1 + returns / 100) ** (1 / ages) - 1) * 100
+    return np.round(annualised_returns, 2)
@@ -0,0 +1,132 @@
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.history import PortfolioHistory
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+# The file starts with a fixed header, followed by JSON metadata describing the
+# portfolio and where each column is, relative to the first aligned offset after the
+# metadata. Each column is aligned to _ALIGNMENT bytes so it can be memory-mapped.
+_MAGIC = b'PMH1'
+_HEADER = struct.Struct('<4sI')  # magic, metadata size
+_ALIGNMENT = 4096
+_COLUMNS = (('dates', '<i8'), ('total_deposited', '<f8'),
+            ('current_portfolio_value', '<f8'), ('transaction_codes', 'u1'))
+
+BINARY_EXTENSION = '.pmh'
+
+
+def save_binary(portfolio: InvestmentPortfolio, path: str):
+    """
+    Save a portfolio in the binary history format, which can be loaded by memory-mapping
+    the history rather than reading it. The file is written to a temporary path and
+    renamed into place, so a crash mid-save leaves any previous file intact.
+
+    Parameters
+    ----------
+    portfolio : InvestmentPortfolio
+        The portfolio to save.
+    path : str
+        The path of the file to save to.
+    """
+    history = portfolio.history
+    columns = [getattr(history, column).astype(dtype, copy=False)
+               for column, dtype in _COLUMNS]
+
+    # Lay out the columns one after another, starting at the first aligned offset
+    # after the metadata
+    metadata = _metadata(portfolio)
+    metadata['columns'] = {}
+    offset = 0
+    for (column, dtype), array in zip(_COLUMNS, columns):
+        metadata['columns'][column] = [dtype, offset]
+        offset = _align(offset + array.nbytes)
+    encoded_metadata = json.dumps(metadata).encode()
+    data_start = _align(_HEADER.size + len(encoded_metadata))
+
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as handle:
+        handle.write(_HEADER.pack(_MAGIC, len(encoded_metadata)))
+        handle.write(encoded_metadata)
+        for (column, _), array in zip(_COLUMNS, columns):
+            handle.seek(data_start + metadata['columns'][column][1])
+            handle.write(array.tobytes())
+        handle.truncate(data_start + offset)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_binary(path: str) -> InvestmentPortfolio:
+    """
+    Load a portfolio saved in the binary history format. Only the header is read; the
+    history is memory-mapped, so it's read from disk on demand as it's used. Reading
+    the latest value or the time-weighted return doesn't touch the rest of the
+    history. Recording new snapshots copies the history into memory first.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to load.
+
+    Returns
+    -------
+    InvestmentPortfolio : The portfolio, with a memory-mapped history.
+    """
+    with open(path, 'rb') as handle:
+        magic, metadata_size = _HEADER.unpack(handle.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a binary portfolio history file.')
+        metadata = json.loads(handle.read(metadata_size))
+    data_start = _align(_HEADER.size + metadata_size)
+
+    n_snapshots = metadata['n_snapshots']
+    columns = {}
+    for column, (dtype, offset) in metadata['columns'].items():
+        if n_snapshots:
+            columns[column] = np.memmap(path, dtype=dtype, mode='r',
+                                        offset=data_start + offset, shape=n_snapshots)
+        else:
+            # Zero-length arrays can't be memory-mapped
+            columns[column] = np.empty(0, dtype=dtype)
+
+    portfolio = InvestmentPortfolio(name=metadata['name'],
+                                    total_deposited=metadata['total_deposited'],
+                                    current_portfolio_value=metadata[
+                                        'current_portfolio_value'])
+    portfolio.history = PortfolioHistory.from_arrays(
+        transaction_types=metadata['transaction_types'],
+        running_growth=tuple(metadata['running_growth']), **columns)
+    if metadata['latest_transaction_date'] is not None:
+        portfolio.latest_transaction_date = datetime.fromisoformat(
+            metadata['latest_transaction_date'])
+    return portfolio
+
+
+def _metadata(portfolio: InvestmentPortfolio) -> dict:
+    """ Everything about the portfolio other than its history columns. """
+    history = portfolio.history
+    latest_date = portfolio.latest_transaction_date
+    return {
+        'name': portfolio.name,
+        'total_deposited': _to_json(portfolio.total_deposited),
+        'current_portfolio_value': _to_json(portfolio.current_portfolio_value),
+        'latest_transaction_date': (latest_date.isoformat() if latest_date is not None
+                                    else None),
+        'n_snapshots': len(history),
+        'transaction_types': history.transaction_types,
+        'running_growth': history.running_growth,
+    }
+
+
+def _to_json(value):
+    """ Convert NumPy scalars into the equivalent Python types. """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
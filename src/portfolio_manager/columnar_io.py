@@ -0,0 +1,256 @@
+from datetime import datetime
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError as error:
+    raise ImportError('Reading and writing Parquet or Arrow files requires pyarrow. '
+                      'Install it with: pip install portfolio-manager[arrow]') from error
+
+from portfolio_manager.batch import PackedHistories
+from portfolio_manager.history import (TRANSACTION_TYPES, UPDATE_PORTFOLIO_VALUE,
+                                       PortfolioHistory, to_epoch)
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+PARQUET = 'parquet'
+ARROW_IPC = 'ipc'
+
+SCHEMA = pa.schema([
+    ('portfolio', pa.string()),
+    ('date', pa.timestamp('us')),
+    ('total_deposited', pa.float64()),
+    ('current_portfolio_value', pa.float64()),
+    ('transaction_type', pa.string()),
+])
+HISTORY_COLUMNS = ('date', 'total_deposited', 'current_portfolio_value',
+                   'transaction_type')
+
+
+def write_histories(portfolios: Iterable[InvestmentPortfolio], path: str,
+                    file_format: str = PARQUET, row_group_size: int = 65_536):
+    """
+    Write the histories of many portfolios to a single Parquet or Arrow IPC file, with a
+    row per snapshot. The portfolios are written one after another, each in order of
+    ascending date, and the rows are written in batches of `row_group_size`, so only
+    one batch is held in memory at a time.
+
+    Parameters
+    ----------
+    portfolios : Iterable[InvestmentPortfolio]
+        The portfolios to write. Each is identified by its name in the 'portfolio'
+        column.
+    path : str
+        The path of the file to write.
+    file_format : str
+        PARQUET or ARROW_IPC.
+    row_group_size : int
+        The number of rows in each Parquet row group, or Arrow record batch. Smaller
+        row groups let reads skip more rows that don't match a filter.
+    """
+    if file_format == PARQUET:
+        writer = pq.ParquetWriter(path, SCHEMA)
+        write = writer.write_table
+    elif file_format == ARROW_IPC:
+        writer = pa.ipc.new_file(path, SCHEMA)
+        write = writer.write_table
+    else:
+        raise ValueError(f'Unknown file format: {file_format}')
+
+    with writer:
+        pending = []
+        n_pending = 0
+        for portfolio in portfolios:
+            batch = _history_batch(portfolio)
+            pending.append(batch)
+            n_pending += batch.num_rows
+
+            # Write out every full row group, carrying any remainder forwards
+            if n_pending >= row_group_size:
+                table = pa.Table.from_batches(pending, SCHEMA)
+                n_full = n_pending - n_pending % row_group_size
+                write(table.slice(0, n_full), row_group_size)
+                pending = table.slice(n_full).to_batches()
+                n_pending -= n_full
+
+        if n_pending:
+            write(pa.Table.from_batches(pending, SCHEMA), row_group_size)
+
+
+def read_portfolios(path: str, names: Sequence[str] = None, start: datetime = None,
+                    end: datetime = None) -> List[InvestmentPortfolio]:
+    """
+    Read portfolios from a file written by write_histories. Only the row groups which
+    can contain the requested portfolios and dates are read.
+
+    Each portfolio's totals and latest transaction date are taken from its latest
+    snapshot that was read.
+
+    Parameters
+    ----------
+    path : str
+        The path of the Parquet or Arrow IPC file.
+    names : Sequence[str]
+        The names of the portfolios to read. Defaults to all of them.
+    start : datetime
+        If provided, only read snapshots on or after this date.
+    end : datetime
+        If provided, only read snapshots on or before this date.
+
+    Returns
+    -------
+    List[InvestmentPortfolio] : The portfolios, in the order they were written.
+    """
+    portfolio_names, packed, transaction_types = _read_packed(path, names, start, end,
+                                                              HISTORY_COLUMNS)
+    portfolios = []
+    for i, name in enumerate(portfolio_names):
+        first, last = packed.offsets[i], packed.offsets[i + 1]
+        portfolio = InvestmentPortfolio(name=name)
+        portfolio.history = PortfolioHistory.from_arrays(
+            packed.dates[first:last], packed.total_deposited[first:last],
+            packed.current_portfolio_value[first:last],
+            packed.transaction_codes[first:last], transaction_types)
+        if last > first:
+            portfolio.total_deposited = float(packed.total_deposited[last - 1])
+            portfolio.current_portfolio_value = float(
+                packed.current_portfolio_value[last - 1])
+            portfolio.latest_transaction_date = portfolio.history.date_at(-1)
+        portfolios.append(portfolio)
+    return portfolios
+
+
+def read_packed_histories(path: str, names: Sequence[str] = None,
+                          start: datetime = None, end: datetime = None,
+                          columns: Sequence[str] = HISTORY_COLUMNS
+                          ) -> Tuple[List[str], PackedHistories]:
+    """
+    Read portfolio histories from a file written by write_histories, straight into
+    PackedHistories for the batch return functions. Only the requested columns are
+    read, and only from the row groups which can contain the requested portfolios and
+    dates.
+
+    e.g. time_weighted_returns and simple_returns only need the 'date',
+    'total_deposited' and 'current_portfolio_value' columns.
+
+    Parameters
+    ----------
+    path : str
+        The path of the Parquet or Arrow IPC file.
+    names : Sequence[str]
+        The names of the portfolios to read. Defaults to all of them.
+    start : datetime
+        If provided, only read snapshots on or after this date.
+    end : datetime
+        If provided, only read snapshots on or before this date.
+    columns : Sequence[str]
+        The history columns to read, from HISTORY_COLUMNS. 'date' is always read.
+        Columns which aren't read are filled with NaN, or value updates for
+        'transaction_type'.
+
+    Returns
+    -------
+    Tuple[List[str], PackedHistories] : The names of the portfolios, in the order they
+        were written, and their packed histories in the same order.
+    """
+    portfolio_names, packed, _ = _read_packed(path, names, start, end, columns)
+    return portfolio_names, packed
+
+
+def _history_batch(portfolio: InvestmentPortfolio) -> pa.RecordBatch:
+    """ A portfolio's history as a record batch in SCHEMA. """
+    history = portfolio.history
+    n_snapshots = len(history)
+    # Strings are built by decoding dictionary arrays, rather than from Python lists
+    return pa.RecordBatch.from_arrays([
+        pa.DictionaryArray.from_arrays(np.zeros(n_snapshots, dtype=np.int32),
+                                       [portfolio.name]).cast(pa.string()),
+        pa.array(history.dates, type=pa.timestamp('us')),
+        pa.array(history.total_deposited),
+        pa.array(history.current_portfolio_value),
+        pa.DictionaryArray.from_arrays(history.transaction_codes.astype(np.int32),
+                                       history.transaction_types).cast(pa.string()),
+    ], schema=SCHEMA)
+
+
+def _read_packed(path: str, names: Sequence[str], start: datetime, end: datetime,
+                 columns: Sequence[str]) -> Tuple[List[str], PackedHistories, List[str]]:
+    """
+    Read the filtered histories into PackedHistories, along with the portfolio names and
+    the transaction types the transaction codes refer to.
+    """
+    unknown = set(columns) - set(HISTORY_COLUMNS)
+    if unknown:
+        raise ValueError(f'Unknown history columns: {sorted(unknown)}')
+
+    # The filters are pushed down to the file reader, which skips row groups whose
+    # statistics show they can't match
+    condition = None
+    if names is not None:
+        condition = _and(condition, ds.field('portfolio').isin(list(names)))
+    if start is not None:
+        condition = _and(condition, ds.field('date') >= pa.scalar(
+            to_epoch(start), type=pa.timestamp('us')))
+    if end is not None:
+        condition = _and(condition, ds.field('date') <= pa.scalar(
+            to_epoch(end), type=pa.timestamp('us')))
+
+    with open(path, 'rb') as handle:
+        file_format = PARQUET if handle.read(4) == b'PAR1' else ARROW_IPC
+    dataset = ds.dataset(path, format=file_format, schema=SCHEMA)
+    read_columns = ['portfolio', 'date'] + [column for column in columns
+                                            if column != 'date']
+    table = dataset.to_table(columns=read_columns, filter=condition)
+
+    # Number the portfolios in the order they were written, then group each portfolio's
+    # rows together, keeping them in the order written
+    dictionary, indices = _dictionary_indices(table.column('portfolio'))
+    unique_indices, first_rows, inverse = np.unique(indices, return_index=True,
+                                                    return_inverse=True)
+    written_order = np.argsort(first_rows)
+    portfolio_names = [dictionary[i] for i in unique_indices[written_order]]
+    rank = np.empty(len(unique_indices), dtype=np.int64)
+    rank[written_order] = np.arange(len(unique_indices))
+    portfolio_ids = rank[inverse]
+    order = np.argsort(portfolio_ids, kind='stable')
+
+    offsets = np.zeros(len(portfolio_names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(portfolio_ids, minlength=len(portfolio_names)),
+              out=offsets[1:])
+
+    n_rows = len(order)
+    arrays = {'dates': table.column('date').to_numpy().astype(
+        'datetime64[us]').astype(np.int64)[order]}
+    for column in ('total_deposited', 'current_portfolio_value'):
+        arrays[column] = (table.column(column).to_numpy()[order] if column in columns
+                          else np.full(n_rows, np.nan))
+
+    # Transaction types keep their standard codes, and any others are numbered after
+    transaction_types = list(TRANSACTION_TYPES)
+    if 'transaction_type' in columns:
+        dictionary, indices = _dictionary_indices(table.column('transaction_type'))
+        transaction_types += [name for name in dictionary
+                              if name not in TRANSACTION_TYPES]
+        codes = np.array([transaction_types.index(name) for name in dictionary],
+                         dtype=np.uint8)
+        arrays['transaction_codes'] = codes[indices][order]
+    else:
+        arrays['transaction_codes'] = np.full(
+            n_rows, TRANSACTION_TYPES.index(UPDATE_PORTFOLIO_VALUE), dtype=np.uint8)
+
+    return portfolio_names, PackedHistories(offsets=offsets, **arrays), transaction_types
+
+
+def _dictionary_indices(column: pa.ChunkedArray) -> Tuple[List[str], np.ndarray]:
+    """ Dictionary-encode a string column, returning the dictionary and the indices. """
+    encoded = column.combine_chunks().dictionary_encode()
+    return (encoded.dictionary.to_pylist(),
+            encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64))
+
+
+def _and(condition, expression):
+    return expression if condition is None else condition & expression
@@ -0,0 +1,165 @@
+import heapq
+from datetime import datetime
+from typing import Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from portfolio_manager.history import TRANSACTION_TYPES, PortfolioHistory, from_epoch
+from portfolio_manager.portfolio import InvestmentPortfolio, _history_versions
+
+
+class ConsolidatedPortfolio:
+    def __init__(self, members: Sequence[InvestmentPortfolio], name: str = None):
+        """
+        A combined view of several portfolios, e.g. a household's ISA, pension and
+        general account, which can be passed to any ReturnCalculator in place of an
+        InvestmentPortfolio.
+
+        The member histories are merged by date: at each member snapshot, the combined
+        total deposited and value are the sums of every member's latest total deposited
+        and value. Snapshots on the same date are ordered as the members are. The merge
+        is done when the combined history is first needed, and again only after a member
+        changes. The members themselves are never modified.
+
+        Parameters
+        ----------
+        members : Sequence[InvestmentPortfolio]
+            The portfolios to consolidate.
+        name : str
+            The name of the consolidated portfolio. Defaults to the member names joined
+            by '+'.
+        """
+        self.members = list(members)
+        self.name = name or '+'.join(member.name for member in self.members)
+
+        self._member_versions = None
+        self._history_version = None
+        self._history = None
+
+    def snapshots(self) -> Iterator[dict]:
+        """
+        Lazily merge the member histories with a heap-based k-way merge on date,
+        yielding each combined snapshot as it's reached. Holds one pending snapshot per
+        member, so this suits streaming the combined history elsewhere without building
+        it in memory.
+
+        Yields
+        ------
+        dict : The combined snapshot at each member snapshot, with keys 'date',
+            'total_deposited', 'current_portfolio_value' and 'transaction_type'.
+        """
+        latest_deposited = [0.0] * len(self.members)
+        latest_values = [0.0] * len(self.members)
+        streams = [_member_snapshots(i, member.history)
+                   for i, member in enumerate(self.members)]
+
+        for date, i, _, total_deposited, value, transaction_type in heapq.merge(*streams):
+            latest_deposited[i] = total_deposited
+            latest_values[i] = value
+            yield {'date': from_epoch(date),
+                   'total_deposited': sum(latest_deposited),
+                   'current_portfolio_value': sum(latest_values),
+                   'transaction_type': transaction_type}
+
+    @property
+    def history_version(self) -> int:
+        """ Changes whenever any member portfolio changes. """
+        self._check_members()
+        return self._history_version
+
+    @property
+    def history(self) -> PortfolioHistory:
+        """
+        The combined history, merged when first read after a member changes. This
+        should be treated as read-only.
+        """
+        self._check_members()
+        if self._history is None:
+            self._history = _merge_histories([member.history
+                                              for member in self.members])
+        return self._history
+
+    @property
+    def portfolio_history(self) -> List[dict]:
+        """
+        A read-only list of the combined snapshots, in order of ascending date.
+
+        Note: This builds a new list on every access. Code that only needs the values
+        should read the NumPy arrays on `history` instead.
+        """
+        return self.history.to_records()
+
+    @property
+    def total_deposited(self) -> Union[int, float]:
+        return sum(member.total_deposited for member in self.members)
+
+    @property
+    def current_portfolio_value(self) -> Union[int, float]:
+        return sum(member.current_portfolio_value for member in self.members)
+
+    @property
+    def latest_transaction_date(self) -> datetime:
+        dates = [member.latest_transaction_date for member in self.members
+                 if member.latest_transaction_date is not None]
+        return max(dates) if dates else None
+
+    def _check_members(self):
+        """ Discard the combined history if any member has changed since it was made. """
+        member_versions = tuple(member.history_version for member in self.members)
+        if member_versions != self._member_versions:
+            self._member_versions = member_versions
+            self._history_version = next(_history_versions)
+            self._history = None
+
+
+def _member_snapshots(member: int, history: PortfolioHistory
+                      ) -> Iterator[Tuple[int, int, int, float, float, str]]:
+    """
+    A member's snapshots as (date, member, index, total deposited, value, transaction
+    type) tuples, which sort by date, then member, then position in the history.
+    """
+    types = history.transaction_types
+    for index, (date, total_deposited, value, code) in enumerate(zip(
+            history.dates.tolist(), history.total_deposited.tolist(),
+            history.current_portfolio_value.tolist(),
+            history.transaction_codes.tolist())):
+        yield date, member, index, total_deposited, value, types[code]
+
+
+def _merge_histories(histories: Sequence[PortfolioHistory]) -> PortfolioHistory:
+    """
+    Merge histories by date into one, with the same snapshots as
+    ConsolidatedPortfolio.snapshots. Each history is already sorted, so a stable sort
+    of them concatenated merges the sorted runs, with ties in the order given.
+    """
+    transaction_types = list(TRANSACTION_TYPES)
+    member_codes = []
+    for history in histories:
+        for transaction_type in history.transaction_types:
+            if transaction_type not in transaction_types:
+                transaction_types.append(transaction_type)
+        code_map = np.array([transaction_types.index(transaction_type)
+                             for transaction_type in history.transaction_types],
+                            dtype=np.uint8)
+        member_codes.append(code_map[history.transaction_codes])
+
+    dates = np.concatenate([history.dates for history in histories]
+                           or [np.empty(0, dtype=np.int64)])
+    order = np.argsort(dates, kind='stable')
+    codes = np.concatenate(member_codes or [np.empty(0, dtype=np.uint8)])[order]
+
+    # Carry each member's latest snapshot forward through the merged order, then sum
+    # across the members in order, as ConsolidatedPortfolio.snapshots does
+    total_deposited = np.zeros(len(dates))
+    values = np.zeros(len(dates))
+    offset = 0
+    for history in histories:
+        is_member = (order >= offset) & (order < offset + len(history))
+        latest = np.maximum.accumulate(np.where(is_member, order - offset, -1))
+        has_snapshot = latest >= 0
+        total_deposited[has_snapshot] += history.total_deposited[latest[has_snapshot]]
+        values[has_snapshot] += history.current_portfolio_value[latest[has_snapshot]]
+        offset += len(history)
+
+    return PortfolioHistory.from_arrays(dates[order], total_deposited, values, codes,
+                                        transaction_types)
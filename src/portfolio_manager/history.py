@@ -0,0 +1,626 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Transaction types recorded by InvestmentPortfolio. These always map to the codes 0, 1
+# and 2; any other transaction type is assigned the next free code when first recorded.
+DEPOSIT = 'deposit'
+WITHDRAWAL = 'withdrawal'
+UPDATE_PORTFOLIO_VALUE = 'update_portfolio_value'
+TRANSACTION_TYPES = (DEPOSIT, WITHDRAWAL, UPDATE_PORTFOLIO_VALUE)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+# Calendar periods: the valuation checkpoints history compaction can keep (the latest
+# snapshot of each day, month or year), and the periods returns can be linked over
+DAILY = 'daily'
+MONTHLY = 'monthly'
+YEARLY = 'yearly'
+_CHECKPOINT_UNITS = {DAILY: 'D', MONTHLY: 'M', YEARLY: 'Y'}
+
+
+def to_epoch(date: Union[datetime, np.datetime64]) -> int:
+    """
+    Convert a date into the number of microseconds since the Unix epoch. Timezone-aware
+    datetimes are converted to UTC first.
+    """
+    if isinstance(date, datetime):
+        if date.tzinfo is not None:
+            date = date.astimezone(timezone.utc).replace(tzinfo=None)
+        return (date - _EPOCH) // _MICROSECOND
+    return int(np.datetime64(date, 'us').astype(np.int64))
+
+
+def to_epoch_array(dates: Iterable) -> np.ndarray:
+    """
+    Convert a sequence of dates into an int64 array of microseconds since the Unix epoch.
+    """
+    dates = np.asarray(dates)
+    if dates.dtype.kind != 'M':
+        # NumPy can't convert timezone-aware datetimes (and is deprecating its attempts)
+        is_aware = dates.dtype == object and any(
+            getattr(date, 'tzinfo', None) is not None for date in dates.flat)
+        try:
+            if is_aware:
+                raise TypeError('Timezone-aware datetimes')
+            dates = dates.astype('datetime64[us]')
+        except (TypeError, ValueError):
+            return np.fromiter((to_epoch(date) for date in dates), dtype=np.int64,
+                               count=len(dates))
+    return dates.astype('datetime64[us]').astype(np.int64)
+
+
+def from_epoch(epoch: int) -> datetime:
+    """
+    Convert a number of microseconds since the Unix epoch into a naive datetime, in UTC.
+    """
+    return _EPOCH + timedelta(microseconds=int(epoch))
+
+
+def _period_growth(start_value: np.float64, end_value: np.float64) -> np.float64:
+    """ The growth factor of a single sub-period. """
+    if start_value == 0:
+        # Keep NumPy's inf/nan result, without warning every time a snapshot is added
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (end_value - start_value) / start_value + 1
+    return (end_value - start_value) / start_value + 1
+
+
+def _cumulative_growth(total_deposited: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    The time-weighted growth factor from the first snapshot up to each snapshot: the
+    growth of every completed sub-period, times the growth of the current sub-period so
+    far. A new sub-period starts whenever the total deposited changes.
+    """
+    if len(values) == 0:
+        return np.empty(0)
+    is_period_start = np.append(True, total_deposited[1:] != total_deposited[:-1])
+    periods = np.cumsum(is_period_start) - 1
+    period_starts = np.flatnonzero(is_period_start)
+    start_values = values[period_starts]
+    end_values = values[period_starts[1:] - 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # The growth of every sub-period completed before each one started
+        closed_growth = np.cumprod(np.append(
+            1.0, (end_values - start_values[:-1]) / start_values[:-1] + 1))
+        return closed_growth[periods] * (
+            (values - start_values[periods]) / start_values[periods] + 1)
+
+
+class _SnapshotList(list):
+    """ A list of portfolio snapshots which can't be modified in place. """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('portfolio_history is read-only; record transactions through '
+                        'the InvestmentPortfolio methods instead.')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+
+class PortfolioHistory:
+    def __init__(self, snapshots: Iterable[dict] = None, capacity: int = 16):
+        """
+        Columnar store of portfolio snapshots, kept in order of ascending date. Each
+        field is held in its own NumPy array, which grows geometrically so that
+        appending a snapshot is amortised O(1).
+
+        Parameters
+        ----------
+        snapshots : Iterable[dict]
+            Snapshots to initialise the history with, each a dictionary with keys
+            'date', 'total_deposited', 'current_portfolio_value' and
+            'transaction_type'. These are stored in the order given; missing values are
+            stored as NaN. Dates are stored in UTC: timezone-aware dates are converted,
+            and read back as naive UTC datetimes.
+        capacity : int
+            The number of snapshots to allocate space for up front.
+        """
+        snapshots = list(snapshots or [])
+        capacity = max(capacity, len(snapshots), 1)
+
+        self._size = 0
+        self._dates = np.empty(capacity, dtype=np.int64)
+        self._total_deposited = np.empty(capacity, dtype=np.float64)
+        self._current_portfolio_value = np.empty(capacity, dtype=np.float64)
+        self._transaction_codes = np.empty(capacity, dtype=np.uint8)
+        self._transaction_types = list(TRANSACTION_TYPES)
+
+        # Running time-weighted return: the product of the growth factors of every
+        # completed sub-period, and the value at the start of the current sub-period.
+        # If snapshots are inserted out of order, these are recalculated when next read
+        self._closed_growth = 1.0
+        self._period_start_value = np.nan
+        self._growth_is_stale = False
+
+        # Aggregates over every prefix of the history, calculated when first needed and
+        # discarded whenever a snapshot is recorded
+        self._prefix_aggregates = {}
+
+        # Counts every change to the snapshots, so owners can tell when it has changed
+        self._mutation_count = 0
+
+        # Whether valuation updates have been removed by `compacted`, and if so, the
+        # calendar period whose latest valuations were kept as checkpoints, if any
+        self._is_compacted = False
+        self._checkpoints = None
+
+        for snapshot in snapshots:
+            self._store(self._size, to_epoch(snapshot['date']),
+                        snapshot.get('total_deposited', np.nan),
+                        snapshot.get('current_portfolio_value', np.nan),
+                        snapshot.get('transaction_type'))
+
+    @classmethod
+    def from_arrays(cls, dates: np.ndarray, total_deposited: np.ndarray,
+                    current_portfolio_value: np.ndarray, transaction_codes: np.ndarray,
+                    transaction_types: Sequence[str] = TRANSACTION_TYPES,
+                    running_growth: Tuple[float, float] = None) -> 'PortfolioHistory':
+        """
+        Create a history which uses the given arrays as its columns, without copying
+        them. e.g. read-only memory-mapped arrays, which are then only read from disk
+        as they're used. The arrays are copied if more snapshots are recorded.
+
+        Parameters
+        ----------
+        dates : np.ndarray
+            The snapshot dates, in microseconds since the epoch, in ascending order.
+        total_deposited : np.ndarray
+            The total deposited at each snapshot.
+        current_portfolio_value : np.ndarray
+            The portfolio value at each snapshot.
+        transaction_codes : np.ndarray
+            The transaction type code of each snapshot.
+        transaction_types : Sequence[str]
+            The transaction type names, indexed by transaction code.
+        running_growth : Tuple[float, float]
+            The `running_growth` of the history these arrays were saved from. If not
+            provided, it is calculated from the arrays when first needed.
+
+        Returns
+        -------
+        PortfolioHistory : The history backed by the given arrays.
+        """
+        history = cls(capacity=1)
+        history._dates = dates
+        history._total_deposited = total_deposited
+        history._current_portfolio_value = current_portfolio_value
+        history._transaction_codes = transaction_codes
+        history._transaction_types = list(transaction_types)
+        history._size = len(dates)
+        if running_growth is None:
+            history._growth_is_stale = True
+        else:
+            history._closed_growth, history._period_start_value = running_growth
+        return history
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getstate__(self) -> dict:
+        # Don't pickle the unused capacity at the end of each array
+        state = self.__dict__.copy()
+        for column in ('_dates', '_total_deposited', '_current_portfolio_value',
+                       '_transaction_codes'):
+            state[column] = state[column][:self._size].copy()
+        state['_prefix_aggregates'] = {}
+        return state
+
+    def __setstate__(self, state: dict):
+        state.setdefault('_prefix_aggregates', {})
+        state.setdefault('_mutation_count', 0)
+        state.setdefault('_is_compacted', False)
+        state.setdefault('_checkpoints', None)
+        self.__dict__.update(state)
+
+    @property
+    def dates(self) -> np.ndarray:
+        """ Read-only view of the snapshot dates, in microseconds since the epoch. """
+        return self._view(self._dates)
+
+    @property
+    def total_deposited(self) -> np.ndarray:
+        """ Read-only view of the total deposited at each snapshot. """
+        return self._view(self._total_deposited)
+
+    @property
+    def current_portfolio_value(self) -> np.ndarray:
+        """ Read-only view of the portfolio value at each snapshot. """
+        return self._view(self._current_portfolio_value)
+
+    @property
+    def transaction_codes(self) -> np.ndarray:
+        """ Read-only view of the transaction type code of each snapshot. """
+        return self._view(self._transaction_codes)
+
+    @property
+    def transaction_types(self) -> List[str]:
+        """ The transaction type names, indexed by transaction code. """
+        return list(self._transaction_types)
+
+    @property
+    def mutation_count(self) -> int:
+        """ The number of times snapshots have been recorded in the history. """
+        return self._mutation_count
+
+    @property
+    def time_weighted_growth(self) -> float:
+        """
+        The time-weighted growth factor of the whole history, e.g. 1.18 represents 18%
+        growth. This is maintained as snapshots are recorded, so reading it is O(1).
+        """
+        self._refresh_growth()
+        if self._size == 0:
+            return np.nan
+        return self._closed_growth * _period_growth(
+            self._period_start_value, self._current_portfolio_value[self._size - 1])
+
+    @property
+    def running_growth(self) -> Tuple[float, float]:
+        """
+        The state behind `time_weighted_growth`: the growth factor of every completed
+        sub-period, and the value at the start of the current sub-period.
+        """
+        self._refresh_growth()
+        return float(self._closed_growth), float(self._period_start_value)
+
+    @property
+    def cumulative_growth(self) -> np.ndarray:
+        """
+        The time-weighted growth factor from the first snapshot up to each snapshot,
+        i.e. `time_weighted_growth` as it was when each snapshot was recorded.
+        Calculated once, then kept until the next snapshot is recorded.
+        """
+        growth = self._prefix_aggregates.get('cumulative_growth')
+        if growth is None:
+            growth = self._prefix_aggregates['cumulative_growth'] = self._view(
+                _cumulative_growth(self.total_deposited, self.current_portfolio_value))
+        return growth
+
+    @property
+    def cash_flow_indices(self) -> np.ndarray:
+        """
+        The indices of the deposit and withdrawal snapshots, in ascending order.
+        Calculated once, then kept until the next snapshot is recorded.
+        """
+        indices = self._prefix_aggregates.get('cash_flow_indices')
+        if indices is None:
+            is_cash_flow = np.isin(self.transaction_codes,
+                                   [self.transaction_code(DEPOSIT),
+                                    self.transaction_code(WITHDRAWAL)])
+            indices = self._prefix_aggregates['cash_flow_indices'] = self._view(
+                np.flatnonzero(is_cash_flow))
+        return indices
+
+    def transaction_code(self, transaction_type: str) -> Optional[int]:
+        """ Return the code of a transaction type, or None if it has never been used. """
+        try:
+            return self._transaction_types.index(transaction_type)
+        except ValueError:
+            return None
+
+    def date_at(self, index: int) -> datetime:
+        """ The date of the snapshot at the given index, as a naive UTC datetime. """
+        return from_epoch(self.dates[index])
+
+    def index_at(self, dates: Union[datetime, Iterable]) -> Union[int, np.ndarray]:
+        """
+        Return the index of the latest snapshot on or before a date, or -1 if there is
+        none, by binary search. Given many dates, returns an array of indices.
+        """
+        if isinstance(dates, (datetime, np.datetime64, str)):
+            return int(np.searchsorted(self.dates, to_epoch(dates), side='right')) - 1
+        return np.searchsorted(self.dates, to_epoch_array(dates), side='right') - 1
+
+    def between(self, start: datetime = None, end: datetime = None) -> 'PortfolioHistory':
+        """
+        Return the snapshots dated from `start` to `end` inclusive, as a history of
+        read-only views of this one's columns rather than copies.
+
+        Parameters
+        ----------
+        start : datetime
+            The earliest date to include. Defaults to the first snapshot.
+        end : datetime
+            The latest date to include. Defaults to the latest snapshot.
+
+        Returns
+        -------
+        PortfolioHistory : The snapshots between the dates. Recording snapshots in it
+            copies its columns first, leaving this history unchanged.
+        """
+        first = 0 if start is None else int(np.searchsorted(self.dates, to_epoch(start)))
+        last = self._size if end is None else self.index_at(end) + 1
+        last = max(first, last)
+        history = PortfolioHistory.from_arrays(
+            self.dates[first:last], self.total_deposited[first:last],
+            self.current_portfolio_value[first:last],
+            self.transaction_codes[first:last], self._transaction_types)
+        history._is_compacted, history._checkpoints = self._is_compacted, self._checkpoints
+        return history
+
+    def has_checkpoints(self, period: str) -> bool:
+        """
+        Whether the history still has the latest valuation of every day, month or year
+        (DAILY, MONTHLY or YEARLY), as returns linked over each period need. This is
+        always the case unless it was compacted without checkpoints at least as
+        frequent.
+        """
+        if not self._is_compacted:
+            return True
+        periods = list(_CHECKPOINT_UNITS)
+        return (self._checkpoints is not None
+                and periods.index(self._checkpoints) <= periods.index(period))
+
+    def append(self, date: datetime, total_deposited: Union[int, float],
+               current_portfolio_value: Union[int, float],
+               transaction_type: str) -> int:
+        """
+        Record a snapshot, keeping the history in order of ascending date. Snapshots
+        sharing a date are kept in the order they were recorded.
+
+        Returns
+        -------
+        int : The index at which the snapshot was stored.
+        """
+        epoch = to_epoch(date)
+        index = self._size
+
+        # Snapshots almost always belong at the end, so only search when they don't
+        if index and epoch < self._dates[index - 1]:
+            index = int(np.searchsorted(self._dates[:self._size], epoch, side='right'))
+
+        self._store(index, epoch, total_deposited, current_portfolio_value,
+                    transaction_type)
+        return index
+
+    def extend(self, dates: np.ndarray, total_deposited: np.ndarray,
+               current_portfolio_value: np.ndarray, transaction_codes: np.ndarray):
+        """
+        Record many snapshots at once. The snapshots must already be in order of
+        ascending date, and be no earlier than the latest snapshot in the history.
+
+        Parameters
+        ----------
+        dates : np.ndarray
+            The snapshot dates, in microseconds since the epoch.
+        total_deposited : np.ndarray
+            The total deposited at each snapshot.
+        current_portfolio_value : np.ndarray
+            The portfolio value at each snapshot.
+        transaction_codes : np.ndarray
+            The transaction type code of each snapshot. See `transaction_code`.
+        """
+        start, end = self._size, self._size + len(dates)
+        self._reserve(end)
+        self._dates[start:end] = dates
+        self._total_deposited[start:end] = total_deposited
+        self._current_portfolio_value[start:end] = current_portfolio_value
+        self._transaction_codes[start:end] = transaction_codes
+        self._size = end
+        self._prefix_aggregates.clear()
+        self._mutation_count += 1
+
+        if not self._growth_is_stale:
+            self._advance_growth(start)
+
+    def extend_values(self, dates: np.ndarray, current_portfolio_value: np.ndarray):
+        """
+        Record many value updates at once, with the total deposited unchanged since the
+        latest snapshot. As with `extend`, the snapshots must be in order of ascending
+        date, and be no earlier than the latest snapshot in the history, which must
+        exist.
+
+        Value updates don't start a new sub-period, so unlike `extend` this doesn't
+        touch the running time-weighted return.
+
+        Parameters
+        ----------
+        dates : np.ndarray
+            The snapshot dates, in microseconds since the epoch.
+        current_portfolio_value : np.ndarray
+            The portfolio value at each snapshot.
+        """
+        start, end = self._size, self._size + len(dates)
+        if start == 0:
+            raise ValueError('Value updates must follow an existing snapshot.')
+        self._reserve(end)
+        self._dates[start:end] = dates
+        self._total_deposited[start:end] = self._total_deposited[start - 1]
+        self._current_portfolio_value[start:end] = current_portfolio_value
+        self._transaction_codes[start:end] = self._code_for(UPDATE_PORTFOLIO_VALUE)
+        self._size = end
+        self._prefix_aggregates.clear()
+        self._mutation_count += 1
+
+        # Unless the total deposited is missing, as NaN starts a sub-period every time
+        if not self._growth_is_stale and np.isnan(self._total_deposited[start - 1]):
+            self._advance_growth(start)
+
+    def append_value(self, date: int, current_portfolio_value: float):
+        """
+        Record a single value update, as `extend_values` does for many. Scalars are
+        stored directly, avoiding the overhead of array assignments, for when many
+        histories are each given one value update.
+
+        Parameters
+        ----------
+        date : int
+            The snapshot date, in microseconds since the epoch.
+        current_portfolio_value : float
+            The portfolio value at the snapshot.
+        """
+        start = self._size
+        if start == 0:
+            raise ValueError('Value updates must follow an existing snapshot.')
+        self._reserve(start + 1)
+        total_deposited = self._total_deposited[start - 1]
+        self._dates[start] = date
+        self._total_deposited[start] = total_deposited
+        self._current_portfolio_value[start] = current_portfolio_value
+        self._transaction_codes[start] = self._code_for(UPDATE_PORTFOLIO_VALUE)
+        self._size = start + 1
+        self._prefix_aggregates.clear()
+        self._mutation_count += 1
+
+        if not self._growth_is_stale and math.isnan(total_deposited):
+            self._advance_growth(start)
+
+    def to_records(self) -> List[dict]:
+        """
+        Return the history as a read-only list of snapshot dictionaries, with keys
+        'date', 'total_deposited', 'current_portfolio_value' and 'transaction_type'.
+        Dates are naive datetimes in UTC, including those recorded timezone-aware.
+        """
+        types = self._transaction_types
+        return _SnapshotList(
+            {'date': from_epoch(date),
+             'total_deposited': total_deposited,
+             'current_portfolio_value': current_portfolio_value,
+             'transaction_type': types[code]}
+            for date, total_deposited, current_portfolio_value, code in zip(
+                self.dates.tolist(), self.total_deposited.tolist(),
+                self.current_portfolio_value.tolist(), self.transaction_codes.tolist())
+        )
+
+    def compacted(self, checkpoints: str = None) -> 'PortfolioHistory':
+        """
+        Return a copy of the history without the valuation updates that no return
+        calculation needs: those in the middle of a run of snapshots with the same total
+        deposited. Every cash flow is kept, as is the first and last snapshot of each
+        sub-period (the snapshots either side of a change in the total deposited), so
+        time-weighted and money-weighted returns over the whole history are unchanged,
+        exactly. See InvestmentPortfolio.compact_history for what isn't.
+
+        Parameters
+        ----------
+        checkpoints : str
+            Also keep the latest snapshot of each day, month or year (DAILY, MONTHLY or
+            YEARLY), e.g. to keep month-end valuations for rolling returns.
+
+        Returns
+        -------
+        PortfolioHistory : The compacted history.
+        """
+        if checkpoints is not None and checkpoints not in _CHECKPOINT_UNITS:
+            raise ValueError(f'Unknown checkpoints: {checkpoints}. Expected one of '
+                             f'{list(_CHECKPOINT_UNITS)}.')
+        dates = self.dates
+        total_deposited = self.total_deposited
+        codes = self.transaction_codes
+
+        keep = codes != self.transaction_code(UPDATE_PORTFOLIO_VALUE)
+        if len(keep):
+            # NaN never equals itself, so snapshots missing a total are always kept
+            period_changes = total_deposited[1:] != total_deposited[:-1]
+            keep[0] = keep[-1] = True
+            keep[1:] |= period_changes
+            keep[:-1] |= period_changes
+
+            if checkpoints is not None:
+                periods = dates.astype('datetime64[us]').astype(
+                    f'datetime64[{_CHECKPOINT_UNITS[checkpoints]}]')
+                keep[:-1] |= periods[1:] != periods[:-1]
+
+        # The kept snapshots have the same sub-periods, so the running time-weighted
+        # return carries over
+        history = PortfolioHistory.from_arrays(
+            dates[keep], total_deposited[keep], self.current_portfolio_value[keep],
+            codes[keep], self._transaction_types, running_growth=self.running_growth)
+
+        # Compacting again can't bring back checkpoints that are already gone
+        if checkpoints is not None and not self.has_checkpoints(checkpoints):
+            checkpoints = self._checkpoints
+        history._is_compacted, history._checkpoints = True, checkpoints
+        return history
+
+    def _store(self, index: int, epoch: int, total_deposited: Union[int, float],
+               current_portfolio_value: Union[int, float], transaction_type: str):
+        """ Write a snapshot at the given index, shifting any later snapshots along. """
+        self._reserve(self._size + 1)
+        columns = (self._dates, self._total_deposited, self._current_portfolio_value,
+                   self._transaction_codes)
+        if index < self._size:
+            for column in columns:
+                column[index + 1:self._size + 1] = column[index:self._size]
+
+        self._dates[index] = epoch
+        self._total_deposited[index] = total_deposited
+        self._current_portfolio_value[index] = current_portfolio_value
+        self._transaction_codes[index] = self._code_for(transaction_type)
+        self._size += 1
+        self._prefix_aggregates.clear()
+        self._mutation_count += 1
+
+        # Update the running time-weighted return
+        if index < self._size - 1:
+            self._growth_is_stale = True
+        elif not self._growth_is_stale:
+            value = self._current_portfolio_value[index]
+            if index == 0:
+                self._period_start_value = value
+            elif self._total_deposited[index] != self._total_deposited[index - 1]:
+                self._closed_growth *= _period_growth(
+                    self._period_start_value, self._current_portfolio_value[index - 1])
+                self._period_start_value = value
+
+    def _refresh_growth(self):
+        """ Recalculate the running time-weighted return, if it's out of date. """
+        if self._growth_is_stale:
+            self._closed_growth = 1.0
+            self._advance_growth(0)
+            self._growth_is_stale = False
+
+    def _advance_growth(self, start: int):
+        """
+        Fold the snapshots from index `start` onwards into the running time-weighted
+        return, using array operations rather than a snapshot at a time.
+        """
+        if start >= self._size:
+            return
+        total_deposited = self._total_deposited[:self._size]
+        values = self._current_portfolio_value[:self._size]
+        if start == 0:
+            self._period_start_value = values[0]
+            start = 1
+
+        # Indices of the snapshots which start a new sub-period
+        new_periods = start + np.flatnonzero(total_deposited[start:]
+                                             != total_deposited[start - 1:-1])
+        if len(new_periods):
+            start_values = np.append(self._period_start_value, values[new_periods[:-1]])
+            end_values = values[new_periods - 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._closed_growth *= np.prod(
+                    (end_values - start_values) / start_values + 1)
+            self._period_start_value = values[new_periods[-1]]
+
+    def _code_for(self, transaction_type: str) -> int:
+        """ Return the code of a transaction type, registering it if it's new. """
+        code = self.transaction_code(transaction_type)
+        if code is None:
+            self._transaction_types.append(transaction_type)
+            code = len(self._transaction_types) - 1
+        return code
+
+    def _reserve(self, size: int):
+        """ Ensure there is room for at least `size` snapshots, doubling if not. """
+        capacity = len(self._dates)
+        if size <= capacity:
+            return
+
+        new_capacity = max(size, 2 * capacity)
+        for column in ('_dates', '_total_deposited', '_current_portfolio_value',
+                       '_transaction_codes'):
+            old = getattr(self, column)
+            new = np.empty(new_capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, column, new)
+
+    def _view(self, column: np.ndarray) -> np.ndarray:
+        view = column[:self._size]
+        view.flags.writeable = False
+        return view
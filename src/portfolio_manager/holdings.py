@@ -0,0 +1,163 @@
+from datetime import datetime
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from portfolio_manager.exceptions import BackDatingError, InsufficientData
+from portfolio_manager.history import to_epoch, to_epoch_array
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+class Holdings:
+    def __init__(self, portfolios: Sequence[InvestmentPortfolio], assets: Sequence[str],
+                 quantities: np.ndarray = None):
+        """
+        The positions many portfolios hold in a common set of assets, as a matrix of
+        quantities with a row per portfolio and a column per asset. All of the
+        portfolios can be valued, and their values recorded, from a vector of prices
+        (or a matrix of prices on many dates) with a single matrix multiply.
+
+        Positions are optional: portfolios without Holdings are still valued by passing
+        their value to InvestmentPortfolio.update_portfolio_value.
+
+        Parameters
+        ----------
+        portfolios : Sequence[InvestmentPortfolio]
+            The portfolios holding the assets, one per row of `quantities`.
+        assets : Sequence[str]
+            The names of the assets, one per column of `quantities`, and in the order
+            prices are given.
+        quantities : np.ndarray
+            The quantity of each asset held by each portfolio. Defaults to none of any.
+        """
+        self.portfolios = list(portfolios)
+        self.assets = list(assets)
+        if len(set(self.assets)) != len(self.assets):
+            raise ValueError('Asset names must be unique.')
+        self._asset_indices = {asset: i for i, asset in enumerate(self.assets)}
+        self._portfolio_indices = {id(portfolio): i
+                                   for i, portfolio in enumerate(self.portfolios)}
+
+        shape = (len(self.portfolios), len(self.assets))
+        if quantities is None:
+            self.quantities = np.zeros(shape)
+        else:
+            self.quantities = np.array(quantities, dtype=np.float64)
+            if self.quantities.shape != shape:
+                raise ValueError(f'quantities must have shape {shape}, with a row per '
+                                 f'portfolio and a column per asset.')
+
+    def position(self, portfolio: InvestmentPortfolio, asset: str) -> float:
+        """ The quantity of an asset held by a portfolio. """
+        return float(self.quantities[self._portfolio_index(portfolio),
+                                     self._asset_indices[asset]])
+
+    def set_position(self, portfolio: InvestmentPortfolio, asset: str,
+                     quantity: Union[int, float]):
+        """ Set the quantity of an asset held by a portfolio. """
+        self.quantities[self._portfolio_index(portfolio),
+                        self._asset_indices[asset]] = quantity
+
+    def values(self, prices: np.ndarray) -> np.ndarray:
+        """
+        Value every portfolio's positions at the given prices, without recording
+        anything.
+
+        Parameters
+        ----------
+        prices : np.ndarray
+            The price of each asset, in the order of `assets`. Or a matrix of prices,
+            with a row per date and a column per asset.
+
+        Returns
+        -------
+        np.ndarray : The value of each portfolio, or a matrix of values with a row per
+            date and a column per portfolio.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.ndim not in (1, 2) or prices.shape[-1] != len(self.assets):
+            raise ValueError(f'Expected a price for each of the {len(self.assets)} '
+                             f'assets, got prices of shape {prices.shape}.')
+        return prices @ self.quantities.T
+
+    def revalue(self, prices: np.ndarray,
+                dates: Union[datetime, Sequence[datetime]]) -> np.ndarray:
+        """
+        Mark every portfolio to market: value its positions at the given prices, and
+        record each value as a value update, as `update_portfolio_value` does. Each
+        portfolio's snapshots are recorded in one step. If any portfolio can't be
+        updated, an error is raised and none of them are.
+
+        The valuation is a single matrix multiply, but recording still takes a step per
+        portfolio, so prices on a single date are recorded only a few times faster than
+        by calling `update_portfolio_value` on each portfolio. A matrix of prices on
+        many dates gains the most.
+
+        Parameters
+        ----------
+        prices : np.ndarray
+            The price of each asset on `dates`, in the order of `assets`. Or a matrix
+            of prices with a row per date, to record a value update on each date.
+        dates : Union[datetime, Sequence[datetime]]
+            When the prices are from: a single date for a vector of prices, or one per
+            row of a matrix of prices, in strictly increasing order.
+
+        Returns
+        -------
+        np.ndarray : The value of each portfolio, or a matrix of values with a row per
+            date and a column per portfolio.
+        """
+        values = self.values(prices)
+        if values.ndim == 1:
+            dates = [dates]
+        epochs = to_epoch_array(dates)
+        values_by_portfolio = np.ascontiguousarray(np.atleast_2d(values).T)
+        if values_by_portfolio.shape[1] != len(epochs):
+            raise ValueError(f'Expected a date for each of the {len(values)} rows of '
+                             f'prices, got {len(epochs)} dates.')
+        if len(epochs) == 0:
+            return values
+
+        # Validate every portfolio before changing any of them
+        if np.any(epochs[1:] <= epochs[:-1]):
+            raise ValueError('Dates must be in strictly increasing order.')
+        first_epoch = int(epochs[0])
+        self._check_can_record(first_epoch, dates[0])
+
+        latest_date = dates[-1] if isinstance(dates[-1], datetime) else None
+        if len(epochs) == 1:
+            self._record_single(first_epoch, values_by_portfolio[:, 0], latest_date)
+            return values
+
+        for portfolio, portfolio_values in zip(self.portfolios, values_by_portfolio):
+            history = portfolio.history
+            history.extend_values(epochs, portfolio_values)
+            portfolio.current_portfolio_value = float(portfolio_values[-1])
+            portfolio.latest_transaction_date = latest_date or history.date_at(-1)
+        return values
+
+    def _check_can_record(self, first_epoch: int, first_date: datetime):
+        for portfolio in self.portfolios:
+            latest_date = portfolio.latest_transaction_date
+            if len(portfolio.history) == 0:
+                raise InsufficientData(f"{portfolio.name}: First transaction can't be a "
+                                       f"value update; make a deposit!")
+            if to_epoch(latest_date) >= first_epoch:
+                raise BackDatingError(
+                    f'{portfolio.name}: Attempted transaction: {first_date}. Latest '
+                    f'portfolio transaction: {latest_date}.')
+
+    def _record_single(self, epoch: int, values: np.ndarray,
+                       latest_date: Optional[datetime]):
+        # Storing scalars is much cheaper than assigning one-element arrays
+        for portfolio, value in zip(self.portfolios, values.tolist()):
+            history = portfolio.history
+            history.append_value(epoch, value)
+            portfolio.current_portfolio_value = value
+            portfolio.latest_transaction_date = latest_date or history.date_at(-1)
+
+    def _portfolio_index(self, portfolio: InvestmentPortfolio) -> int:
+        try:
+            return self._portfolio_indices[id(portfolio)]
+        except KeyError:
+            raise KeyError(f'{portfolio.name} has no holdings.') from None
@@ -0,0 +1,232 @@
+import functools
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from portfolio_manager import batch, return_calculators
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import ReturnCalculator
+
+# Passed to each hook after every instrumented call. start_time is the wall-clock time
+# the call started, duration is in seconds, history_size is the number of snapshots in
+# the portfolio involved (or None), and error is the exception raised (or None)
+CallRecord = namedtuple('CallRecord', ['name', 'start_time', 'duration', 'history_size',
+                                       'error'])
+
+# The methods and functions instrumented, by the class or module they belong to.
+# ReturnCalculator.calculate_return is instrumented on every subclass defining it. The
+# XIRR solver is instrumented where both the calculators and the batch functions call
+# it, and counted together
+_TARGETS = [
+    (InvestmentPortfolio, ['deposit', 'withdraw', 'update_portfolio_value',
+                           'apply_transactions', '_update_portfolio_history',
+                           'save_portfolio']),
+    (return_calculators, ['xirr']),
+    (batch, ['simple_returns', 'time_weighted_returns', 'money_weighted_returns',
+             'modified_dietz_returns', 'xirr']),
+]
+
+# The number of most recent latencies kept per method, to calculate percentiles from
+LATENCY_SAMPLES = 1024
+PERCENTILES = (50, 90, 99)
+
+_lock = threading.Lock()
+_stats: Dict[str, '_MethodStats'] = {}
+_hooks: List[Callable[[CallRecord], None]] = []
+_originals = []
+
+
+class _MethodStats:
+    def __init__(self):
+        """ The statistics collected for one instrumented method. """
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.max_history_size = None
+
+    def record(self, duration: float, history_size: Optional[int], failed: bool):
+        self.count += 1
+        self.errors += failed
+        self.total_seconds += duration
+        self.latencies.append(duration)
+        if history_size is not None:
+            self.max_history_size = max(self.max_history_size or 0, history_size)
+
+    def to_dict(self) -> dict:
+        percentiles = (np.percentile(self.latencies, PERCENTILES) if self.latencies
+                       else [np.nan] * len(PERCENTILES))
+        stats = {
+            'count': self.count,
+            'errors': self.errors,
+            'total_seconds': self.total_seconds,
+            'mean_seconds': self.total_seconds / self.count if self.count else np.nan,
+            'max_history_size': self.max_history_size,
+        }
+        for percentile, latency in zip(PERCENTILES, percentiles):
+            stats[f'p{percentile}_seconds'] = float(latency)
+        return stats
+
+
+def enable():
+    """
+    Start collecting statistics about calls to the InvestmentPortfolio and
+    ReturnCalculator methods, the batch return functions, and the XIRR solver.
+
+    Instrumentation works by replacing the methods with wrappers while it's enabled, and
+    restoring the originals when it's disabled, so it costs nothing while disabled.
+    ReturnCalculator subclasses defined after enabling aren't instrumented, and nor are
+    calls made in the worker processes of a ParallelReturnEngine. Functions are
+    replaced on their modules, so a batch function imported by name (e.g. `from
+    portfolio_manager.batch import money_weighted_returns`) isn't instrumented, though
+    the XIRR solver it calls still is.
+    """
+    with _lock:
+        if _originals:
+            return
+        for owner, attribute in _instrumented_attributes():
+            original = vars(owner)[attribute]
+            _originals.append((owner, attribute, original))
+            name = _qualified_name(owner, attribute)
+            setattr(owner, attribute, _instrument(original, name))
+
+
+def disable():
+    """ Stop collecting statistics, restoring the uninstrumented methods. """
+    with _lock:
+        while _originals:
+            owner, attribute, original = _originals.pop()
+            setattr(owner, attribute, original)
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def reset():
+    """ Discard the statistics collected so far. """
+    with _lock:
+        _stats.clear()
+
+
+def add_hook(hook: Callable[[CallRecord], None]):
+    """
+    Call `hook` with a CallRecord after every instrumented call, e.g. to create spans in
+    a tracing system. Hooks run in the calling thread, so should be fast.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[CallRecord], None]):
+    _hooks.remove(hook)
+
+
+def get_stats() -> Dict[str, dict]:
+    """
+    Return the statistics collected for each instrumented method, by name: the number
+    of calls and errors, the total and mean time spent, the 50th, 90th and 99th
+    percentile latencies of the most recent calls, and the largest portfolio history
+    involved.
+    """
+    with _lock:
+        return {name: stats.to_dict() for name, stats in sorted(_stats.items())}
+
+
+def to_prometheus(prefix: str = 'portfolio_manager') -> str:
+    """
+    Return the collected statistics in the Prometheus text exposition format.
+
+    Parameters
+    ----------
+    prefix : str
+        The prefix of every metric name.
+
+    Returns
+    -------
+    str : The metrics, ready to be served from a /metrics endpoint.
+    """
+    stats = get_stats()
+    lines = [f'# HELP {prefix}_calls_total Calls to each instrumented method.',
+             f'# TYPE {prefix}_calls_total counter']
+    lines += [f'{prefix}_calls_total{{method="{name}"}} {method["count"]}'
+              for name, method in stats.items()]
+    lines += [f'# HELP {prefix}_call_errors_total Calls which raised an exception.',
+              f'# TYPE {prefix}_call_errors_total counter']
+    lines += [f'{prefix}_call_errors_total{{method="{name}"}} {method["errors"]}'
+              for name, method in stats.items()]
+
+    lines += [f'# HELP {prefix}_call_seconds Latency of each instrumented method.',
+              f'# TYPE {prefix}_call_seconds summary']
+    for name, method in stats.items():
+        for percentile in PERCENTILES:
+            lines.append(f'{prefix}_call_seconds{{method="{name}",'
+                         f'quantile="{percentile / 100}"}} '
+                         f'{method[f"p{percentile}_seconds"]!r}')
+        lines.append(f'{prefix}_call_seconds_sum{{method="{name}"}} '
+                     f'{method["total_seconds"]!r}')
+        lines.append(f'{prefix}_call_seconds_count{{method="{name}"}} {method["count"]}')
+
+    lines += [f'# HELP {prefix}_history_size_max Largest portfolio history passed to '
+              f'each method.',
+              f'# TYPE {prefix}_history_size_max gauge']
+    lines += [f'{prefix}_history_size_max{{method="{name}"}} '
+              f'{method["max_history_size"]}'
+              for name, method in stats.items() if method['max_history_size'] is not None]
+    return '\n'.join(lines) + '\n'
+
+
+def _instrumented_attributes():
+    """ Yield (owner, attribute) for every method or function to instrument. """
+    for owner, attributes in _TARGETS:
+        for attribute in attributes:
+            yield owner, attribute
+
+    calculators = ReturnCalculator.__subclasses__()
+    while calculators:
+        calculator = calculators.pop()
+        calculators.extend(calculator.__subclasses__())
+        if 'calculate_return' in vars(calculator):
+            yield calculator, 'calculate_return'
+
+
+def _qualified_name(owner, attribute: str) -> str:
+    return f'{owner.__name__}.{attribute}' if isinstance(owner, type) else attribute
+
+
+def _instrument(function: Callable, name: str) -> Callable:
+    """ Wrap a function to record its latency, history size and any errors. """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start_time = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            return function(*args, **kwargs)
+        except BaseException as exception:
+            error = exception
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            history_size = _history_size(args)
+            with _lock:
+                stats = _stats.get(name)
+                if stats is None:
+                    stats = _stats[name] = _MethodStats()
+                stats.record(duration, history_size, error is not None)
+            if _hooks:
+                record = CallRecord(name, start_time, duration, history_size, error)
+                for hook in list(_hooks):
+                    hook(record)
+
+    return wrapper
+
+
+def _history_size(args: tuple) -> Optional[int]:
+    """ The size of the history of the portfolio among the first two arguments. """
+    for argument in args[:2]:
+        if isinstance(argument, InvestmentPortfolio):
+            return len(argument.history)
+    return None
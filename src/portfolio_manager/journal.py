@@ -0,0 +1,264 @@
+import os
+import pickle
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+# A journal starts with a header identifying the checkpoint it follows on from. Each
+# save then appends a frame: a frame header, the new snapshots, and the pickled state
+# of the portfolio's other attributes (totals, latest transaction date, etc.)
+_MAGIC = b'PMJ1'
+_FILE_HEADER = struct.Struct('<4sQ')  # magic, checkpoint generation
+_FRAME_HEADER = struct.Struct('<qIII')  # first snapshot index, n snapshots, state size, crc
+_SNAPSHOT = np.dtype([('date', '<i8'), ('total_deposited', '<f8'),
+                      ('current_portfolio_value', '<f8'), ('transaction_code', 'u1')])
+
+# The extensions of the checkpoint and journal files
+JOURNAL_EXTENSIONS = ('.checkpoint', '.journal')
+
+# Attributes which are stored in the snapshots, or are never persisted
+_UNJOURNALED_ATTRIBUTES = ('_history', '_history_version', '_history_mutations',
+                           '_journal')
+
+
+class PortfolioJournal:
+    def __init__(self, name: str, directory: str = None, sync_every: int = 16,
+                 checkpoint_every: int = 100_000):
+        """
+        Saves a portfolio as a checkpoint, '{name}.checkpoint', followed by an
+        append-only journal of the changes since, '{name}.journal'. Each save appends
+        only the snapshots recorded since the previous save, so saving after every
+        transaction costs time proportional to the transaction, not the whole history.
+
+        Writes are flushed to the operating system on every save, but only fsync'd
+        every `sync_every` saves, or on `sync` or `close`. Once the journal holds
+        `checkpoint_every` snapshots, it is compacted into a new checkpoint. Checkpoints
+        are written to a temporary file and renamed into place, and each journal frame
+        carries a checksum, so a crash mid-write loses at most the unsynced saves.
+
+        Parameters
+        ----------
+        name : str
+            The name of the portfolio. i.e. the 'name' attribute of the saved portfolio.
+        directory : str
+            The directory to save the files in. Defaults to the current working
+            directory.
+        sync_every : int
+            The number of saves between each fsync of the journal.
+        checkpoint_every : int
+            The number of journaled snapshots after which the journal is compacted into
+            a new checkpoint.
+        """
+        self.name = name
+        self.directory = directory
+        prefix = os.path.join(directory, name) if directory else name
+        self.checkpoint_path, self.journal_path = (f'{prefix}{extension}'
+                                                   for extension in JOURNAL_EXTENSIONS)
+        self.sync_every = sync_every
+        self.checkpoint_every = checkpoint_every
+
+        self._file = None
+        self._generation = 0
+        self._unsynced_saves = 0
+        self._journaled_snapshots = 0
+
+        # What has been saved so far, to work out what is new on the next save
+        self._history = None
+        self._saved_size = 0
+        self._saved_version = None
+        self._n_transaction_types = 0
+        self._last_saved_date = None
+
+    def __enter__(self) -> 'PortfolioJournal':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def exists(self) -> bool:
+        """ Whether a checkpoint has been saved for this portfolio. """
+        return os.path.exists(self.checkpoint_path)
+
+    def save(self, portfolio: InvestmentPortfolio):
+        """
+        Save the portfolio, appending the snapshots recorded since the last save to the
+        journal. A new checkpoint is written instead if this is the first save, or if
+        the history has changed other than by recording new snapshots.
+
+        Parameters
+        ----------
+        portfolio : InvestmentPortfolio
+            The portfolio to save.
+        """
+        if portfolio.history_version == self._saved_version:
+            return
+        if not self._can_append(portfolio):
+            self.checkpoint(portfolio)
+            return
+
+        history = portfolio.history
+        start, end = self._saved_size, len(history)
+        snapshots = np.empty(end - start, dtype=_SNAPSHOT)
+        snapshots['date'] = history.dates[start:]
+        snapshots['total_deposited'] = history.total_deposited[start:]
+        snapshots['current_portfolio_value'] = history.current_portfolio_value[start:]
+        snapshots['transaction_code'] = history.transaction_codes[start:]
+        payload = snapshots.tobytes() + pickle.dumps(_journaled_state(portfolio),
+                                                     pickle.HIGHEST_PROTOCOL)
+
+        self._file.write(_FRAME_HEADER.pack(start, end - start,
+                                            len(payload) - snapshots.nbytes,
+                                            zlib.crc32(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        self._saved(portfolio)
+        self._journaled_snapshots += end - start
+
+        self._unsynced_saves += 1
+        if self._unsynced_saves >= self.sync_every:
+            self.sync()
+        if self._journaled_snapshots >= self.checkpoint_every:
+            self.checkpoint(portfolio)
+
+    def checkpoint(self, portfolio: InvestmentPortfolio):
+        """
+        Write the whole portfolio to a new checkpoint and start an empty journal.
+
+        Parameters
+        ----------
+        portfolio : InvestmentPortfolio
+            The portfolio to save.
+        """
+        self._generation += 1
+        temporary_path = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'wb') as handle:
+            pickle.dump({'generation': self._generation, 'portfolio': portfolio},
+                        handle, pickle.HIGHEST_PROTOCOL)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+        # Frames in the old journal belong to the previous generation, so are ignored
+        # if there's a crash before it is replaced
+        self.close()
+        self._file = open(self.journal_path, 'wb')
+        self._file.write(_FILE_HEADER.pack(_MAGIC, self._generation))
+        self.sync()
+        self._saved(portfolio)
+        self._journaled_snapshots = 0
+
+    def load(self) -> InvestmentPortfolio:
+        """
+        Load the portfolio from the checkpoint and the journal. Any incomplete frame at
+        the end of the journal, e.g. from a crash mid-write, is discarded.
+
+        Returns
+        -------
+        InvestmentPortfolio : The instantiated portfolio object.
+        """
+        with open(self.checkpoint_path, 'rb') as handle:
+            checkpoint = pickle.load(handle)
+        self._generation = checkpoint['generation']
+        portfolio = checkpoint['portfolio']
+
+        try:
+            with open(self.journal_path, 'rb') as handle:
+                journal = handle.read()
+        except FileNotFoundError:
+            journal = b''
+        end = self._replay(journal, portfolio)
+
+        # Continue the journal from the end of the last complete frame
+        self.close()
+        if end is None:
+            self.checkpoint(portfolio)
+        else:
+            self._file = open(self.journal_path, 'r+b')
+            self._file.truncate(end)
+            self._file.seek(end)
+            self._saved(portfolio)
+        return portfolio
+
+    def sync(self):
+        """ Force any saves not yet fsync'd to disk. """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced_saves = 0
+
+    def close(self):
+        """ Sync and close the journal. """
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _replay(self, journal: bytes, portfolio: InvestmentPortfolio) -> Optional[int]:
+        """
+        Apply the frames of a journal to the portfolio loaded from its checkpoint.
+        Returns the offset at the end of the last complete frame, or None if the journal
+        doesn't follow on from the checkpoint.
+        """
+        if len(journal) < _FILE_HEADER.size:
+            return None
+        magic, generation = _FILE_HEADER.unpack_from(journal)
+        if magic != _MAGIC or generation != self._generation:
+            return None
+
+        history = portfolio.history
+        self._journaled_snapshots = 0
+        offset = _FILE_HEADER.size
+        state = None
+        while offset + _FRAME_HEADER.size <= len(journal):
+            start, n_snapshots, state_size, crc = _FRAME_HEADER.unpack_from(journal,
+                                                                            offset)
+            payload_start = offset + _FRAME_HEADER.size
+            payload_end = payload_start + n_snapshots * _SNAPSHOT.itemsize + state_size
+            payload = journal[payload_start:payload_end]
+            if (len(payload) < payload_end - payload_start or zlib.crc32(payload) != crc
+                    or start != len(history)):
+                break
+
+            snapshots = np.frombuffer(payload, dtype=_SNAPSHOT, count=n_snapshots)
+            history.extend(snapshots['date'], snapshots['total_deposited'],
+                           snapshots['current_portfolio_value'],
+                           snapshots['transaction_code'])
+            state = payload[snapshots.nbytes:]
+            self._journaled_snapshots += n_snapshots
+            offset = payload_end
+
+        if state is not None:
+            portfolio.__setstate__(dict(portfolio.__dict__, **pickle.loads(state)))
+        return offset
+
+    def _can_append(self, portfolio: InvestmentPortfolio) -> bool:
+        """
+        Whether the portfolio's history only differs from what was last saved by new
+        snapshots at the end, which can be appended to the journal.
+        """
+        history = portfolio.history
+        return (self._file is not None
+                and history is self._history
+                and len(history) >= self._saved_size
+                and len(history.transaction_types) == self._n_transaction_types
+                and (self._saved_size == 0
+                     or history.dates[self._saved_size - 1] == self._last_saved_date))
+
+    def _saved(self, portfolio: InvestmentPortfolio):
+        """ Record what has been saved, to compare against on the next save. """
+        history = portfolio.history
+        self._history = history
+        self._saved_size = len(history)
+        self._saved_version = portfolio.history_version
+        self._n_transaction_types = len(history.transaction_types)
+        self._last_saved_date = history.dates[-1] if len(history) else None
+
+
+def _journaled_state(portfolio: InvestmentPortfolio) -> dict:
+    """ The attributes of the portfolio which aren't held in its history. """
+    return {attribute: value for attribute, value in portfolio.__dict__.items()
+            if attribute not in _UNJOURNALED_ATTRIBUTES}
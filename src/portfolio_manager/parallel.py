@@ -0,0 +1,161 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from portfolio_manager.batch import PackedHistories, _pack
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.7 has no shared memory, so each chunk is pickled to its worker instead
+    shared_memory = None
+
+# The arrays of a PackedHistories, in the order they are laid out in shared memory
+_COLUMNS = ('dates', 'total_deposited', 'current_portfolio_value', 'transaction_codes',
+            'offsets')
+_ALIGNMENT = 64
+
+# (column, dtype, byte offset, length) for each array in a shared memory block
+Layout = List[Tuple[str, str, int, int]]
+
+
+class ParallelReturnEngine:
+    def __init__(self, workers: int = None, chunk_size: int = 1000):
+        """
+        Calculates returns for many portfolios across a pool of worker processes. The
+        packed portfolio histories are copied once into shared memory, and each worker
+        reads its chunk of portfolios from there directly, rather than being sent
+        pickled portfolios. On Python 3.7, which has no shared memory, each worker is
+        sent its chunk of the packed histories pickled instead.
+
+        The engine can be used as a context manager, to keep the same worker processes
+        for several calculations and shut them down afterwards.
+
+        Parameters
+        ----------
+        workers : int
+            The number of worker processes. Defaults to the number of CPUs.
+        chunk_size : int
+            The number of portfolios each worker calculates returns for at a time.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1.')
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = None
+
+    def __enter__(self) -> 'ParallelReturnEngine':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Shut down the worker processes. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def calculate(self,
+                  batch_function: Callable[..., np.ndarray],
+                  histories: Union[PackedHistories, Sequence[InvestmentPortfolio]],
+                  annualised: bool = True) -> np.ndarray:
+        """
+        Calculate the returns of many portfolios in parallel.
+
+        Parameters
+        ----------
+        batch_function : Callable[..., np.ndarray]
+            The function from portfolio_manager.batch used to calculate the returns of
+            each chunk, e.g. time_weighted_returns.
+        histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+            The portfolios, or their packed histories.
+        annualised : bool
+            If True, calculate the annualised returns.
+
+        Returns
+        -------
+        np.ndarray : The return of each portfolio, in the order given.
+        """
+        packed = _pack(histories)
+        n_portfolios = len(packed)
+        if n_portfolios == 0:
+            return np.empty(0)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        chunks = [(start, min(start + self.chunk_size, n_portfolios))
+                  for start in range(0, n_portfolios, self.chunk_size)]
+        if shared_memory is None:
+            futures = [self._executor.submit(batch_function,
+                                             _chunk(packed, start, stop),
+                                             annualised=annualised)
+                       for start, stop in chunks]
+            return np.concatenate([future.result() for future in futures])
+
+        block, layout = _to_shared_memory(packed)
+        try:
+            futures = [
+                self._executor.submit(_calculate_chunk, batch_function, block.name,
+                                      layout, start, stop, annualised)
+                for start, stop in chunks
+            ]
+            return np.concatenate([future.result() for future in futures])
+        finally:
+            block.close()
+            block.unlink()
+
+
+def _chunk(packed: PackedHistories, start: int, stop: int) -> PackedHistories:
+    """ The packed histories of portfolios [start, stop), as views of `packed`. """
+    offsets = packed.offsets[start:stop + 1]
+    first, last = offsets[0], offsets[-1]
+    return PackedHistories(packed.dates[first:last], packed.total_deposited[first:last],
+                           packed.current_portfolio_value[first:last],
+                           packed.transaction_codes[first:last], offsets - first)
+
+
+def _to_shared_memory(packed: PackedHistories
+                      ) -> Tuple['shared_memory.SharedMemory', Layout]:
+    """ Copy packed histories into a new shared memory block. """
+    layout = []
+    size = 0
+    for column in _COLUMNS:
+        array = getattr(packed, column)
+        layout.append((column, array.dtype.str, size, len(array)))
+        size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for column, dtype, offset, length in layout:
+        shared = np.ndarray(length, dtype=dtype, buffer=block.buf, offset=offset)
+        shared[:] = getattr(packed, column)
+        del shared
+    return block, layout
+
+
+def _calculate_chunk(batch_function: Callable[..., np.ndarray], name: str,
+                     layout: Layout, start: int, stop: int,
+                     annualised: bool) -> np.ndarray:
+    """
+    Runs in a worker process. Calculate the returns of portfolios [start, stop) from the
+    packed histories in the named shared memory block, without copying them.
+    """
+    # The workers are children of the process that created the block, so share its
+    # resource tracker; attaching here doesn't take over responsibility for unlinking
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        arrays = {column: np.ndarray(length, dtype=dtype, buffer=block.buf,
+                                     offset=offset)
+                  for column, dtype, offset, length in layout}
+        chunk = _chunk(PackedHistories(**arrays), start, stop)
+        returns = batch_function(chunk, annualised=annualised)
+
+        # Release the views of the shared memory before closing it
+        del arrays, chunk
+        return returns
+    finally:
+        block.close()
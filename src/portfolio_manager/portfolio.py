@@ -1,9 +1,23 @@
+import itertools
+import os
 import pickle
 from datetime import datetime
-from typing import Union, List
+from typing import TYPE_CHECKING, Any, Mapping, Sequence, Union, List
+
+import numpy as np
 
 from portfolio_manager.exceptions import (InsufficientFunds, BackDatingError,
                                           InsufficientData)
+from portfolio_manager.history import (DEPOSIT, WITHDRAWAL, UPDATE_PORTFOLIO_VALUE,
+                                       PortfolioHistory, from_epoch, to_epoch,
+                                       to_epoch_array)
+
+if TYPE_CHECKING:
+    from portfolio_manager.storage import PortfolioStorage
+
+# Shared by all portfolios, so that a (portfolio id, history version) pair is never
+# repeated, even if a portfolio is garbage collected and its id reused
+_history_versions = itertools.count()
 
 
 class InvestmentPortfolio:
@@ -30,16 +44,22 @@ class InvestmentPortfolio:
             Stores historical portfolio data by saving a snapshot of the portfolio each
             time it is updated. Each snapshot is a dictionary with keys 'date',
             'total_deposited', 'current_portfolio_value' and 'transaction_type'.
+            Internally, the snapshots are held in a columnar PortfolioHistory, which is
+            available as the `history` attribute.
         """
         date_today = datetime.now().strftime('%d%m%Y')
         self.name = name or f'portfolio_{date_today}'
+        self._history_version = next(_history_versions)
         self.total_deposited = total_deposited or 0
         self.current_portfolio_value = current_portfolio_value or 0
-        self.portfolio_history = portfolio_history or []
+        self.history = PortfolioHistory(portfolio_history)
 
         # Used internally for catching back-dating errors
         self.latest_transaction_date = None
 
+        # The journal the portfolio is saved to, if saved with journal=True
+        self._journal = None
+
     def deposit(self,
                 deposit_amount: Union[int, float],
                 portfolio_value_before_deposit: Union[int, float] = None,
@@ -117,7 +137,7 @@ class InvestmentPortfolio:
         date : datetime
             When this valuation was calculated. Defaults to now.
         """
-        if len(self.portfolio_history) == 0:
+        if len(self.history) == 0:
             raise InsufficientData("First transaction can't be a value update; make a "
                                    "deposit!")
 
@@ -130,6 +150,314 @@ class InvestmentPortfolio:
         # Update portfolio_history
         self._update_portfolio_history(date, 'update_portfolio_value')
 
+    @classmethod
+    def from_records(cls, records: Mapping[str, Any],
+                     name: str = None) -> 'InvestmentPortfolio':
+        """
+        Create a portfolio from a table of transactions in a single step. See
+        `apply_transactions` for how each transaction is interpreted.
+
+        Parameters
+        ----------
+        records : Mapping[str, Any]
+            A DataFrame, or a mapping of column names to arrays, with columns 'date',
+            'transaction_type', 'amount' and 'value'. The 'amount' and 'value' columns
+            are optional.
+        name : str
+            The name of the portfolio. Defaults to 'portfolio_{today's date}'.
+
+        Returns
+        -------
+        InvestmentPortfolio : The portfolio containing the transactions.
+        """
+        portfolio = cls(name=name)
+        portfolio.apply_transactions(records['date'], records['transaction_type'],
+                                     records.get('amount'), records.get('value'))
+        return portfolio
+
+    def apply_transactions(self,
+                           dates: Sequence[datetime],
+                           transaction_types: Sequence[str],
+                           amounts: Sequence[Union[int, float]] = None,
+                           values: Sequence[Union[int, float]] = None):
+        """
+        Make many deposits, withdrawals and value updates at once. This is equivalent to
+        calling `deposit`, `withdraw` or `update_portfolio_value` for each transaction
+        in turn, but the transactions are validated in one vectorised pass and added to
+        the portfolio history in one step. If any transaction is invalid, an error is
+        raised and none of them are applied.
+
+        Parameters
+        ----------
+        dates : Sequence[datetime]
+            When each transaction was made. These must be strictly increasing, and
+            later than the latest transaction already in the portfolio.
+        transaction_types : Sequence[str]
+            The type of each transaction: 'deposit', 'withdrawal' or
+            'update_portfolio_value'.
+        amounts : Sequence[Union[int, float]]
+            The amount deposited or withdrawn by each transaction. Ignored for value
+            updates.
+        values : Sequence[Union[int, float]]
+            For value updates, the new portfolio value. For deposits and withdrawals,
+            the portfolio value before the transaction, or NaN if it isn't known.
+        """
+        dates = to_epoch_array(dates)
+        n_transactions = len(dates)
+        if n_transactions == 0:
+            return
+
+        transaction_types = np.asarray(transaction_types)
+        is_deposit = transaction_types == DEPOSIT
+        is_withdrawal = transaction_types == WITHDRAWAL
+        is_update = transaction_types == UPDATE_PORTFOLIO_VALUE
+        is_unknown = ~(is_deposit | is_withdrawal | is_update)
+        if is_unknown.any():
+            raise ValueError(f'Unknown transaction type: '
+                             f'{transaction_types[is_unknown][0]}')
+
+        amounts = (np.zeros(n_transactions) if amounts is None
+                   else np.asarray(amounts, dtype=np.float64))
+        values = (np.full(n_transactions, np.nan) if values is None
+                  else np.asarray(values, dtype=np.float64))
+        if np.isnan(values[is_update]).any():
+            raise ValueError('Value updates must include the new portfolio value.')
+        if np.isnan(amounts[~is_update]).any():
+            raise ValueError('Deposits and withdrawals must include an amount.')
+
+        # As with the individual methods, a value of zero before a deposit or withdrawal
+        # is treated as not provided
+        has_valuation = is_update | ((values != 0) & ~np.isnan(values))
+
+        # The cash flow of each transaction, and the cumulative cash flows up to and
+        # including (after) or excluding (before) each transaction
+        cash_flows = np.where(is_deposit, amounts, np.where(is_withdrawal, -amounts, 0))
+        flows_after = np.cumsum(cash_flows)
+        flows_before = flows_after - cash_flows
+
+        # The portfolio value is the latest valuation plus the cash flows since then.
+        # Carry the latest valuation forward, offset by the cash flows before it
+        valuation_index = np.maximum.accumulate(
+            np.where(has_valuation, np.arange(n_transactions), -1))
+        offsets = np.where(valuation_index >= 0,
+                           (values - flows_before)[valuation_index],
+                           self.current_portfolio_value)
+        value_before = offsets + flows_before
+        value_after = offsets + flows_after
+        total_deposited_after = self.total_deposited + flows_after
+
+        # Find the first invalid transaction of each kind, then raise for the earliest
+        errors = []
+        latest_date = (to_epoch(self.latest_transaction_date)
+                       if self.latest_transaction_date is not None else None)
+        is_backdated = np.concatenate([
+            [latest_date is not None and dates[0] <= latest_date],
+            dates[1:] <= dates[:-1]])
+        if is_backdated.any():
+            index = int(np.argmax(is_backdated))
+            previous = dates[index - 1] if index else latest_date
+            errors.append((index, BackDatingError(
+                f'Attempted transaction: {from_epoch(dates[index])}. '
+                f'Latest portfolio transaction: {from_epoch(previous)}.')))
+        if len(self.history) == 0 and has_valuation[0]:
+            errors.append((0, InsufficientData(
+                "First transaction can't be a value update; make a deposit!")))
+        is_overdrawn = is_withdrawal & (amounts > value_before)
+        if is_overdrawn.any():
+            index = int(np.argmax(is_overdrawn))
+            errors.append((index, InsufficientFunds(
+                f'Cannot withdraw more than the portfolio value: '
+                f'{value_before[index]}')))
+        if errors:
+            raise min(errors, key=lambda error: error[0])[1]
+
+        # Deposits and withdrawals with a valuation are recorded as a value update
+        # followed by the transaction itself, so work out where each snapshot goes
+        is_split = has_valuation & ~is_update
+        positions = np.arange(n_transactions) + np.cumsum(is_split)
+        n_snapshots = n_transactions + int(is_split.sum())
+
+        snapshot_dates = np.empty(n_snapshots, dtype=np.int64)
+        snapshot_total_deposited = np.empty(n_snapshots)
+        snapshot_values = np.empty(n_snapshots)
+        snapshot_codes = np.empty(n_snapshots, dtype=np.uint8)
+
+        snapshot_dates[positions] = dates
+        snapshot_total_deposited[positions] = total_deposited_after
+        snapshot_values[positions] = value_after
+        snapshot_codes[positions] = np.where(
+            is_deposit, self.history.transaction_code(DEPOSIT),
+            np.where(is_withdrawal, self.history.transaction_code(WITHDRAWAL),
+                     self.history.transaction_code(UPDATE_PORTFOLIO_VALUE)))
+
+        split_positions = positions[is_split] - 1
+        snapshot_dates[split_positions] = dates[is_split]
+        snapshot_total_deposited[split_positions] = (self.total_deposited
+                                                     + flows_before[is_split])
+        snapshot_values[split_positions] = value_before[is_split]
+        snapshot_codes[split_positions] = self.history.transaction_code(
+            UPDATE_PORTFOLIO_VALUE)
+
+        self.history.extend(snapshot_dates, snapshot_total_deposited, snapshot_values,
+                            snapshot_codes)
+        self._history_version = next(_history_versions)
+        self.total_deposited = float(total_deposited_after[-1])
+        self.current_portfolio_value = float(value_after[-1])
+        self.latest_transaction_date = self.history.date_at(-1)
+
+    def compact_history(self, checkpoints: str = None) -> int:
+        """
+        Remove the valuation updates from the history that no lifetime return
+        calculation needs, to save memory and speed up calculations over long
+        histories. Every deposit and withdrawal is kept, along with the first and last
+        snapshots and the valuations either side of each cash flow, so the returns over
+        the whole history from SimpleReturnCalculator, TimeWeightedReturnCalculator,
+        MoneyWeightedReturnCalculator and ModifiedDietzReturnCalculator are unchanged.
+
+        Anything that reads the valuations in between may change: returns as of earlier
+        dates, rolling returns, risk metrics and point-in-time queries such as
+        `value_at`. A ModifiedDietzReturnCalculator with a period needs checkpoints at
+        least as frequent as the period, and raises ValueError without them.
+
+        Parameters
+        ----------
+        checkpoints : str
+            Also keep the latest valuation of each day, month or year: 'daily',
+            'monthly' or 'yearly'. e.g. month-end valuations for returns linked monthly.
+
+        Returns
+        -------
+        int : The number of snapshots removed.
+        """
+        n_snapshots = len(self.history)
+        self.history = self.history.compacted(checkpoints)
+        return n_snapshots - len(self.history)
+
+    def value_at(self, date: Union[datetime, Sequence[datetime]]
+                 ) -> Union[float, np.ndarray]:
+        """
+        The value of the portfolio on a date, as of its latest snapshot on or before
+        then. Looked up by binary search, so this is O(log n) in the history size.
+
+        Parameters
+        ----------
+        date : Union[datetime, Sequence[datetime]]
+            The date to look up, or many dates to look up at once.
+
+        Returns
+        -------
+        Union[float, np.ndarray] : The portfolio value, or NaN before the first
+            snapshot. An array of values if many dates were given.
+        """
+        return self._snapshot_at(self.history.current_portfolio_value, date)
+
+    def deposited_at(self, date: Union[datetime, Sequence[datetime]]
+                     ) -> Union[float, np.ndarray]:
+        """
+        The total deposited in the portfolio on a date, as of its latest snapshot on or
+        before then. Looked up by binary search, so this is O(log n) in the history
+        size.
+
+        Parameters
+        ----------
+        date : Union[datetime, Sequence[datetime]]
+            The date to look up, or many dates to look up at once.
+
+        Returns
+        -------
+        Union[float, np.ndarray] : The total deposited, or NaN before the first
+            snapshot. An array of totals if many dates were given.
+        """
+        return self._snapshot_at(self.history.total_deposited, date)
+
+    def history_between(self, start: datetime = None,
+                        end: datetime = None) -> PortfolioHistory:
+        """
+        The snapshots dated from `start` to `end` inclusive, found by binary search.
+        The returned history's columns are read-only views of this portfolio's history,
+        not copies.
+
+        Parameters
+        ----------
+        start : datetime
+            The earliest date to include. Defaults to the first snapshot.
+        end : datetime
+            The latest date to include. Defaults to the latest snapshot.
+
+        Returns
+        -------
+        PortfolioHistory : The snapshots between the dates.
+        """
+        return self.history.between(start, end)
+
+    def _snapshot_at(self, column: np.ndarray, date: Union[datetime, Sequence[datetime]]
+                     ) -> Union[float, np.ndarray]:
+        """ The value in a history column as of the latest snapshot on or before date. """
+        index = self.history.index_at(date)
+        if np.ndim(index) == 0:
+            return float(column[index]) if index >= 0 else np.nan
+        values = np.full(len(index), np.nan)
+        values[index >= 0] = column[index[index >= 0]]
+        return values
+
+    @property
+    def history_version(self) -> int:
+        """
+        Changes whenever the portfolio changes, e.g. on every transaction. Used to tell
+        whether results calculated from the portfolio are still valid.
+        """
+        # Snapshots can also be recorded through `history` directly
+        if self._history.mutation_count != self._history_mutations:
+            self._history_mutations = self._history.mutation_count
+            self._history_version = next(_history_versions)
+        return self._history_version
+
+    @property
+    def total_deposited(self) -> Union[int, float]:
+        return self._total_deposited
+
+    @total_deposited.setter
+    def total_deposited(self, total_deposited: Union[int, float]):
+        self._total_deposited = total_deposited
+        self._history_version = next(_history_versions)
+
+    @property
+    def current_portfolio_value(self) -> Union[int, float]:
+        return self._current_portfolio_value
+
+    @current_portfolio_value.setter
+    def current_portfolio_value(self, current_portfolio_value: Union[int, float]):
+        self._current_portfolio_value = current_portfolio_value
+        self._history_version = next(_history_versions)
+
+    @property
+    def history(self) -> PortfolioHistory:
+        """ The columnar store of portfolio snapshots. """
+        return self._history
+
+    @history.setter
+    def history(self, history: PortfolioHistory):
+        self._history = history
+        self._history_mutations = history.mutation_count
+        self._history_version = next(_history_versions)
+
+    @property
+    def portfolio_history(self) -> List[dict]:
+        """
+        A read-only list of the portfolio snapshots, in order of ascending date. Each
+        snapshot is a dictionary with keys 'date', 'total_deposited',
+        'current_portfolio_value' and 'transaction_type'. Dates are naive datetimes in
+        UTC; timezone-aware transaction dates are converted.
+
+        Note: This builds a new list on every access. Code that only needs the values
+        should read the NumPy arrays on `history` instead.
+        """
+        return self.history.to_records()
+
+    @portfolio_history.setter
+    def portfolio_history(self, portfolio_history: List[dict]):
+        self.history = PortfolioHistory(portfolio_history)
+
     def _update_portfolio_history(self, date: datetime, transaction_type: str):
         """
         Add a snapshot of the current portfolio to portfolio_history.
@@ -141,50 +469,165 @@ class InvestmentPortfolio:
         transaction_type : str
             The type of transaction that was made before taking the portfolio snapshot.
         """
-        # Update portfolio_history
-        new_entry = {
-            'date': date,
-            'total_deposited': self.total_deposited,
-            'current_portfolio_value': self.current_portfolio_value,
-            'transaction_type': transaction_type
-        }
-        portfolio_history = self.portfolio_history
-        portfolio_history.append(new_entry)
-
-        # Ensure the portfolio history is stored in order of ascending transaction date
-        sorted_portfolio_history = sorted(portfolio_history, key=lambda x: x['date'])
-        self.portfolio_history = sorted_portfolio_history
-        self.latest_transaction_date = self.portfolio_history[-1]['date']
+        # The history keeps itself in order of ascending transaction date
+        index = self.history.append(date, self.total_deposited,
+                                    self.current_portfolio_value, transaction_type)
+        self._history_version = next(_history_versions)
+
+        # Keep the date exactly as given (e.g. timezone-aware) when it's the latest
+        if index == len(self.history) - 1:
+            self.latest_transaction_date = date
+        else:
+            self.latest_transaction_date = self.history.date_at(-1)
 
     def _backdate_error_check(self, date):
         """ Ensure that the transaction being made isn't being incorrectly back-dated """
         if self.latest_transaction_date is not None:
-            if date <= self.latest_transaction_date:
+            # Compare as UTC epochs, as the latest date may be naive (read back from the
+            # history) while the new one is timezone-aware, or vice versa
+            if to_epoch(date) <= to_epoch(self.latest_transaction_date):
                 raise BackDatingError(
                     f'Attempted transaction: {date}. Latest portfolio transaction: '
                     f'{self.latest_transaction_date}.')
 
-    def save_portfolio(self, directory: str = None):
+    def __getstate__(self) -> dict:
+        # The journal holds an open file, and belongs to this process only
+        state = self.__dict__.copy()
+        state.pop('_journal', None)
+        return state
+
+    def __setstate__(self, state: dict):
+        # Portfolios pickled before the columnar history store held a list of dicts,
+        # and stored the totals as plain attributes
+        if 'portfolio_history' in state:
+            state['_history'] = PortfolioHistory(state.pop('portfolio_history'))
+        for attribute in ('history', 'total_deposited', 'current_portfolio_value'):
+            if attribute in state:
+                state[f'_{attribute}'] = state.pop(attribute)
+        state.setdefault('_journal', None)
+        self.__dict__.update(state)
+
+        # An unpickled portfolio is a new object, so give it a new version
+        self._history_mutations = self._history.mutation_count
+        self._history_version = next(_history_versions)
+
+    def export_history(self, path: str, file_format: str = 'parquet',
+                       row_group_size: int = 65_536):
+        """
+        Write the portfolio history to a Parquet or Arrow IPC file, with a row per
+        snapshot. Requires pyarrow. To write many portfolios to one file, or to read
+        them back, see portfolio_manager.columnar_io.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file to write.
+        file_format : str
+            'parquet' or 'ipc'.
+        row_group_size : int
+            The number of rows in each Parquet row group, or Arrow record batch.
+        """
+        # Imported here, as pyarrow is optional and the module depends on this one
+        from portfolio_manager.columnar_io import write_histories
+
+        write_histories([self], path, file_format, row_group_size)
+
+    def close_journal(self):
+        """
+        Sync and close the journal the portfolio was last saved to with journal=True,
+        if any, releasing its file. A later journaled save starts a new checkpoint.
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def save_portfolio(self, directory: str = None, journal: bool = False,
+                       binary: bool = False, storage: 'PortfolioStorage' = None):
         """
         Save the state of the current portfolio. The portfolio object is pickled and
         saved within the specified directory under the name '{self.name}.pkl'.
 
+        Alternatively, with journal=True, the portfolio is saved as a checkpoint plus a
+        journal of the snapshots recorded since, and each save only appends what is new.
+        This is much faster when saving after every transaction. See PortfolioJournal.
+
+        Or, with binary=True, the history is saved in a fixed binary layout under the
+        name '{self.name}.pmh', which is memory-mapped when loaded rather than read in
+        full. This is much faster for opening large portfolios. See save_binary.
+
+        Or, the portfolio can be saved to a storage, e.g. an SQLiteStorage, under its
+        name. See PortfolioStorage.
+
+        Saving to a file removes the portfolio's files in the other formats from
+        `directory`, so that load_portfolio always finds the latest save.
+
         Parameters
         ----------
         directory : str
             The directory that the pickled object should be saved in. Defaults to the
             current working directory.
+        journal : bool
+            If True, save to a journal rather than pickling the whole portfolio.
+        binary : bool
+            If True, save in the binary history format rather than pickling.
+        storage : PortfolioStorage
+            If provided, save to this storage rather than to a file in `directory`.
         """
+        if journal + binary + (storage is not None) > 1:
+            raise ValueError('Choose at most one of journal, binary and storage.')
+        if storage is not None:
+            storage.save(self)
+            return
+
+        # Imported here, as these modules depend on this one
+        from portfolio_manager.binary_history import BINARY_EXTENSION, save_binary
+        from portfolio_manager.journal import JOURNAL_EXTENSIONS, PortfolioJournal
+
+        if journal:
+            journal_key = (self.name, directory)
+            if (self._journal is None
+                    or (self._journal.name, self._journal.directory) != journal_key):
+                self.close_journal()
+                self._journal = PortfolioJournal(self.name, directory)
+                self._journal.save(self)
+                # Any other save closes the journal, so only a new one needs to do this
+                self._remove_saved_files(directory, (BINARY_EXTENSION, '.pkl'))
+            else:
+                self._journal.save(self)
+            return
+
+        # Any journal is superseded by this save
+        self.close_journal()
+        if binary:
+            name = f'{self.name}{BINARY_EXTENSION}'
+            save_binary(self, os.path.join(directory, name) if directory else name)
+            self._remove_saved_files(directory, JOURNAL_EXTENSIONS + ('.pkl',))
+            return
+
         path = f'{directory}/{self.name}.pkl' if directory else f'{self.name}.pkl'
 
         # Save the portfolio, overwriting any existing files at that path.
         with open(path, 'wb') as handle:
             pickle.dump(self, handle, pickle.HIGHEST_PROTOCOL)
+        self._remove_saved_files(directory, JOURNAL_EXTENSIONS + (BINARY_EXTENSION,))
+
+    def _remove_saved_files(self, directory: str, extensions: Sequence[str]):
+        """ Remove the portfolio's files with the given extensions, if they exist. """
+        prefix = os.path.join(directory, self.name) if directory else self.name
+        for extension in extensions:
+            try:
+                os.remove(f'{prefix}{extension}')
+            except FileNotFoundError:
+                pass
 
 
-def load_portfolio(name: str, directory: str = None) -> InvestmentPortfolio:
+def load_portfolio(name: str, directory: str = None,
+                   storage: 'PortfolioStorage' = None) -> InvestmentPortfolio:
     """
-    Load a previously pickled and saved portfolio from the specified path.
+    Load a previously pickled and saved portfolio from the specified path. If the
+    portfolio was saved with journal=True, it is rebuilt from its checkpoint and journal,
+    and further journaled saves continue from there. If it was saved with binary=True,
+    its history is memory-mapped, and only read from disk as it's used.
 
     Parameters
     ----------
@@ -194,17 +637,36 @@ def load_portfolio(name: str, directory: str = None) -> InvestmentPortfolio:
     directory : str
         The directory containing the saved portfolio. By default, look in the current
         working directory.
+    storage : PortfolioStorage
+        If provided, load the portfolio from this storage rather than from a file in
+        `directory`.
 
     Returns
     -------
     InvestmentPortfolio : The instantiated portfolio object.
     """
-    # Add the .pkl file extension if it isn't already there
+    if storage is not None:
+        return storage.load(name)
+
+    # Imported here, as these modules depend on this one
+    from portfolio_manager.binary_history import BINARY_EXTENSION, load_binary
+    from portfolio_manager.journal import PortfolioJournal
+
+    # Add the file extension if it isn't already there, looking for a journal, then a
+    # binary history, then a pickle
     if '.' not in name:
-        name += '.pkl'
+        journal = PortfolioJournal(name, directory)
+        if journal.exists():
+            portfolio = journal.load()
+            portfolio._journal = journal
+            return portfolio
+        binary_path = os.path.join(directory or '', f'{name}{BINARY_EXTENSION}')
+        name += BINARY_EXTENSION if os.path.exists(binary_path) else '.pkl'
 
     # Load and return the portfolio
     path = f'{directory}/{name}' if directory else name
+    if path.endswith(BINARY_EXTENSION):
+        return load_binary(path)
     with open(path, 'rb') as handle:
         portfolio = pickle.load(handle)
 
@@ -0,0 +1,166 @@
+from collections import namedtuple
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+
+from portfolio_manager.batch import PackedHistories, _pack, _reduce_segments
+from portfolio_manager.history import to_epoch_array
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.risk_metrics import _period_returns
+
+# The performance of a portfolio relative to a benchmark. The excess return and tracking
+# error are percentages, e.g. 18 represents 18%
+RelativePerformance = namedtuple('RelativePerformance', ['excess_return',
+                                                         'tracking_error',
+                                                         'information_ratio'])
+
+
+class BenchmarkSeries:
+    def __init__(self, dates: Iterable, prices: Iterable, name: str = None):
+        """
+        The price (or level) of a benchmark index over time, e.g. the FTSE All-Share,
+        to compare portfolios against.
+
+        Parameters
+        ----------
+        dates : Iterable
+            The date of each price, e.g. datetimes or np.datetime64s. Sorted into
+            ascending order if they aren't already.
+        prices : Iterable
+            The benchmark price on each date.
+        name : str
+            The name of the benchmark.
+        """
+        self.dates = to_epoch_array(dates)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        if self.dates.shape != self.prices.shape or self.dates.ndim != 1:
+            raise ValueError(f'Expected a price for each of the {len(self.dates)} dates, '
+                             f'got prices of shape {self.prices.shape}.')
+        if np.any(self.dates[1:] < self.dates[:-1]):
+            order = np.argsort(self.dates, kind='stable')
+            self.dates, self.prices = self.dates[order], self.prices[order]
+        self.name = name
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def prices_at(self, dates: Iterable) -> np.ndarray:
+        """
+        The benchmark price as of each date, i.e. its latest price on or before then,
+        found by binary search. NaN before the first price.
+
+        Parameters
+        ----------
+        dates : Iterable
+            The dates to look up, e.g. a history's `dates` in microseconds since the
+            epoch, or datetimes.
+
+        Returns
+        -------
+        np.ndarray : The benchmark price as of each date.
+        """
+        indices = np.searchsorted(self.dates, to_epoch_array(dates), side='right') - 1
+        prices = np.full(len(indices), np.nan)
+        prices[indices >= 0] = self.prices[indices[indices >= 0]]
+        return prices
+
+
+def calculate_relative_performance(portfolio: InvestmentPortfolio,
+                                   benchmark: BenchmarkSeries,
+                                   periods_per_year: float = None
+                                   ) -> RelativePerformance:
+    """
+    Compare a portfolio's time-weighted return against a benchmark over the same
+    periods. See batch_relative_performance.
+
+    Parameters
+    ----------
+    portfolio : InvestmentPortfolio
+        The portfolio to compare.
+    benchmark : BenchmarkSeries
+        The benchmark to compare against.
+    periods_per_year : float
+        If given, annualise the tracking error and information ratio, e.g. 252 for
+        portfolios valued every trading day.
+
+    Returns
+    -------
+    RelativePerformance : The performance of the portfolio relative to the benchmark.
+    """
+    performance = batch_relative_performance([portfolio], benchmark, periods_per_year)
+    return RelativePerformance(*(float(metric[0]) for metric in performance))
+
+
+def batch_relative_performance(histories: Union[PackedHistories,
+                                                Sequence[InvestmentPortfolio]],
+                               benchmark: BenchmarkSeries,
+                               periods_per_year: float = None) -> RelativePerformance:
+    """
+    Compare the time-weighted returns of many portfolios against one benchmark. The
+    snapshot dates of every portfolio are aligned to the benchmark prices as of then in
+    a single vectorised search of the benchmark dates.
+
+    The benchmark is measured over the same valuation periods as each portfolio: the
+    spans between consecutive snapshots with the same total deposited. Spans ending in
+    a cash flow are left out of both, as TimeWeightedReturnCalculator does.
+
+    - Excess return: the portfolio's time-weighted return less the benchmark's return,
+      compounded over the same periods.
+    - Tracking error: the sample standard deviation of the active returns, i.e. the
+      portfolio's return less the benchmark's in each period.
+    - Information ratio: the mean active return over the tracking error.
+
+    Parameters
+    ----------
+    histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+        The portfolios, or their packed histories.
+    benchmark : BenchmarkSeries
+        The benchmark to compare against.
+    periods_per_year : float
+        If given, annualise the tracking error and information ratio, e.g. 252 for
+        portfolios valued every trading day.
+
+    Returns
+    -------
+    RelativePerformance : An array of each metric, with a value per portfolio in the
+        order given. Percentages are rounded to 2 decimal places. The excess return is
+        NaN for portfolios with fewer than two snapshots, and the tracking error and
+        information ratio with fewer than two periods. All are NaN where a period
+        starts before the benchmark's first price.
+    """
+    packed = _pack(histories)
+    n_portfolios = len(packed)
+    portfolio_ids = packed.portfolio_ids()
+    rows, returns = _period_returns(packed.total_deposited,
+                                    packed.current_portfolio_value, portfolio_ids)
+    benchmark_prices = benchmark.prices_at(packed.dates)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        benchmark_returns = benchmark_prices[rows] / benchmark_prices[rows - 1] - 1
+    ids = portfolio_ids[rows]
+
+    # Compound both over each portfolio's periods. With no periods, neither grows
+    excess_returns = np.full(n_portfolios, np.nan)
+    excess_returns[packed.lengths > 1] = 0
+    counts = np.bincount(ids, minlength=n_portfolios)
+    has_periods = counts > 0
+    period_offsets = np.searchsorted(ids, np.arange(n_portfolios + 1))
+    excess_returns[has_periods] = (
+        _reduce_segments(np.multiply, 1 + returns, period_offsets, has_periods)
+        - _reduce_segments(np.multiply, 1 + benchmark_returns, period_offsets,
+                           has_periods)) * 100
+
+    active_returns = returns - benchmark_returns
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.bincount(ids, active_returns, minlength=n_portfolios) / counts
+        variances = np.bincount(ids, (active_returns - means[ids]) ** 2,
+                                minlength=n_portfolios) / (counts - 1)
+        tracking_errors = np.where(counts > 1, np.sqrt(variances), np.nan)
+        information_ratios = np.where(tracking_errors > 0, means / tracking_errors,
+                                      np.nan)
+
+    if periods_per_year is not None:
+        tracking_errors = tracking_errors * np.sqrt(periods_per_year)
+        information_ratios = information_ratios * np.sqrt(periods_per_year)
+
+    return RelativePerformance(np.round(excess_returns, 2),
+                               np.round(tracking_errors * 100, 2), information_ratios)
@@ -1,33 +1,168 @@
 import abc
-from typing import Any, Union
+import functools
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from typing import Any, Callable, Hashable, Sequence, Union
 
 import numpy as np
-import pandas as pd
-from numpy_financial import irr
 
 from portfolio_manager.exceptions import InsufficientData
+from portfolio_manager.history import (_CHECKPOINT_UNITS, MICROSECONDS_PER_DAY,
+                                       PortfolioHistory)
 from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.solvers import xirr
+
+
+# The most cash flows solved for at once when calculating money-weighted returns as of
+# many dates
+_MAX_BATCH_CASH_FLOWS = 2 ** 22
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _ReturnCache:
+    def __init__(self, maxsize: int):
+        """
+        A bounded, least-recently-used cache of calculated returns, shared by all
+        ReturnCalculator subclasses.
+
+        Parameters
+        ----------
+        maxsize : int
+            The maximum number of results to keep. 0 disables caching.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, calculate: Callable[[], Any]) -> Any:
+        """ Return the cached result for `key`, calling `calculate` on a miss. """
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self.misses += 1
+
+        result = calculate()
+        if isinstance(result, np.ndarray):
+            # Every caller shares the cached array, so none of them may change it
+            result.setflags(write=False)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._results))
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
+
+
+def _cached(calculate_return: Callable) -> Callable:
+    """
+    Wrap a calculate_return method so results are cached against the portfolio's
+    identity and history version, the calculator and the arguments.
+    """
+    @functools.wraps(calculate_return)
+    def wrapper(self, portfolio, *args, **kwargs):
+        cache = ReturnCalculator._cache
+        version = getattr(portfolio, 'history_version', None)
+        if cache.maxsize <= 0 or version is None:
+            return calculate_return(self, portfolio, *args, **kwargs)
+
+        key = (id(portfolio), version, self._cache_key(), args,
+               tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. array arguments, which can't be cached
+            return calculate_return(self, portfolio, *args, **kwargs)
+        return cache.get(key, lambda: calculate_return(self, portfolio, *args, **kwargs))
+
+    return wrapper
 
 
 class ReturnCalculator(abc.ABC):
+    """
+    Base class for calculating the rate of return of a portfolio.
+
+    The results of calculate_return are cached in a bounded LRU cache shared by all
+    calculators, keyed on the portfolio's identity and history_version, the calculator
+    and the arguments. Any change to the portfolio changes its history_version, so stale
+    results are never returned. Cached arrays of returns are shared, so are read-only.
+    Use cache_info() to see hit/miss statistics.
+
+    Every calculator can also calculate the return as of an earlier date, from the
+    snapshots up to that date, by passing `as_of` to calculate_return. Each date is
+    looked up by binary search, and the time-weighted growth up to every snapshot is
+    calculated once per history (see PortfolioHistory.cumulative_growth), so a return as
+    of any date is cheap. Passing many dates calculates their returns together.
+    """
+    _cache = _ReturnCache(maxsize=1024)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'calculate_return' in cls.__dict__:
+            cls.calculate_return = _cached(cls.calculate_return)
+
     @abc.abstractmethod
-    def calculate_return(self, portfolio: InvestmentPortfolio,
-                         annualised: bool) -> Any:
+    def calculate_return(self, portfolio: InvestmentPortfolio, annualised: bool,
+                         as_of: Union[datetime, Sequence[datetime]] = None) -> Any:
         pass
 
+    @classmethod
+    def cache_info(cls) -> CacheInfo:
+        """ Return the hits, misses, maximum size and current size of the cache. """
+        return cls._cache.info()
+
+    @classmethod
+    def cache_clear(cls):
+        """ Empty the cache and reset its statistics. """
+        cls._cache.clear()
+
+    @classmethod
+    def set_cache_size(cls, maxsize: int):
+        """ Set the maximum number of results to cache. 0 disables caching. """
+        cls._cache.maxsize = maxsize
+
+    def _cache_key(self) -> Hashable:
+        """
+        Identifies the calculator in cache keys. Calculators with settings include them,
+        so differently configured calculators don't share results.
+        """
+        return type(self), tuple(sorted(vars(self).items()))
+
     def calculate_annualised_return(self, portfolio: InvestmentPortfolio,
-                                    total_return_percentage: Union[int, float]):
+                                    total_return_percentage: Union[int, float],
+                                    as_of: Union[datetime, Sequence[datetime]] = None):
         """
         Given the overall return percentage of a portfolio, calculate the annualised
-        return percentage.
+        return percentage. If `as_of` is given, the return is annualised over the
+        portfolio's age on that date, or on each of many dates.
         """
-        portfolio_age = self._get_portfolio_age(portfolio)
+        portfolio_age = self._get_portfolio_age(portfolio, as_of)
+        if np.ndim(portfolio_age) == 0:
+            # As a Python float, a portfolio with no age raises ZeroDivisionError rather
+            # than giving an infinite or NaN return
+            portfolio_age = float(portfolio_age)
         annualised_return = (1 + total_return_percentage / 100) ** (1 / portfolio_age)
         annualised_return_percentage = (annualised_return - 1) * 100
+        if isinstance(annualised_return_percentage, np.ndarray):
+            return np.round(annualised_return_percentage, 2)
         return round(annualised_return_percentage, 2)
 
     @staticmethod
-    def _get_portfolio_age(portfolio: InvestmentPortfolio) -> Union[int, float]:
+    def _get_portfolio_age(portfolio: InvestmentPortfolio,
+                           as_of: Union[datetime, Sequence[datetime]] = None
+                           ) -> Union[int, float, np.ndarray]:
         """
         Calculate the 'age' of a portfolio. This is the number of years between the
         first transaction in the portfolio and the most recent one.
@@ -36,19 +171,62 @@ class ReturnCalculator(abc.ABC):
         ----------
         portfolio : InvestmentPortfolio
             The portfolio we are calculating the age of.
+        as_of : Union[datetime, Sequence[datetime]]
+            If given, calculate the age as of this date instead, i.e. up to the most
+            recent transaction on or before it. Given many dates, calculate the age as
+            of each one.
 
         Returns
         -------
-        Union[int, float]: The age of the portfolio, measured in years.
+        Union[int, float, np.ndarray]: The age of the portfolio, measured in years.
+            Given many dates, NaN for those before the first transaction.
         """
         # Here we make use of the fact that the transactions within portfolio history
         # are ordered by ascending date
-        start = portfolio.portfolio_history[0]['date']
-        end = portfolio.portfolio_history[-1]['date']
-        delta = end - start
+        dates = portfolio.history.dates
+        end = ReturnCalculator._as_of_index(portfolio, as_of)
+        if np.ndim(end):
+            # -1 would wrap around to the latest snapshot, so mask dates before the first
+            has_data = end >= 0
+            delta_days = np.full(len(end), np.nan)
+            delta_days[has_data] = (dates[end[has_data]] - dates[0]) // MICROSECONDS_PER_DAY
+        elif end < 0:
+            raise InsufficientData('Not enough portfolio data to calculate an age.')
+        else:
+            delta_days = (dates[end] - dates[0]) // MICROSECONDS_PER_DAY
 
         # Return the portfolio age, in years
-        return delta.days / 365.25
+        return delta_days / 365.25
+
+    @staticmethod
+    def _as_of_index(portfolio: InvestmentPortfolio,
+                     as_of: Union[datetime, Sequence[datetime]] = None
+                     ) -> Union[int, np.ndarray]:
+        """
+        The index of the latest snapshot on or before `as_of`, or of each of many
+        dates, found by binary search. -1 where there is none. The latest snapshot if
+        `as_of` isn't given.
+        """
+        if as_of is None:
+            return len(portfolio.history) - 1
+        return portfolio.history.index_at(as_of)
+
+    def _returns_as_of(self, portfolio: InvestmentPortfolio, annualised: bool,
+                       as_of: Sequence[datetime], ends: np.ndarray,
+                       calculate: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        The return as of each of many dates, given a function which calculates the
+        total return percentage up to each of an array of snapshot indices. NaN where
+        there's too little data to calculate a return.
+        """
+        returns = np.full(len(ends), np.nan)
+        has_data = ends >= 1
+        if np.any(has_data):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns[has_data] = calculate(ends[has_data])
+                if annualised:
+                    returns = self.calculate_annualised_return(portfolio, returns, as_of)
+        return np.round(returns, 2)
 
 
 class SimpleReturnCalculator(ReturnCalculator):
@@ -62,7 +240,8 @@ class SimpleReturnCalculator(ReturnCalculator):
     a TimeWeightedReturnCalculator is a better choice.
     """
     def calculate_return(self, portfolio: InvestmentPortfolio,
-                         annualised: bool = True) -> Any:
+                         annualised: bool = True,
+                         as_of: Union[datetime, Sequence[datetime]] = None) -> Any:
         """
         Calculate the simple rate of return of the portfolio.
 
@@ -72,26 +251,50 @@ class SimpleReturnCalculator(ReturnCalculator):
             The portfolio we are calculating the simple return for.
         annualised : bool
             If True, calculate the annualised return.
+        as_of : Union[datetime, Sequence[datetime]]
+            If given, calculate the return as of this date, from the portfolio's value
+            and total deposited at its latest snapshot on or before then. Given many
+            dates, calculate the return as of each one.
 
         Returns
         -------
         Any : The simple rate of return of the portfolio, as a percentage.
-            e.g. 18 represents 18%.
+            e.g. 18 represents 18%. Given many dates, an array of returns, NaN where
+            there's too little data or the total deposited is negative or zero.
         """
+        history = portfolio.history
+        end = self._as_of_index(portfolio, as_of)
+        if np.ndim(end):
+            def simple_returns(ends: np.ndarray) -> np.ndarray:
+                total_deposited = history.total_deposited[ends]
+                return_amounts = history.current_portfolio_value[ends] - total_deposited
+                return np.where(total_deposited > 0,
+                                return_amounts / total_deposited * 100, np.nan)
+
+            return self._returns_as_of(portfolio, annualised, as_of, end,
+                                       simple_returns)
+
         # If there isn't enough data in the portfolio, raise an error
-        if len(portfolio.portfolio_history) <= 1:
+        if end < 1:
             raise InsufficientData('Not enough portfolio data to calculate a return.')
 
+        total_deposited = portfolio.total_deposited
+        current_portfolio_value = portfolio.current_portfolio_value
+        if as_of is not None:
+            total_deposited = history.total_deposited[end]
+            current_portfolio_value = history.current_portfolio_value[end]
+
         # If the sum of all deposits and withdrawals is negative or zero, raise an error
-        if portfolio.total_deposited <= 0:
+        if total_deposited <= 0:
             raise ValueError('Total deposited is negative or zero.')
 
-        return_amount = portfolio.current_portfolio_value - portfolio.total_deposited
-        return_percentage = (return_amount / portfolio.total_deposited) * 100
+        return_amount = current_portfolio_value - total_deposited
+        return_percentage = (return_amount / total_deposited) * 100
 
         if annualised:
             return_percentage = self.calculate_annualised_return(portfolio,
-                                                                 return_percentage)
+                                                                 return_percentage,
+                                                                 as_of)
 
         return round(return_percentage, 2)
 
@@ -103,7 +306,8 @@ class TimeWeightedReturnCalculator(ReturnCalculator):
     paid over time. See for more information
     """
     def calculate_return(self, portfolio: InvestmentPortfolio,
-                         annualised: bool = True) -> Any:
+                         annualised: bool = True,
+                         as_of: Union[datetime, Sequence[datetime]] = None) -> Any:
         """
         Calculate the time-weighted rate of return of the portfolio.
 
@@ -113,41 +317,36 @@ class TimeWeightedReturnCalculator(ReturnCalculator):
             The portfolio we are calculating the time-weighted return for.
         annualised : bool
             If True, calculate the annualised return.
+        as_of : Union[datetime, Sequence[datetime]]
+            If given, calculate the return as of this date, from the snapshots on or
+            before then. Given many dates, calculate the return as of each one.
 
         Returns
         -------
         Any : The time-weighted rate of return of the portfolio, as a percentage.
-            e.g. 18 represents 18%.
+            e.g. 18 represents 18%. Given many dates, an array of returns, NaN where
+            there's too little data.
         """
+        history = portfolio.history
+        end = self._as_of_index(portfolio, as_of)
+        if np.ndim(end):
+            return self._returns_as_of(
+                portfolio, annualised, as_of, end,
+                lambda ends: (history.cumulative_growth[ends] - 1) * 100)
+
         # If there isn't enough data in the portfolio, raise an error
-        if len(portfolio.portfolio_history) <= 1:
+        if end < 1:
             raise InsufficientData('Not enough portfolio data to calculate a return.')
 
-        # Otherwise, calculate the time-weighted return
-        sub_period_returns = []
-        df = pd.DataFrame(portfolio.portfolio_history)
-
-        # Group the data into sub-periods. Identify these sub-periods by finding groups
-        # of consecutive transactions with the same 'total_deposited' values
-        is_new_period_ser = pd.Series(
-            df['total_deposited'].shift() != df['total_deposited'])
-        grouped_periods = df.groupby(is_new_period_ser.cumsum())
-
-        # Loop through each sub-period to calculate the returns for that period
-        for _, data in grouped_periods:
-            sub_period_data = pd.DataFrame(data)
-
-            start_value = sub_period_data['current_portfolio_value'].values[0]
-            end_value = sub_period_data['current_portfolio_value'].values[-1]
-
-            return_for_period = (end_value - start_value) / start_value
-            sub_period_returns.append(return_for_period + 1)
-
-        twr_return_percentage = (np.product(sub_period_returns) - 1) * 100
+        # Otherwise, read the time-weighted return the portfolio history maintains as
+        # snapshots are recorded, or its growth up to the as-of date
+        growth = (history.time_weighted_growth if as_of is None
+                  else history.cumulative_growth[end])
+        twr_return_percentage = (growth - 1) * 100
 
         if annualised:
             twr_return_percentage = self.calculate_annualised_return(
-                portfolio, twr_return_percentage)
+                portfolio, twr_return_percentage, as_of)
 
         return round(twr_return_percentage, 2)
 
@@ -156,10 +355,15 @@ class MoneyWeightedReturnCalculator(ReturnCalculator):
     """
     Calculate the money-weighted rate of return of a portfolio. This metric takes into
     account the timing and volume of deposits and withdrawals.
+
+    The money-weighted return is the internal rate of return of the cash flows in and out
+    of the portfolio, taking the final portfolio value as a withdrawal of everything.
+    Cash flows are weighted by when they actually happened (i.e. XIRR).
     """
 
     def calculate_return(self, portfolio: InvestmentPortfolio,
-                         annualised: bool = True) -> Any:
+                         annualised: bool = True,
+                         as_of: Union[datetime, Sequence[datetime]] = None) -> Any:
         """
         Calculate the money-weighted rate of return of the portfolio.
 
@@ -169,34 +373,251 @@ class MoneyWeightedReturnCalculator(ReturnCalculator):
             The portfolio we are calculating the money-weighted return for.
         annualised : bool
             If True, calculate the annualised return.
+        as_of : Union[datetime, Sequence[datetime]]
+            If given, calculate the return as of this date, from the cash flows on or
+            before then and the portfolio's value at its latest snapshot. Given many
+            dates, the returns as of every date are solved for together.
 
         Returns
         -------
         Any : The money-weighted rate of return of the portfolio, as a percentage.
-            e.g. 18 represents 18%.
+            e.g. 18 represents 18%. Given many dates, an array of returns, NaN where
+            there's too little data.
         """
+        history = portfolio.history
+        end = self._as_of_index(portfolio, as_of)
+        if np.ndim(end):
+            return self._returns_as_of(
+                portfolio, annualised, as_of, end,
+                lambda ends: self._money_weighted_returns(history, ends))
+
         # If there isn't enough data in the portfolio, raise an error
-        if len(portfolio.portfolio_history) <= 1:
+        if end < 1:
             raise ValueError('Not enough portfolio data to calculate a return.')
 
+        # Time is measured as a fraction of the lifetime, so it can't be zero
+        if history.dates[end] == history.dates[0]:
+            raise ValueError('Not enough portfolio data to calculate a return: the '
+                             'first and last snapshots are at the same time.')
+
         # Otherwise, calculate the money-weighted return
-        mwr_arr = []
-        df = pd.DataFrame(portfolio.portfolio_history)
+        mwr_return_percentage = self._money_weighted_returns(history,
+                                                             np.array([end]))[0]
 
-        deposits_and_withdrawals_df = df.loc[
-            df['transaction_type'].isin(['deposit', 'withdrawal'])]
+        if annualised:
+            mwr_return_percentage = self.calculate_annualised_return(
+                portfolio, mwr_return_percentage, as_of)
+
+        return round(mwr_return_percentage, 2)
+
+    @staticmethod
+    def _money_weighted_returns(history: PortfolioHistory,
+                                ends: np.ndarray) -> np.ndarray:
+        """
+        The money-weighted return percentage of the history up to each of the given
+        snapshot indices, solving for all of them at once.
+        """
+        dates = history.dates
+        total_deposited = history.total_deposited
+        cash_flow_indices = history.cash_flow_indices
+
+        # Deposit and withdrawal amounts, and when they were made. Each history up to an
+        # index has the first of these up to the index, between its first deposit and
+        # the final portfolio value as a withdrawal of everything. A zero is appended
+        # so they can always be indexed
+        amounts = np.append(np.negative(np.diff(total_deposited[cash_flow_indices])), 0)
+        amount_dates = np.append(dates[cash_flow_indices[1:]], 0)
+
+        n_amounts = np.maximum(np.searchsorted(cash_flow_indices, ends, side='right') - 1,
+                               0)
+        lengths = n_amounts + 2
+
+        # Every history repeats the cash flows before it, so bound the memory used by
+        # solving in parts
+        if len(ends) > 1 and lengths.sum() > _MAX_BATCH_CASH_FLOWS:
+            middle = len(ends) // 2
+            return np.concatenate([
+                MoneyWeightedReturnCalculator._money_weighted_returns(history,
+                                                                      ends[:middle]),
+                MoneyWeightedReturnCalculator._money_weighted_returns(history,
+                                                                      ends[middle:])])
+
+        offsets = np.cumsum(lengths) - lengths
+        series = np.repeat(np.arange(len(ends)), lengths)
+        positions = np.arange(lengths.sum()) - offsets[series]
+        is_last = positions == lengths[series] - 1
+        amount_index = np.maximum(positions - 1, 0)
+
+        cash_flows = np.where(is_last, history.current_portfolio_value[ends][series],
+                              amounts[amount_index])
+        cash_flows[offsets] = -total_deposited[0]
+        cash_flow_dates = np.where(is_last, dates[ends][series],
+                                   amount_dates[amount_index])
+        cash_flow_dates[offsets] = dates[0]
+
+        # Measure time as a fraction of each history's lifetime, so the solved rate is
+        # the return over the whole lifetime
+        times = (cash_flow_dates - dates[0]) / (dates[ends] - dates[0])[series]
+        return xirr(cash_flows, times, offsets) * 100
+
+
+class ModifiedDietzReturnCalculator(ReturnCalculator):
+    """
+    Approximate the time-weighted rate of return of a portfolio using the Modified Dietz
+    method, which only needs the portfolio's value at the start and end of the period:
+
+    ((end value - start value - net cash flow)
+     / (start value + weighted cash flows)) * 100
+
+    where each cash flow (change in the total deposited) is weighted by the fraction of
+    the period remaining after it was made. Unlike TimeWeightedReturnCalculator, no
+    valuation is needed at each cash flow, so this suits quickly screening many
+    portfolios, before calculating the exact return of a shortlist.
+
+    Given a `period`, the return of each day, month or year is calculated this way and
+    the returns are linked geometrically, which is closer to the time-weighted return.
+    """
+    def __init__(self, period: str = None):
+        """
+        Parameters
+        ----------
+        period : str
+            If given, link the returns of each calendar period: DAILY, MONTHLY or
+            YEARLY. Each period runs from the latest snapshot of the one before (or the
+            first snapshot) to its own latest snapshot, so histories compacted without
+            checkpoints at least this frequent aren't supported (see
+            InvestmentPortfolio.compact_history).
+        """
+        _check_period(period)
+        self.period = period
+
+    def calculate_return(self, portfolio: InvestmentPortfolio,
+                         annualised: bool = True,
+                         as_of: Union[datetime, Sequence[datetime]] = None) -> Any:
+        """
+        Calculate the Modified Dietz rate of return of the portfolio.
+
+        Parameters
+        ----------
+        portfolio : InvestmentPortfolio
+            The portfolio we are calculating the Modified Dietz return for.
+        annualised : bool
+            If True, calculate the annualised return.
+        as_of : Union[datetime, Sequence[datetime]]
+            If given, calculate the return as of this date, from the snapshots on or
+            before then. Given many dates, calculate the return as of each one.
 
-        # Get deposit and withdrawal amounts
-        total_deposited_diff = deposits_and_withdrawals_df['total_deposited'].diff()
+        Returns
+        -------
+        Any : The Modified Dietz rate of return of the portfolio, as a percentage.
+            e.g. 18 represents 18%. Given many dates, an array of returns, NaN where
+            there's too little data or the average capital invested is negative or zero.
+        """
+        history = portfolio.history
+        if self.period is not None and not history.has_checkpoints(self.period):
+            raise ValueError(f'The portfolio history was compacted without the '
+                             f'{self.period} checkpoints needed to link {self.period} '
+                             f'returns. Compact it with checkpoints={self.period!r}.')
+
+        end = self._as_of_index(portfolio, as_of)
+        if np.ndim(end):
+            return self._returns_as_of(
+                portfolio, annualised, as_of, end,
+                lambda ends: self._modified_dietz_returns(history, ends))
 
-        mwr_arr.append(-df['total_deposited'][0])
-        mwr_arr.extend(np.negative(list(total_deposited_diff)[1:]))
-        mwr_arr.append(df['current_portfolio_value'].iloc[-1])
+        # If there isn't enough data in the portfolio, raise an error
+        if end < 1:
+            raise InsufficientData('Not enough portfolio data to calculate a return.')
 
-        mwr_return_percentage = (irr(mwr_arr)) * 100
+        md_return_percentage = self._modified_dietz_returns(history, np.array([end]))[0]
+        if np.isnan(md_return_percentage):
+            raise ValueError('Average capital invested is negative or zero.')
 
         if annualised:
-            mwr_return_percentage = self.calculate_annualised_return(
-                portfolio, mwr_return_percentage)
+            # Unlike the other returns, this approximation can lose more than everything
+            if md_return_percentage < -100:
+                raise ValueError(f"A return of {md_return_percentage:.2f}% can't be "
+                                 f"annualised.")
+            md_return_percentage = self.calculate_annualised_return(
+                portfolio, md_return_percentage, as_of)
 
-        return round(mwr_return_percentage, 2)
+        return round(md_return_percentage, 2)
+
+    def _modified_dietz_returns(self, history: PortfolioHistory,
+                                ends: np.ndarray) -> np.ndarray:
+        """
+        The Modified Dietz return percentage of the history up to each of the given
+        snapshot indices, linked over `period` if set.
+        """
+        dates = history.dates
+        total_deposited = history.total_deposited
+        values = history.current_portfolio_value
+
+        starts = np.zeros(len(ends), dtype=np.int64)
+        linked_growth = np.ones(len(ends))
+        if self.period is not None:
+            # Each history up to an index links the periods completed before the index,
+            # then runs from the last of them to the index
+            period_lasts = _period_lasts(dates, self.period)
+            period_starts = np.concatenate(([0], period_lasts))[:len(period_lasts)]
+            completed_growth = np.cumprod(_modified_dietz_growth(
+                dates, total_deposited, values, period_starts, period_lasts))
+
+            n_completed = np.searchsorted(period_lasts, ends, side='left')
+            has_completed = n_completed > 0
+            starts[has_completed] = period_lasts[n_completed[has_completed] - 1]
+            linked_growth[has_completed] = completed_growth[n_completed[has_completed]
+                                                            - 1]
+
+        growth = linked_growth * _modified_dietz_growth(dates, total_deposited, values,
+                                                        starts, ends)
+        return (growth - 1) * 100
+
+
+def _check_period(period: str):
+    """ Raise a ValueError unless the period is None, DAILY, MONTHLY or YEARLY. """
+    if period is not None and period not in _CHECKPOINT_UNITS:
+        raise ValueError(f'Unknown period: {period}. Expected one of '
+                         f'{list(_CHECKPOINT_UNITS)}.')
+
+
+def _period_lasts(dates: np.ndarray, period: str) -> np.ndarray:
+    """
+    The indices of the latest snapshot of each day, month or year, other than the
+    last. `dates` are in microseconds since the epoch, in ascending order.
+    """
+    periods = dates.astype('datetime64[us]').astype(
+        f'datetime64[{_CHECKPOINT_UNITS[period]}]')
+    return np.flatnonzero(periods[1:] != periods[:-1])
+
+
+def _modified_dietz_growth(dates: np.ndarray, total_deposited: np.ndarray,
+                           values: np.ndarray, starts: np.ndarray,
+                           ends: np.ndarray) -> np.ndarray:
+    """
+    The Modified Dietz growth factor from each start snapshot index to the end snapshot
+    index after it, counting the cash flows after the start up to the end. Prefix sums
+    of the cash flows are taken once, so each period then takes O(1). NaN where the
+    average capital invested is negative or zero.
+    """
+    days = (dates - dates[0]) / MICROSECONDS_PER_DAY
+    cash_flows = np.diff(total_deposited, prepend=total_deposited[:1])
+    timed_cash_flows = np.cumsum(cash_flows * days)
+
+    period_days = days[ends] - days[starts]
+    net_cash_flows = total_deposited[ends] - total_deposited[starts]
+    start_values = values[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # The sum of cash flow * (end - cash flow date) / (end - start), from the prefix
+        # sums. Cash flows over no time at all count in full
+        weighted_cash_flows = np.where(
+            period_days > 0,
+            (days[ends] * net_cash_flows
+             - (timed_cash_flows[ends] - timed_cash_flows[starts])) / period_days,
+            net_cash_flows)
+        average_capital = start_values + weighted_cash_flows
+        growth = np.where(
+            average_capital > 0,
+            1 + (values[ends] - start_values - net_cash_flows) / average_capital,
+            np.nan)
+    return np.where(starts == ends, 1.0, growth)
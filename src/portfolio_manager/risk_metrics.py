@@ -0,0 +1,299 @@
+from collections import namedtuple
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+from portfolio_manager.batch import PackedHistories, _pack, _reduce_segments
+from portfolio_manager.history import PortfolioHistory
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+# The risk metrics of a portfolio. Volatility, downside deviation and maximum drawdown
+# are percentages, e.g. 18 represents 18%
+RiskMetrics = namedtuple('RiskMetrics', ['volatility', 'downside_deviation',
+                                         'sharpe_ratio', 'sortino_ratio',
+                                         'max_drawdown'])
+
+# Growth factors are floored at this, so a total loss is a drawdown of (almost) 100%
+# rather than an error
+_MIN_GROWTH = np.finfo(np.float64).tiny
+
+
+def calculate_risk_metrics(portfolio: InvestmentPortfolio, risk_free_rate: float = 0,
+                           minimum_acceptable_return: float = 0,
+                           periods_per_year: float = None) -> RiskMetrics:
+    """
+    Calculate the risk metrics of a portfolio from the returns of its valuation periods.
+    See batch_risk_metrics.
+
+    Parameters
+    ----------
+    portfolio : InvestmentPortfolio
+        The portfolio to calculate the risk metrics of.
+    risk_free_rate : float
+        The risk-free return per period, as a percentage, for the Sharpe ratio.
+    minimum_acceptable_return : float
+        The return per period, as a percentage, below which a period counts towards
+        the downside deviation, and which the Sortino ratio measures returns above.
+    periods_per_year : float
+        If given, annualise the metrics, e.g. 252 for portfolios valued every trading
+        day. The maximum drawdown is never annualised.
+
+    Returns
+    -------
+    RiskMetrics : The risk metrics of the portfolio.
+    """
+    metrics = batch_risk_metrics([portfolio], risk_free_rate, minimum_acceptable_return,
+                                 periods_per_year)
+    return RiskMetrics(*(float(metric[0]) for metric in metrics))
+
+
+def batch_risk_metrics(histories: Union[PackedHistories, Sequence[InvestmentPortfolio]],
+                       risk_free_rate: float = 0, minimum_acceptable_return: float = 0,
+                       periods_per_year: float = None) -> RiskMetrics:
+    """
+    Calculate the risk metrics of many portfolios at once.
+
+    Each snapshot with the same total deposited as the one before ends a valuation
+    period, whose return is the change in the portfolio value. Snapshots where the
+    total deposited changes start a new sub-period instead (as in
+    TimeWeightedReturnCalculator), so cash flows don't count as returns. The metrics
+    are per valuation period, so suit portfolios valued at regular intervals.
+
+    - Volatility: the sample standard deviation of the period returns.
+    - Downside deviation: the root mean square of the shortfall of each period return
+      below the minimum acceptable return.
+    - Sharpe ratio: the mean period return in excess of the risk-free rate, over the
+      volatility.
+    - Sortino ratio: the mean period return in excess of the minimum acceptable return,
+      over the downside deviation.
+    - Maximum drawdown: the largest fall in the time-weighted growth from a previous
+      peak.
+
+    Parameters
+    ----------
+    histories : Union[PackedHistories, Sequence[InvestmentPortfolio]]
+        The portfolios, or their packed histories.
+    risk_free_rate : float
+        The risk-free return per period, as a percentage, for the Sharpe ratio.
+    minimum_acceptable_return : float
+        The return per period, as a percentage, below which a period counts towards
+        the downside deviation, and which the Sortino ratio measures returns above.
+    periods_per_year : float
+        If given, annualise the metrics, e.g. 252 for portfolios valued every trading
+        day. The maximum drawdown is never annualised.
+
+    Returns
+    -------
+    RiskMetrics : An array of each metric, with a value per portfolio in the order
+        given. Percentages are rounded to 2 decimal places. The volatility and ratios
+        are NaN with fewer than two period returns, as is any ratio over a deviation of
+        zero. The maximum drawdown is NaN for portfolios without snapshots.
+    """
+    packed = _pack(histories)
+    n_portfolios = len(packed)
+    portfolio_ids = packed.portfolio_ids()
+    rows, returns = _period_returns(packed.total_deposited,
+                                    packed.current_portfolio_value, portfolio_ids)
+    ids = portfolio_ids[rows]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        counts = np.bincount(ids, minlength=n_portfolios)
+        means = np.bincount(ids, returns, minlength=n_portfolios) / counts
+        squared_deviations = np.bincount(ids, (returns - means[ids]) ** 2,
+                                         minlength=n_portfolios)
+        shortfalls = np.minimum(returns - minimum_acceptable_return / 100, 0)
+        squared_shortfalls = np.bincount(ids, shortfalls ** 2, minlength=n_portfolios)
+        metrics = _summarise(counts, means, squared_deviations / (counts - 1),
+                             squared_shortfalls / counts, risk_free_rate,
+                             minimum_acceptable_return, periods_per_year)
+
+    # Segments of the log growth are shifted apart so one running maximum over all of
+    # them finds each portfolio's peaks, without mixing up portfolios
+    has_snapshots = packed.lengths > 0
+    max_drawdowns = np.full(n_portfolios, np.nan)
+    if has_snapshots.any():
+        log_growth = np.zeros(len(packed.dates))
+        log_growth[rows] = np.log(np.maximum(1 + returns, _MIN_GROWTH))
+        is_nan = np.isnan(log_growth)
+        log_growth[is_nan] = 0
+        log_growth = np.cumsum(log_growth)
+        log_growth -= log_growth[packed.offsets[:-1][has_snapshots]][
+            np.cumsum(has_snapshots)[portfolio_ids] - 1]
+
+        spacing = np.ptp(log_growth) + 1
+        shift = portfolio_ids * spacing
+        peaks = np.maximum.accumulate(log_growth + shift) - shift
+        drawdowns = 1 - np.exp(log_growth - peaks)
+        max_drawdowns[has_snapshots] = _reduce_segments(np.maximum, drawdowns,
+                                                        packed.offsets, has_snapshots)
+        max_drawdowns[np.bincount(portfolio_ids[is_nan],
+                                  minlength=n_portfolios) > 0] = np.nan
+
+    return RiskMetrics(*metrics, np.round(max_drawdowns * 100, 2))
+
+
+class RiskTracker:
+    def __init__(self, portfolio: InvestmentPortfolio, risk_free_rate: float = 0,
+                 minimum_acceptable_return: float = 0, periods_per_year: float = None):
+        """
+        Keeps the risk metrics of a portfolio up to date as transactions are recorded,
+        e.g. for live dashboards. See batch_risk_metrics for the metrics.
+
+        Only the snapshots recorded since the metrics were last read are folded in:
+        the variance is kept with Welford's online algorithm, and the maximum drawdown
+        with the running peak of the time-weighted growth, so the history is never
+        rescanned. If the history is replaced or a transaction is backdated, the
+        metrics are recalculated from the start.
+
+        Parameters
+        ----------
+        portfolio : InvestmentPortfolio
+            The portfolio to track.
+        risk_free_rate : float
+            The risk-free return per period, as a percentage, for the Sharpe ratio.
+        minimum_acceptable_return : float
+            The return per period, as a percentage, below which a period counts towards
+            the downside deviation, and which the Sortino ratio measures returns above.
+        periods_per_year : float
+            If given, annualise the metrics. The maximum drawdown is never annualised.
+        """
+        self.portfolio = portfolio
+        self.risk_free_rate = risk_free_rate
+        self.minimum_acceptable_return = minimum_acceptable_return
+        self.periods_per_year = periods_per_year
+        self._reset(None)
+
+    @property
+    def metrics(self) -> RiskMetrics:
+        """ The risk metrics of the portfolio, as of its latest snapshot. """
+        self.update()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics = _summarise(self._count, self._mean,
+                                 self._squared_deviations / (self._count - 1),
+                                 self._squared_shortfalls / self._count,
+                                 self.risk_free_rate, self.minimum_acceptable_return,
+                                 self.periods_per_year)
+        max_drawdown = np.round(self._max_drawdown * 100, 2)
+        return RiskMetrics(*(float(metric) for metric in metrics),
+                           float(max_drawdown))
+
+    def update(self):
+        """
+        Fold in the snapshots recorded since the last update. This is done whenever the
+        metrics are read, so is only needed to spread out the work.
+        """
+        history = self.portfolio.history
+        if self.portfolio.history_version == self._history_version:
+            return
+
+        # Recalculate from the start if the snapshots already folded in have changed
+        size = self._size
+        if (history is not self._history or len(history) < size
+                or (size and self._last_snapshot != _snapshot(history, size - 1))):
+            self._reset(history)
+            size = 0
+
+        self._fold(history, size)
+        self._size = len(history)
+        self._last_snapshot = _snapshot(history, self._size - 1) if self._size else None
+        self._history_version = self.portfolio.history_version
+
+    def _reset(self, history: PortfolioHistory):
+        self._history = history
+        self._history_version = None
+        self._size = 0
+        self._last_snapshot = None
+
+        # Welford's running count, mean and sum of squared deviations of the returns
+        self._count = 0
+        self._mean = np.nan
+        self._squared_deviations = np.float64(0)
+        self._squared_shortfalls = np.float64(0)
+
+        # The time-weighted growth at the latest snapshot, and its running peak
+        self._growth = 1.0
+        self._peak = 1.0
+        self._max_drawdown = np.nan
+
+    def _fold(self, history: PortfolioHistory, start: int):
+        """ Fold the snapshots from index `start` onwards into the running metrics. """
+        if start >= len(history):
+            return
+        if start == 0:
+            self._max_drawdown = 0.0
+            start = 1
+        total_deposited = history.total_deposited[start - 1:]
+        values = history.current_portfolio_value[start - 1:]
+        _, returns = _period_returns(total_deposited, values,
+                                     np.zeros(len(values), dtype=np.int64))
+
+        # Welford's algorithm, adding the new returns together: the update for a single
+        # return, generalised to merge the mean and squared deviations of a batch
+        count = len(returns)
+        if count:
+            mean = returns.mean()
+            new_count = self._count + count
+            delta = mean - self._mean if self._count else 0.0
+            self._mean = (self._mean + delta * count / new_count if self._count
+                          else mean)
+            self._squared_deviations += (((returns - mean) ** 2).sum()
+                                         + delta ** 2 * self._count * count / new_count)
+            self._count = new_count
+            shortfalls = np.minimum(returns - self.minimum_acceptable_return / 100, 0)
+            self._squared_shortfalls += (shortfalls ** 2).sum()
+
+            growth = self._growth * np.cumprod(np.maximum(1 + returns, _MIN_GROWTH))
+            peaks = np.maximum.accumulate(np.append(self._peak, growth))[1:]
+            self._max_drawdown = np.max(np.append(self._max_drawdown,
+                                                  1 - growth / peaks))
+            self._growth = growth[-1]
+            self._peak = peaks[-1]
+
+
+def _period_returns(total_deposited: np.ndarray, values: np.ndarray,
+                    portfolio_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The indices of the snapshots that end a valuation period, i.e. have the same total
+    deposited as the snapshot before in the same portfolio, and the return of each
+    period as a fraction.
+    """
+    is_return = np.zeros(len(values), dtype=bool)
+    np.equal(total_deposited[1:], total_deposited[:-1], out=is_return[1:])
+    is_return[1:] &= portfolio_ids[1:] == portfolio_ids[:-1]
+    rows = np.flatnonzero(is_return)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return rows, values[rows] / values[rows - 1] - 1
+
+
+def _summarise(counts: np.ndarray, means: np.ndarray, variances: np.ndarray,
+               downside_variances: np.ndarray, risk_free_rate: float,
+               minimum_acceptable_return: float, periods_per_year: float) -> tuple:
+    """
+    The volatility, downside deviation, Sharpe ratio and Sortino ratio, from the count,
+    mean, variance and mean squared shortfall of the period returns.
+    """
+    volatility = np.where(counts > 1, np.sqrt(variances), np.nan)
+    downside_deviation = np.sqrt(downside_variances)
+    sharpe_ratio = (means - risk_free_rate / 100) / volatility
+    sortino_ratio = (means - minimum_acceptable_return / 100) / downside_deviation
+
+    # Neither ratio is meaningful from fewer than two returns, or over no deviation
+    sharpe_ratio = np.where(volatility > 0, sharpe_ratio, np.nan)
+    sortino_ratio = np.where((counts > 1) & (downside_deviation > 0), sortino_ratio,
+                             np.nan)
+
+    if periods_per_year is not None:
+        scale = np.sqrt(periods_per_year)
+        volatility = volatility * scale
+        downside_deviation = downside_deviation * scale
+        sharpe_ratio = sharpe_ratio * scale
+        sortino_ratio = sortino_ratio * scale
+
+    return (np.round(volatility * 100, 2), np.round(downside_deviation * 100, 2),
+            sharpe_ratio, sortino_ratio)
+
+
+def _snapshot(history: PortfolioHistory, index: int) -> tuple:
+    """ The date, total deposited and value of a snapshot, to tell if it has changed. """
+    return (int(history.dates[index]), float(history.total_deposited[index]),
+            float(history.current_portfolio_value[index]))
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from typing import Union
+
+import numpy as np
+
+from portfolio_manager.history import MICROSECONDS_PER_DAY
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+# Window lengths, in calendar months, for the common rolling returns
+ONE_MONTH = 1
+ONE_YEAR = 12
+THREE_YEARS = 36
+
+
+class RollingReturns:
+    def __init__(self, portfolio: InvestmentPortfolio):
+        """
+        Calculates rolling returns over a portfolio's history, i.e. the return over the
+        window ending at each snapshot.
+
+        The time-weighted growth from the first snapshot up to every snapshot is
+        calculated once (see PortfolioHistory.cumulative_growth). The time-weighted
+        return over any window is then the ratio of the growth at its two ends, so each
+        series of rolling returns takes a single searchsorted over the dates to find
+        where every window starts.
+
+        The returns reflect the history at the time the RollingReturns is created.
+
+        Parameters
+        ----------
+        portfolio : InvestmentPortfolio
+            The portfolio to calculate rolling returns for.
+        """
+        history = portfolio.history
+        self.dates = history.dates.copy()
+        self._growth = history.cumulative_growth
+
+    def time_weighted_returns(self, window: Union[int, timedelta],
+                              annualised: bool = False) -> np.ndarray:
+        """
+        Calculate the time-weighted return over the window ending at each snapshot.
+
+        Each window starts from the portfolio as it was at the window's start date,
+        i.e. from the latest snapshot on or before it. As with
+        TimeWeightedReturnCalculator, a new sub-period starts whenever the total
+        deposited changes.
+
+        Parameters
+        ----------
+        window : Union[int, timedelta]
+            The length of the window, either as a number of calendar months (see
+            ONE_MONTH, ONE_YEAR and THREE_YEARS) or as a timedelta.
+        annualised : bool
+            If True, annualise each return over the length of the window.
+
+        Returns
+        -------
+        np.ndarray : The time-weighted return, as a percentage, of the window ending at
+            each snapshot, in the same order as `dates`. NaN where the window starts
+            before the portfolio's first snapshot.
+        """
+        window_starts = _subtract_window(self.dates, window)
+        starts = np.searchsorted(self.dates, window_starts, side='right') - 1
+        has_start = starts >= 0
+
+        returns = np.full(len(self.dates), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[has_start] = (self._growth[has_start]
+                                  / self._growth[starts[has_start]] - 1) * 100
+
+            if annualised:
+                years = (window / timedelta(days=365.25)
+                         if isinstance(window, timedelta) else window / 12)
+                returns = ((1 + returns / 100) ** (1 / years) - 1) * 100
+
+        return np.round(returns, 2)
+
+
+def _subtract_window(dates: np.ndarray, window: Union[int, timedelta]) -> np.ndarray:
+    """
+    The start date of the window ending at each date, in microseconds since the epoch.
+    Calendar months are subtracted keeping the day of the month, clamped to the length
+    of the target month, e.g. one month before 31st March is 28th or 29th February.
+    """
+    if isinstance(window, timedelta):
+        return dates - window // timedelta(microseconds=1)
+
+    days = (dates // MICROSECONDS_PER_DAY).astype('datetime64[D]')
+    time_of_day = dates - days.astype(np.int64) * MICROSECONDS_PER_DAY
+    months = days.astype('datetime64[M]')
+    day_of_month = (days - months.astype('datetime64[D]')).astype(np.int64)
+
+    target_months = months - window
+    target_month_lengths = ((target_months + 1).astype('datetime64[D]')
+                            - target_months.astype('datetime64[D]')).astype(np.int64)
+    target_days = (target_months.astype('datetime64[D]')
+                   + np.minimum(day_of_month, target_month_lengths - 1))
+    return target_days.astype(np.int64) * MICROSECONDS_PER_DAY + time_of_day
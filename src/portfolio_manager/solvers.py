@@ -0,0 +1,150 @@
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+# Bounds on the log growth over the whole period of the cash flows when searching for a
+# sign change in the net present value. Half-width of the initial bracket, and the
+# maximum half-width after repeatedly doubling it.
+_INITIAL_BRACKET = 1.0
+_MAX_BRACKET = 256.0
+
+
+def xirr(cash_flows: Sequence[float],
+         times: Sequence[float],
+         offsets: Sequence[int] = None,
+         tolerance: float = 1e-12,
+         max_iterations: int = 100) -> Union[float, np.ndarray]:
+    """
+    Calculate the internal rate of return of a series of irregularly spaced cash flows,
+    i.e. the rate r for which sum(cash_flows / (1 + r) ** times) == 0.
+
+    The rate is found with a safeguarded Newton iteration: each Newton step is kept
+    within a bracket around the root, falling back to bisection if it would leave the
+    bracket. Many independent series can be solved at once by concatenating them and
+    passing the index at which each series starts as `offsets`; every iteration then
+    evaluates all of the series together.
+
+    Parameters
+    ----------
+    cash_flows : Sequence[float]
+        The cash flows, with money paid in negative and money paid out positive.
+    times : Sequence[float]
+        When each cash flow happened. The rate is returned per unit of time, so e.g.
+        pass times in years to get an annual rate.
+    offsets : Sequence[int]
+        The index at which each series of cash flows starts, in ascending order. If not
+        provided, all of the cash flows belong to a single series.
+    tolerance : float
+        Stop once every rate, as log growth over its whole series, changes by less than
+        this amount between iterations.
+    max_iterations : int
+        The maximum number of iterations to perform.
+
+    Returns
+    -------
+    Union[float, np.ndarray] : The rate of return of each series, as a fraction, e.g.
+        0.18 represents 18%. NaN where no rate exists, e.g. if all cash flows have the
+        same sign or happen at the same time. A float if `offsets` isn't provided.
+    """
+    cash_flows = np.asarray(cash_flows, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    single_series = offsets is None
+    offsets = np.zeros(1, dtype=np.intp) if single_series else np.asarray(offsets,
+                                                                          dtype=np.intp)
+    if len(cash_flows) == 0 or np.any(np.diff(np.append(offsets, len(cash_flows))) <= 0):
+        raise ValueError('Every series must contain at least one cash flow.')
+
+    # Rescale the times of each series onto [0, 1] and solve for the log growth over
+    # the whole series. This keeps the problem well scaled for both very short and very
+    # long series
+    series = np.repeat(np.arange(len(offsets)),
+                       np.diff(np.append(offsets, len(cash_flows))))
+    start = np.minimum.reduceat(times, offsets)
+    span = np.maximum.reduceat(times, offsets) - start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled_times = (times - start[series]) / span[series]
+
+    log_growth = _solve_log_growth(cash_flows, scaled_times, series, offsets, tolerance,
+                                   max_iterations)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        rates = np.where(span > 0, np.expm1(log_growth / span), np.nan)
+
+    return float(rates[0]) if single_series else rates
+
+
+def _net_present_value(log_growth: np.ndarray, cash_flows: np.ndarray,
+                       scaled_times: np.ndarray, series: np.ndarray,
+                       offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The net present value of each series of cash flows, and its derivative, given the
+    log growth over the whole of each series.
+    """
+    with np.errstate(over='ignore', invalid='ignore'):
+        discounted = cash_flows * np.exp(-log_growth[series] * scaled_times)
+        npv = np.add.reduceat(discounted, offsets)
+        derivative = np.add.reduceat(-scaled_times * discounted, offsets)
+    return npv, derivative
+
+
+def _solve_log_growth(cash_flows: np.ndarray, scaled_times: np.ndarray,
+                      series: np.ndarray, offsets: np.ndarray, tolerance: float,
+                      max_iterations: int) -> np.ndarray:
+    """ Find the log growth of each series at which its net present value is zero. """
+    n_series = len(offsets)
+
+    # Bracket the root of each series by widening the search until the net present
+    # value changes sign
+    low = np.full(n_series, -_INITIAL_BRACKET)
+    high = np.full(n_series, _INITIAL_BRACKET)
+    npv_low = _net_present_value(low, cash_flows, scaled_times, series, offsets)[0]
+    npv_high = _net_present_value(high, cash_flows, scaled_times, series, offsets)[0]
+    bracketed = np.sign(npv_low) * np.sign(npv_high) <= 0
+    width = _INITIAL_BRACKET
+    while not bracketed.all() and width < _MAX_BRACKET:
+        width *= 2
+        low = np.where(bracketed, low, -width)
+        high = np.where(bracketed, high, width)
+        npv_low = np.where(
+            bracketed, npv_low,
+            _net_present_value(low, cash_flows, scaled_times, series, offsets)[0])
+        npv_high = np.where(
+            bracketed, npv_high,
+            _net_present_value(high, cash_flows, scaled_times, series, offsets)[0])
+        bracketed = np.sign(npv_low) * np.sign(npv_high) <= 0
+    low = np.where(bracketed, low, np.nan)
+    high = np.where(bracketed, high, np.nan)
+
+    # Start from the log of the simple growth (money out over money in), which is exact
+    # when there is a single payment in followed by a single payment out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        paid_in = -np.add.reduceat(np.minimum(cash_flows, 0), offsets)
+        paid_out = np.add.reduceat(np.maximum(cash_flows, 0), offsets)
+        log_growth = np.log(paid_out / paid_in)
+    log_growth = np.where((log_growth > low) & (log_growth < high), log_growth,
+                          (low + high) / 2)
+
+    converged = np.zeros(n_series, dtype=bool)
+    for _ in range(max_iterations):
+        npv, derivative = _net_present_value(log_growth, cash_flows, scaled_times,
+                                             series, offsets)
+
+        # Narrow the bracket, keeping the sign change inside it
+        same_sign_as_low = np.sign(npv) == np.sign(npv_low)
+        low = np.where(same_sign_as_low, log_growth, low)
+        npv_low = np.where(same_sign_as_low, npv, npv_low)
+        high = np.where(same_sign_as_low, high, log_growth)
+
+        # Take a Newton step, or bisect if the step would leave the bracket
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = log_growth - npv / derivative
+        in_bracket = (newton >= low) & (newton <= high)
+        new_log_growth = np.where(in_bracket, newton, (low + high) / 2)
+        new_log_growth = np.where((npv == 0) | converged, log_growth, new_log_growth)
+
+        # Once a series has converged it is left alone while the others continue
+        converged |= ~(np.abs(new_log_growth - log_growth) >= tolerance)
+        log_growth = new_log_growth
+        if converged.all():
+            break
+
+    return log_growth
@@ -0,0 +1,253 @@
+import abc
+import contextlib
+import json
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+import numpy as np
+
+from portfolio_manager.history import PortfolioHistory
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+class PortfolioStorage(abc.ABC):
+    """
+    Base class for places portfolios can be saved to and loaded from, by name. Pass a
+    storage to InvestmentPortfolio.save_portfolio and load_portfolio to use it in place
+    of pickle files.
+    """
+    @abc.abstractmethod
+    def save(self, portfolio: InvestmentPortfolio):
+        """ Save the portfolio under its name, replacing any saved with that name. """
+        pass
+
+    @abc.abstractmethod
+    def load(self, name: str) -> InvestmentPortfolio:
+        """ Load the portfolio saved with the given name. Raises KeyError if none is. """
+        pass
+
+    @abc.abstractmethod
+    def delete(self, name: str):
+        """ Delete the portfolio saved with the given name, if there is one. """
+        pass
+
+    @abc.abstractmethod
+    def list_portfolios(self) -> List[str]:
+        """ The names of all the saved portfolios, in alphabetical order. """
+        pass
+
+    def save_many(self, portfolios: Iterable[InvestmentPortfolio]):
+        """ Save many portfolios. Storages may override this to save them in bulk. """
+        for portfolio in portfolios:
+            self.save(portfolio)
+
+    def close(self):
+        """ Release any resources held by the storage. """
+        pass
+
+    def __enter__(self) -> 'PortfolioStorage':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    total_deposited REAL NOT NULL,
+    current_portfolio_value REAL NOT NULL,
+    latest_transaction_date TEXT,
+    transaction_types TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios (id) ON DELETE CASCADE,
+    date INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    total_deposited REAL,
+    current_portfolio_value REAL,
+    transaction_code INTEGER NOT NULL,
+    PRIMARY KEY (portfolio_id, date, position)
+) WITHOUT ROWID;
+"""
+
+_SNAPSHOT = np.dtype([('date', np.int64), ('total_deposited', np.float64),
+                      ('current_portfolio_value', np.float64),
+                      ('transaction_code', np.uint8)])
+
+
+class SQLiteStorage(PortfolioStorage):
+    def __init__(self, path: str, pool_size: int = 4):
+        """
+        Stores portfolios in an SQLite database, with a row per snapshot keyed by the
+        portfolio and date. Saving a portfolio which was previously saved only inserts
+        the snapshots recorded since, so appending one snapshot is a single-row insert.
+
+        The database uses write-ahead logging, so reads don't block on writes, and each
+        save happens in a single transaction. Connections are pooled and reused, and the
+        storage can be shared between threads.
+
+        Parameters
+        ----------
+        path : str
+            The path of the database file. It is created if it doesn't exist.
+        pool_size : int
+            The maximum number of open connections. Threads wait for a connection once
+            this many are in use.
+        """
+        if pool_size < 1:
+            raise ValueError('pool_size must be at least 1.')
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._n_connections = 0
+        self._lock = threading.Lock()
+
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def save(self, portfolio: InvestmentPortfolio):
+        self.save_many([portfolio])
+
+    def save_many(self, portfolios: Iterable[InvestmentPortfolio]):
+        """ Save many portfolios in a single transaction. """
+        with self._connection() as connection, connection:
+            for portfolio in portfolios:
+                self._save(connection, portfolio)
+
+    def load(self, name: str) -> InvestmentPortfolio:
+        with self._connection() as connection:
+            row = connection.execute(
+                'SELECT id, total_deposited, current_portfolio_value, '
+                'latest_transaction_date, transaction_types FROM portfolios '
+                'WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                raise KeyError(f'No portfolio named {name} has been saved.')
+            portfolio_id, total_deposited, value, latest_date, transaction_types = row
+
+            snapshots = np.array(connection.execute(
+                'SELECT date, total_deposited, current_portfolio_value, '
+                'transaction_code FROM snapshots WHERE portfolio_id = ? '
+                'ORDER BY date, position',
+                (portfolio_id,)).fetchall(), dtype=_SNAPSHOT)
+
+        portfolio = InvestmentPortfolio(name=name, total_deposited=total_deposited,
+                                        current_portfolio_value=value)
+        portfolio.history = PortfolioHistory.from_arrays(
+            snapshots['date'], snapshots['total_deposited'],
+            snapshots['current_portfolio_value'], snapshots['transaction_code'],
+            json.loads(transaction_types))
+        if latest_date is not None:
+            portfolio.latest_transaction_date = datetime.fromisoformat(latest_date)
+        return portfolio
+
+    def delete(self, name: str):
+        with self._connection() as connection, connection:
+            connection.execute('DELETE FROM portfolios WHERE name = ?', (name,))
+
+    def list_portfolios(self) -> List[str]:
+        with self._connection() as connection:
+            return [name for name, in connection.execute(
+                'SELECT name FROM portfolios ORDER BY name')]
+
+    def close(self):
+        """ Close the pooled connections. """
+        with self._lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._n_connections -= 1
+
+    def _save(self, connection: sqlite3.Connection, portfolio: InvestmentPortfolio):
+        """ Save a portfolio, within the caller's transaction. """
+        history = portfolio.history
+        latest_date = portfolio.latest_transaction_date
+        connection.execute(
+            'INSERT INTO portfolios (name, total_deposited, current_portfolio_value, '
+            'latest_transaction_date, transaction_types) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET '
+            'total_deposited = excluded.total_deposited, '
+            'current_portfolio_value = excluded.current_portfolio_value, '
+            'latest_transaction_date = excluded.latest_transaction_date, '
+            'transaction_types = excluded.transaction_types',
+            (portfolio.name, float(portfolio.total_deposited),
+             float(portfolio.current_portfolio_value),
+             latest_date.isoformat() if latest_date is not None else None,
+             json.dumps(history.transaction_types)))
+        portfolio_id, = connection.execute('SELECT id FROM portfolios WHERE name = ?',
+                                           (portfolio.name,)).fetchone()
+
+        # If the saved snapshots are the start of the history, only insert the rest.
+        # Otherwise, e.g. if the history was replaced, rewrite all of the snapshots
+        start = self._saved_length(connection, portfolio_id, history)
+        if start is None:
+            connection.execute('DELETE FROM snapshots WHERE portfolio_id = ?',
+                               (portfolio_id,))
+            start = 0
+        if start == len(history):
+            return
+
+        connection.executemany(
+            'INSERT INTO snapshots (portfolio_id, date, position, total_deposited, '
+            'current_portfolio_value, transaction_code) VALUES (?, ?, ?, ?, ?, ?)',
+            zip([portfolio_id] * (len(history) - start),
+                history.dates[start:].tolist(), range(start, len(history)),
+                history.total_deposited[start:].tolist(),
+                history.current_portfolio_value[start:].tolist(),
+                history.transaction_codes[start:].tolist()))
+
+    @staticmethod
+    def _saved_length(connection: sqlite3.Connection, portfolio_id: int,
+                      history: PortfolioHistory):
+        """
+        The number of snapshots saved for a portfolio, if the latest saved snapshot
+        matches the snapshot in the same position of the history, or None if not.
+        """
+        row = connection.execute(
+            'SELECT position, date, total_deposited, current_portfolio_value, '
+            'transaction_code FROM snapshots WHERE portfolio_id = ? '
+            'ORDER BY date DESC, position DESC LIMIT 1', (portfolio_id,)).fetchone()
+        if row is None:
+            return 0
+
+        position, *saved = row
+        if position >= len(history):
+            return None
+
+        # SQLite stores NaN as NULL
+        saved = np.array(saved, dtype=np.float64)
+        current = np.array([history.dates[position], history.total_deposited[position],
+                            history.current_portfolio_value[position],
+                            history.transaction_codes[position]], dtype=np.float64)
+        return position + 1 if np.array_equal(saved, current, equal_nan=True) else None
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """ Borrow a connection from the pool, opening one if there's room. """
+        with self._lock:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                connection = None
+                if self._n_connections < self.pool_size:
+                    connection = self._connect()
+                    self._n_connections += 1
+        if connection is None:
+            connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute('PRAGMA foreign_keys = ON')
+        return connection
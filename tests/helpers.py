@@ -0,0 +1,20 @@
+import numpy as np
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+def make_portfolio(seed: int) -> InvestmentPortfolio:
+    """ A portfolio with random deposits, withdrawals and value updates. """
+    rng = np.random.default_rng(seed)
+    n_transactions = rng.integers(2, 40)
+    transaction_types = rng.choice(['deposit', 'withdrawal', 'update_portfolio_value'],
+                                   n_transactions, p=[0.2, 0.1, 0.7])
+    transaction_types[0] = 'deposit'
+    return InvestmentPortfolio.from_records({
+        'date': np.datetime64('2020-01-01') + np.cumsum(rng.integers(1, 30,
+                                                                     n_transactions)),
+        'transaction_type': transaction_types,
+        'amount': np.where(transaction_types == 'withdrawal', 1, 100),
+        'value': np.where(transaction_types == 'update_portfolio_value',
+                          rng.uniform(100, 200, n_transactions), np.nan)
+    })
@@ -0,0 +1,92 @@
+import functools
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.batch import (PackedHistories, modified_dietz_returns,
+                                     money_weighted_returns, simple_returns,
+                                     time_weighted_returns)
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (ModifiedDietzReturnCalculator,
+                                                  MoneyWeightedReturnCalculator,
+                                                  SimpleReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+from tests.helpers import make_portfolio
+
+
+class BatchReturnsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.portfolios = [make_portfolio(seed) for seed in range(20)]
+
+        # Portfolios with too little history to calculate a return
+        self.portfolios.insert(3, InvestmentPortfolio())
+        single_deposit = InvestmentPortfolio()
+        single_deposit.deposit(100, date=datetime(2021, 1, 1))
+        self.portfolios.insert(7, single_deposit)
+        self.invalid = [3, 7]
+
+    def assert_matches_calculator(self, batch_function, calculator):
+        for annualised in (False, True):
+            actual = batch_function(self.portfolios, annualised=annualised)
+            self.assertEqual(len(self.portfolios), len(actual))
+            for i, portfolio in enumerate(self.portfolios):
+                if i in self.invalid:
+                    self.assertTrue(np.isnan(actual[i]))
+                    continue
+                try:
+                    expected = calculator.calculate_return(portfolio, annualised)
+                except ValueError:
+                    # e.g. annualising a Modified Dietz loss of more than 100%
+                    self.assertTrue(np.isnan(actual[i]))
+                    continue
+                if np.isnan(expected):
+                    self.assertTrue(np.isnan(actual[i]))
+                else:
+                    self.assertAlmostEqual(expected, actual[i], delta=0.011)
+
+    def test_pack(self):
+        packed = PackedHistories.from_portfolios(self.portfolios)
+        self.assertEqual(len(self.portfolios), len(packed))
+        np.testing.assert_array_equal(
+            [len(portfolio.history) for portfolio in self.portfolios], packed.lengths)
+        np.testing.assert_array_equal(
+            self.portfolios[5].history.current_portfolio_value,
+            packed.current_portfolio_value[packed.offsets[5]:packed.offsets[6]])
+
+        empty = PackedHistories.from_portfolios([])
+        self.assertEqual(0, len(empty))
+        self.assertEqual(0, len(simple_returns(empty)))
+
+    def test_trailing_empty_portfolio(self):
+        self.portfolios.append(InvestmentPortfolio())
+        self.invalid.append(len(self.portfolios) - 1)
+        for batch_function in (simple_returns, time_weighted_returns,
+                               money_weighted_returns, modified_dietz_returns):
+            returns = batch_function(self.portfolios)
+            self.assertTrue(np.isnan(returns[-1]))
+        self.assert_matches_calculator(money_weighted_returns,
+                                       MoneyWeightedReturnCalculator())
+
+    def test_simple_returns(self):
+        self.assert_matches_calculator(simple_returns, SimpleReturnCalculator())
+
+    def test_time_weighted_returns(self):
+        self.assert_matches_calculator(time_weighted_returns,
+                                       TimeWeightedReturnCalculator())
+
+    def test_money_weighted_returns(self):
+        self.assert_matches_calculator(money_weighted_returns,
+                                       MoneyWeightedReturnCalculator())
+
+    def test_modified_dietz_returns(self):
+        self.assert_matches_calculator(modified_dietz_returns,
+                                       ModifiedDietzReturnCalculator())
+        for period in ('daily', 'monthly', 'yearly'):
+            self.assert_matches_calculator(
+                functools.partial(modified_dietz_returns, period=period),
+                ModifiedDietzReturnCalculator(period))
+
+
+if __name__ == "__main__":
+    unittest.main()
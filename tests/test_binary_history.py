@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+from portfolio_manager.binary_history import load_binary, save_binary
+from portfolio_manager.portfolio import InvestmentPortfolio, load_portfolio
+from portfolio_manager.return_calculators import (MoneyWeightedReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+from tests.helpers import make_portfolio
+
+
+class BinaryHistoryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'portfolio.pmh')
+        self.portfolio = make_portfolio(2)
+
+    def test_save_and_load(self):
+        save_binary(self.portfolio, self.path)
+        loaded = load_binary(self.path)
+
+        self.assertEqual(self.portfolio.name, loaded.name)
+        self.assertEqual(self.portfolio.portfolio_history, loaded.portfolio_history)
+        self.assertEqual(self.portfolio.total_deposited, loaded.total_deposited)
+        self.assertEqual(self.portfolio.current_portfolio_value,
+                         loaded.current_portfolio_value)
+        self.assertEqual(self.portfolio.latest_transaction_date,
+                         loaded.latest_transaction_date)
+        for calculator in (TimeWeightedReturnCalculator(),
+                           MoneyWeightedReturnCalculator()):
+            self.assertEqual(calculator.calculate_return(self.portfolio),
+                             calculator.calculate_return(loaded))
+
+        # The history is memory-mapped rather than read into memory
+        self.assertIsInstance(loaded.history._current_portfolio_value, np.memmap)
+        with self.assertRaises(ValueError):
+            loaded.history.current_portfolio_value[0] = 0
+
+    def test_record_after_load(self):
+        save_binary(self.portfolio, self.path)
+        loaded = load_binary(self.path)
+        date = loaded.latest_transaction_date.replace(year=2030)
+        loaded.deposit(100, date=date)
+        self.portfolio.deposit(100, date=date)
+
+        self.assertEqual(self.portfolio.portfolio_history, loaded.portfolio_history)
+        self.assertEqual(self.portfolio.history.time_weighted_growth,
+                         loaded.history.time_weighted_growth)
+
+        # The file is left unchanged, and can be overwritten while it's mapped
+        self.assertEqual(len(self.portfolio.history) - 1,
+                         len(load_binary(self.path).history))
+        save_binary(loaded, self.path)
+        self.assertEqual(len(self.portfolio.history), len(load_binary(self.path).history))
+
+    def test_empty_and_timezone_aware(self):
+        empty = InvestmentPortfolio(name='empty')
+        save_binary(empty, self.path)
+        self.assertEqual(0, len(load_binary(self.path).history))
+
+        aware = InvestmentPortfolio(name='aware')
+        aware.deposit(100, date=datetime(2021, 1, 1, tzinfo=timezone.utc))
+        save_binary(aware, self.path)
+        self.assertEqual(aware.latest_transaction_date,
+                         load_binary(self.path).latest_transaction_date)
+
+    def test_save_portfolio(self):
+        self.portfolio.name = 'binary'
+        self.portfolio.save_portfolio(self.directory.name, binary=True)
+        loaded = load_portfolio('binary', self.directory.name)
+        self.assertEqual(self.portfolio.portfolio_history, loaded.portfolio_history)
+        loaded = load_portfolio('binary.pmh', self.directory.name)
+        self.assertEqual(self.portfolio.portfolio_history, loaded.portfolio_history)
+
+        with self.assertRaises(ValueError):
+            self.portfolio.save_portfolio(self.directory.name, journal=True,
+                                          binary=True)
+
+    def test_mixed_formats(self):
+        # Whichever format was saved last is loaded
+        directory = self.directory.name
+        self.portfolio.name = 'binary'
+        self.portfolio.save_portfolio(directory, binary=True)
+        date = self.portfolio.latest_transaction_date.replace(year=2030)
+        self.portfolio.deposit(100, date=date)
+        self.portfolio.save_portfolio(directory)
+        self.assertFalse(os.path.exists(os.path.join(directory, 'binary.pmh')))
+        self.assertEqual(self.portfolio.portfolio_history,
+                         load_portfolio('binary', directory).portfolio_history)
+
+        self.portfolio.update_portfolio_value(500, date=date.replace(year=2031))
+        self.portfolio.save_portfolio(directory, binary=True)
+        self.assertFalse(os.path.exists(os.path.join(directory, 'binary.pkl')))
+        self.assertEqual(500, load_portfolio('binary', directory).current_portfolio_value)
+
+    def test_not_binary(self):
+        with open(self.path, 'wb') as handle:
+            handle.write(b'not a binary history')
+        with self.assertRaises(ValueError):
+            load_binary(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
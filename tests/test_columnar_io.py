@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.batch import (PackedHistories, money_weighted_returns,
+                                     time_weighted_returns)
+from portfolio_manager.portfolio import InvestmentPortfolio
+from tests.helpers import make_portfolio
+
+try:
+    import pyarrow.parquet as pq
+    from portfolio_manager.columnar_io import (ARROW_IPC, PARQUET, read_packed_histories,
+                                               read_portfolios, write_histories)
+except ImportError:
+    pq = None
+
+
+@unittest.skipIf(pq is None, 'pyarrow is not installed')
+class ColumnarIOTests(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.portfolios = [make_portfolio(seed) for seed in range(10)]
+        for i, portfolio in enumerate(self.portfolios):
+            portfolio.name = f'portfolio_{i}'
+
+    def test_round_trip(self):
+        for file_format in (PARQUET, ARROW_IPC):
+            path = os.path.join(self.directory, f'histories.{file_format}')
+            write_histories(self.portfolios, path, file_format, row_group_size=16)
+
+            loaded = read_portfolios(path)
+            self.assertEqual([portfolio.name for portfolio in self.portfolios],
+                             [portfolio.name for portfolio in loaded])
+            for portfolio, loaded_portfolio in zip(self.portfolios, loaded):
+                self.assertEqual(portfolio.portfolio_history,
+                                 loaded_portfolio.portfolio_history)
+                self.assertEqual(portfolio.current_portfolio_value,
+                                 loaded_portfolio.current_portfolio_value)
+                self.assertEqual(portfolio.latest_transaction_date,
+                                 loaded_portfolio.latest_transaction_date)
+
+    def test_row_groups(self):
+        path = os.path.join(self.directory, 'histories.parquet')
+        write_histories(self.portfolios, path, row_group_size=16)
+        n_rows = sum(len(portfolio.history) for portfolio in self.portfolios)
+
+        metadata = pq.ParquetFile(path).metadata
+        self.assertEqual(n_rows, metadata.num_rows)
+        self.assertEqual(-(-n_rows // 16), metadata.num_row_groups)
+        self.assertTrue(all(metadata.row_group(i).num_rows == 16
+                            for i in range(metadata.num_row_groups - 1)))
+
+    def test_filters(self):
+        path = os.path.join(self.directory, 'histories.parquet')
+        write_histories(self.portfolios, path, row_group_size=16)
+        start, end = datetime(2020, 3, 1), datetime(2020, 6, 30)
+
+        names, packed = read_packed_histories(path, ['portfolio_7', 'portfolio_2'],
+                                              start, end)
+        self.assertEqual(['portfolio_2', 'portfolio_7'], names)
+        for i, name in enumerate(names):
+            history = self.portfolios[int(name[-1])].history
+            dates = history.dates.astype('datetime64[us]')
+            in_range = (dates >= np.datetime64(start)) & (dates <= np.datetime64(end))
+            first, last = packed.offsets[i], packed.offsets[i + 1]
+            np.testing.assert_array_equal(history.dates[in_range],
+                                          packed.dates[first:last])
+            np.testing.assert_array_equal(history.current_portfolio_value[in_range],
+                                          packed.current_portfolio_value[first:last])
+
+    def test_columns(self):
+        path = os.path.join(self.directory, 'histories.ipc')
+        write_histories(self.portfolios, path, ARROW_IPC)
+        packed = PackedHistories.from_portfolios(self.portfolios)
+
+        # The time-weighted return doesn't need the transaction types
+        names, partial = read_packed_histories(
+            path, columns=['date', 'total_deposited', 'current_portfolio_value'])
+        np.testing.assert_array_equal(time_weighted_returns(packed),
+                                      time_weighted_returns(partial))
+        self.assertTrue(np.all(partial.transaction_codes == 2))
+
+        _, full = read_packed_histories(path)
+        np.testing.assert_array_equal(money_weighted_returns(packed),
+                                      money_weighted_returns(full))
+
+        with self.assertRaises(ValueError):
+            read_packed_histories(path, columns=['unknown'])
+
+    def test_export_history(self):
+        portfolio = InvestmentPortfolio(name='single')
+        portfolio.deposit(100, date=datetime(2021, 1, 1))
+        portfolio.history.append(datetime(2021, 1, 2), 100, 110, 'dividend')
+        path = os.path.join(self.directory, 'single.parquet')
+        portfolio.export_history(path)
+
+        loaded, = read_portfolios(path)
+        self.assertEqual(portfolio.portfolio_history, loaded.portfolio_history)
+        self.assertEqual([], read_portfolios(path, names=['missing']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.consolidated import ConsolidatedPortfolio
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (MoneyWeightedReturnCalculator,
+                                                  SimpleReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+from tests.helpers import make_portfolio
+
+
+class ConsolidatedPortfolioTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.isa = InvestmentPortfolio(name='isa')
+        self.isa.deposit(1000, date=datetime(2021, 1, 1))
+        self.isa.update_portfolio_value(1100, date=datetime(2021, 3, 1))
+        self.pension = InvestmentPortfolio(name='pension')
+        self.pension.deposit(500, date=datetime(2021, 2, 1))
+        self.pension.update_portfolio_value(450, date=datetime(2021, 3, 1))
+        self.consolidated = ConsolidatedPortfolio([self.isa, self.pension])
+
+    def test_merged_history(self):
+        self.assertEqual('isa+pension', self.consolidated.name)
+        self.assertListEqual([
+            {'date': datetime(2021, 1, 1), 'total_deposited': 1000,
+             'current_portfolio_value': 1000, 'transaction_type': 'deposit'},
+            {'date': datetime(2021, 2, 1), 'total_deposited': 1500,
+             'current_portfolio_value': 1500, 'transaction_type': 'deposit'},
+            {'date': datetime(2021, 3, 1), 'total_deposited': 1500,
+             'current_portfolio_value': 1600,
+             'transaction_type': 'update_portfolio_value'},
+            {'date': datetime(2021, 3, 1), 'total_deposited': 1500,
+             'current_portfolio_value': 1550,
+             'transaction_type': 'update_portfolio_value'},
+        ], self.consolidated.portfolio_history)
+        self.assertEqual(1500, self.consolidated.total_deposited)
+        self.assertEqual(1550, self.consolidated.current_portfolio_value)
+        self.assertEqual(datetime(2021, 3, 1), self.consolidated.latest_transaction_date)
+
+        # Streaming the merge gives the same snapshots
+        self.assertListEqual(self.consolidated.portfolio_history,
+                             list(self.consolidated.snapshots()))
+
+        empty = ConsolidatedPortfolio([InvestmentPortfolio(), InvestmentPortfolio()])
+        self.assertEqual(0, len(empty.history))
+        self.assertListEqual([], list(empty.snapshots()))
+        self.assertIsNone(empty.latest_transaction_date)
+
+    def test_random_members(self):
+        members = [make_portfolio(seed) for seed in range(5)]
+        members[2].history.append(datetime(2020, 3, 1), 100, 100, 'fee')
+        consolidated = ConsolidatedPortfolio(members)
+        self.assertEqual(sum(len(member.history) for member in members),
+                         len(consolidated.history))
+        self.assertListEqual(list(consolidated.snapshots()),
+                             consolidated.portfolio_history)
+
+    def test_follows_members(self):
+        history = self.consolidated.history
+        version = self.consolidated.history_version
+        self.assertIs(history, self.consolidated.history)
+        self.assertEqual(version, self.consolidated.history_version)
+
+        self.pension.deposit(100, date=datetime(2021, 4, 1))
+        self.assertNotEqual(version, self.consolidated.history_version)
+        self.assertEqual(5, len(self.consolidated.history))
+        self.assertEqual(1650, self.consolidated.history.current_portfolio_value[-1])
+
+    def test_return_calculators(self):
+        # A single member consolidates to itself
+        for seed in range(5):
+            member = make_portfolio(seed)
+            consolidated = ConsolidatedPortfolio([member])
+            for calculator in (SimpleReturnCalculator(), TimeWeightedReturnCalculator(),
+                               MoneyWeightedReturnCalculator()):
+                self.assertEqual(calculator.calculate_return(member),
+                                 calculator.calculate_return(consolidated))
+
+        # And the cached returns follow changes to the members
+        calculator = TimeWeightedReturnCalculator()
+        before = calculator.calculate_return(self.consolidated, annualised=False)
+        self.assertEqual(round((1600 / 1500 * 1550 / 1600 - 1) * 100, 2), before)
+        self.isa.update_portfolio_value(1300, date=datetime(2021, 4, 1))
+        self.assertEqual(round((1750 / 1500 - 1) * 100, 2),
+                         calculator.calculate_return(self.consolidated, annualised=False))
+
+        as_of = calculator.calculate_return(self.consolidated, annualised=False,
+                                            as_of=[datetime(2021, 3, 1)])
+        np.testing.assert_array_equal([before], as_of)
+
+
+if __name__ == '__main__':
+    unittest.main()
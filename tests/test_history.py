@@ -0,0 +1,210 @@
+import pickle
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from portfolio_manager.history import (MONTHLY, PortfolioHistory, from_epoch,
+                                       to_epoch)
+from portfolio_manager.portfolio import InvestmentPortfolio
+
+
+class PortfolioHistoryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_history = PortfolioHistory(capacity=2)
+
+    def test_epoch_conversion(self):
+        date = datetime(2021, 3, 4, 5, 6, 7, 8)
+        self.assertEqual(date, from_epoch(to_epoch(date)))
+        self.assertEqual(0, to_epoch(datetime(1970, 1, 1)))
+        self.assertEqual(0, to_epoch(datetime(1970, 1, 1, tzinfo=timezone.utc)))
+        self.assertEqual(to_epoch(date), to_epoch(np.datetime64(date)))
+
+    def test_append_grows_capacity(self):
+        for day in range(1, 11):
+            self.test_history.append(datetime(2021, 1, day), day, day * 2, 'deposit')
+
+        self.assertEqual(10, len(self.test_history))
+        np.testing.assert_array_equal(np.arange(1, 11),
+                                      self.test_history.total_deposited)
+        np.testing.assert_array_equal(np.arange(1, 11) * 2,
+                                      self.test_history.current_portfolio_value)
+        np.testing.assert_array_equal(np.zeros(10), self.test_history.transaction_codes)
+        self.assertEqual(datetime(2021, 1, 10), self.test_history.date_at(-1))
+
+    def test_append_out_of_order(self):
+        self.test_history.append(datetime(2021, 1, 1), 1, 1, 'deposit')
+        self.test_history.append(datetime(2021, 1, 3), 3, 3, 'deposit')
+        index = self.test_history.append(datetime(2021, 1, 2), 2, 2, 'withdrawal')
+
+        self.assertEqual(1, index)
+        np.testing.assert_array_equal([1, 2, 3], self.test_history.total_deposited)
+        np.testing.assert_array_equal([0, 1, 0], self.test_history.transaction_codes)
+
+    def test_views_are_read_only_and_not_copies(self):
+        self.test_history.append(datetime(2021, 1, 1), 1, 1, 'deposit')
+        values = self.test_history.current_portfolio_value
+        self.assertTrue(np.shares_memory(values,
+                                         self.test_history._current_portfolio_value))
+        with self.assertRaises(ValueError):
+            values[0] = 10
+
+    def test_to_records(self):
+        self.test_history.append(datetime(2021, 1, 1), 10, 10, 'deposit')
+        self.test_history.append(datetime(2021, 1, 2), 10, 12, 'custom')
+
+        expected = [{'date': datetime(2021, 1, 1),
+                     'total_deposited': 10,
+                     'current_portfolio_value': 10,
+                     'transaction_type': 'deposit'},
+                    {'date': datetime(2021, 1, 2),
+                     'total_deposited': 10,
+                     'current_portfolio_value': 12,
+                     'transaction_type': 'custom'}]
+        actual = self.test_history.to_records()
+        self.assertListEqual(expected, actual)
+        self.assertEqual(3, self.test_history.transaction_code('custom'))
+
+        with self.assertRaises(TypeError):
+            actual.append({})
+
+    def test_to_records_timezone_aware(self):
+        # Dates are stored in UTC, so timezone-aware dates come back as naive UTC
+        tz = timezone(timedelta(hours=-5))
+        self.test_history.append(datetime(2021, 1, 1, 22, tzinfo=tz), 10, 10, 'deposit')
+        portfolio = InvestmentPortfolio()
+        portfolio.apply_transactions([datetime(2021, 1, 1, 22, tzinfo=tz)], ['deposit'],
+                                     amounts=[10])
+
+        for history in (self.test_history, portfolio.history):
+            date = history.to_records()[0]['date']
+            self.assertEqual(datetime(2021, 1, 2, 3), date)
+            self.assertIsNone(date.tzinfo)
+            self.assertEqual(date, history.date_at(0))
+
+    def test_time_weighted_growth(self):
+        # Sub-periods are runs of equal 'total_deposited', including single snapshots
+        total_deposited = [100, 100, 200, 150, 150, 150]
+        values = [100, 110, 220, 160, 150, 176]
+        expected = (110 / 100) * (220 / 220) * (176 / 160)
+
+        self.assertTrue(np.isnan(self.test_history.time_weighted_growth))
+        for day, (deposited, value) in enumerate(zip(total_deposited, values), 1):
+            self.test_history.append(datetime(2021, 1, day), deposited, value, 'deposit')
+        self.assertAlmostEqual(expected, self.test_history.time_weighted_growth)
+
+        # Recording the same snapshots in bulk should give the same result
+        bulk_history = PortfolioHistory()
+        bulk_history.append(datetime(2021, 1, 1), 100, 100, 'deposit')
+        bulk_history.extend(np.arange(1, 4), total_deposited[1:4], values[1:4],
+                            np.zeros(3))
+        bulk_history.extend(np.arange(4, 6), total_deposited[4:], values[4:],
+                            np.zeros(2))
+        self.assertAlmostEqual(expected, bulk_history.time_weighted_growth)
+
+        # As should initialising from a list of snapshots
+        snapshots = self.test_history.to_records()
+        self.assertAlmostEqual(expected,
+                               PortfolioHistory(snapshots).time_weighted_growth)
+
+    def test_time_weighted_growth_out_of_order(self):
+        self.test_history.append(datetime(2021, 1, 1), 100, 100, 'deposit')
+        self.test_history.append(datetime(2021, 1, 3), 200, 240, 'deposit')
+        self.assertAlmostEqual(1, self.test_history.time_weighted_growth)
+
+        # Inserting a snapshot before the latest one recalculates the growth
+        self.test_history.append(datetime(2021, 1, 2), 100, 120, 'update')
+        self.assertAlmostEqual(1.2, self.test_history.time_weighted_growth)
+        self.test_history.append(datetime(2021, 1, 4), 200, 264, 'update')
+        self.assertAlmostEqual(1.32, self.test_history.time_weighted_growth)
+
+    def test_compacted(self):
+        snapshots = [(datetime(2021, 1, 1), 100, 100, 'deposit'),
+                     (datetime(2021, 1, 5), 100, 110, 'update_portfolio_value'),
+                     (datetime(2021, 1, 31), 100, 120, 'update_portfolio_value'),
+                     (datetime(2021, 2, 3), 100, 115, 'update_portfolio_value'),
+                     (datetime(2021, 2, 4), 200, 215, 'deposit'),
+                     (datetime(2021, 2, 5), 200, 220, 'update_portfolio_value'),
+                     (datetime(2021, 2, 6), 200, 230, 'update_portfolio_value'),
+                     (datetime(2021, 2, 7), 200, 240, 'update_portfolio_value')]
+        for snapshot in snapshots:
+            self.test_history.append(*snapshot)
+
+        # Only the valuations at the start and end of each sub-period are kept
+        compacted = self.test_history.compacted()
+        self.assertListEqual([snapshots[i][0] for i in (0, 3, 4, 7)],
+                             [record['date'] for record in compacted.to_records()])
+        self.assertEqual(self.test_history.time_weighted_growth,
+                         compacted.time_weighted_growth)
+        self.assertEqual(8, len(self.test_history))
+
+        # Keeping month-end valuations too
+        compacted = self.test_history.compacted(MONTHLY)
+        self.assertListEqual([snapshots[i][0] for i in (0, 2, 3, 4, 7)],
+                             [record['date'] for record in compacted.to_records()])
+
+        # The compacted history can still be appended to
+        compacted.append(datetime(2021, 2, 8), 200, 250, 'update_portfolio_value')
+        self.assertAlmostEqual(1.15 * 250 / 215, compacted.time_weighted_growth)
+
+        with self.assertRaises(ValueError):
+            self.test_history.compacted('hourly')
+        self.assertEqual(0, len(PortfolioHistory().compacted()))
+
+    def test_extend_values(self):
+        with self.assertRaises(ValueError):
+            self.test_history.extend_values(np.array([0]), np.array([100.0]))
+
+        self.test_history.append(datetime(2021, 1, 1), 100, 100, 'deposit')
+        self.test_history.extend_values(
+            np.array([to_epoch(datetime(2021, 1, 2)), to_epoch(datetime(2021, 1, 3))]),
+            np.array([110.0, 120.0]))
+        self.assertListEqual([100, 100, 100], self.test_history.total_deposited.tolist())
+        self.assertEqual(['update_portfolio_value'] * 2,
+                         [record['transaction_type']
+                          for record in self.test_history.to_records()[1:]])
+        self.assertAlmostEqual(1.2, self.test_history.time_weighted_growth)
+
+        # Or one at a time
+        self.test_history.append_value(to_epoch(datetime(2021, 1, 4)), 90.0)
+        self.assertEqual(4, len(self.test_history))
+        self.assertDictEqual({'date': datetime(2021, 1, 4), 'total_deposited': 100,
+                              'current_portfolio_value': 90,
+                              'transaction_type': 'update_portfolio_value'},
+                             self.test_history.to_records()[-1])
+        self.assertAlmostEqual(0.9, self.test_history.time_weighted_growth)
+        with self.assertRaises(ValueError):
+            PortfolioHistory().append_value(0, 100.0)
+
+    def test_pickle(self):
+        for day in range(1, 4):
+            self.test_history.append(datetime(2021, 1, day), day, day, 'deposit')
+
+        unpickled = pickle.loads(pickle.dumps(self.test_history))
+        self.assertEqual(3, len(unpickled._dates))
+        self.assertListEqual(self.test_history.to_records(), unpickled.to_records())
+
+        # Appending after unpickling should grow the trimmed arrays again
+        unpickled.append(datetime(2021, 1, 4), 4, 4, 'deposit')
+        self.assertEqual(4, len(unpickled))
+
+    def test_unpickle_list_history(self):
+        # Portfolios pickled before the columnar store held a list of snapshots
+        snapshots = [{'date': datetime(2021, 1, 1),
+                      'total_deposited': 10,
+                      'current_portfolio_value': 10,
+                      'transaction_type': 'deposit'}]
+        state = {'name': 'test_portfolio',
+                 'total_deposited': 10,
+                 'current_portfolio_value': 10,
+                 'portfolio_history': list(snapshots),
+                 'latest_transaction_date': datetime(2021, 1, 1)}
+        old_portfolio = InvestmentPortfolio.__new__(InvestmentPortfolio)
+        old_portfolio.__setstate__(state)
+        self.assertListEqual(snapshots, old_portfolio.portfolio_history)
+        self.assertEqual(10, old_portfolio.total_deposited)
+        self.assertEqual(10, old_portfolio.current_portfolio_value)
+
+
+if __name__ == "__main__":
+    unittest.main()
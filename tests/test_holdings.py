@@ -0,0 +1,84 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.exceptions import BackDatingError, InsufficientData
+from portfolio_manager.holdings import Holdings
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import TimeWeightedReturnCalculator
+
+
+class HoldingsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.portfolios = []
+        for name in ('isa', 'pension', 'general'):
+            portfolio = InvestmentPortfolio(name=name)
+            portfolio.deposit(1000, date=datetime(2021, 1, 1))
+            self.portfolios.append(portfolio)
+        self.holdings = Holdings(self.portfolios, ['equities', 'bonds'],
+                                 [[10, 0], [5, 20], [0, 0]])
+
+    def test_positions(self):
+        self.assertEqual(20, self.holdings.position(self.portfolios[1], 'bonds'))
+        self.holdings.set_position(self.portfolios[2], 'equities', 2.5)
+        self.assertEqual(2.5, self.holdings.position(self.portfolios[2], 'equities'))
+
+        with self.assertRaises(KeyError):
+            self.holdings.position(InvestmentPortfolio(), 'bonds')
+        with self.assertRaises(KeyError):
+            self.holdings.position(self.portfolios[0], 'gold')
+        with self.assertRaises(ValueError):
+            Holdings(self.portfolios, ['equities'], np.zeros((3, 2)))
+
+    def test_revalue(self):
+        values = self.holdings.revalue(np.array([110, 50]), datetime(2021, 1, 2))
+        np.testing.assert_array_equal([1100, 1550, 0], values)
+        for portfolio, value in zip(self.portfolios, values):
+            self.assertEqual(value, portfolio.current_portfolio_value)
+            self.assertEqual(datetime(2021, 1, 2), portfolio.latest_transaction_date)
+            self.assertDictEqual({'date': datetime(2021, 1, 2),
+                                  'total_deposited': 1000,
+                                  'current_portfolio_value': value,
+                                  'transaction_type': 'update_portfolio_value'},
+                                 portfolio.portfolio_history[-1])
+
+        self.holdings.revalue(np.array([121, 50]), np.datetime64('2021-01-03'))
+        self.assertEqual(datetime(2021, 1, 3), self.portfolios[0].latest_transaction_date)
+        self.assertEqual(21, TimeWeightedReturnCalculator().calculate_return(
+            self.portfolios[0], annualised=False))
+
+    def test_revalue_price_matrix(self):
+        dates = np.array(['2021-01-02', '2021-01-03', '2021-01-04'],
+                         dtype='datetime64[D]')
+        prices = np.array([[100, 50], [110, 50], [121, 50]])
+        values = self.holdings.revalue(prices, dates)
+        np.testing.assert_array_equal([[1000, 1500, 0], [1100, 1550, 0],
+                                       [1210, 1605, 0]], values)
+
+        # Recorded as if by update_portfolio_value on each date
+        expected = InvestmentPortfolio()
+        expected.deposit(1000, date=datetime(2021, 1, 1))
+        for day, value in zip((2, 3, 4), (1000, 1100, 1210)):
+            expected.update_portfolio_value(value, datetime(2021, 1, day))
+        self.assertListEqual(expected.portfolio_history,
+                             self.portfolios[0].portfolio_history)
+        self.assertEqual(datetime(2021, 1, 4), self.portfolios[0].latest_transaction_date)
+        self.assertEqual(21, TimeWeightedReturnCalculator().calculate_return(
+            self.portfolios[0], annualised=False))
+
+    def test_revalue_errors(self):
+        # Nothing is recorded unless every portfolio can be updated
+        self.portfolios[2].update_portfolio_value(900, datetime(2021, 1, 5))
+        with self.assertRaises(BackDatingError):
+            self.holdings.revalue([100, 50], datetime(2021, 1, 3))
+        self.assertEqual(1, len(self.portfolios[0].history))
+
+        with self.assertRaises(ValueError):
+            self.holdings.revalue([100, 50, 10], datetime(2021, 1, 6))
+        with self.assertRaises(ValueError):
+            self.holdings.revalue([[100, 50], [100, 50]],
+                                  [datetime(2021, 1, 7), datetime(2021, 1, 6)])
+        with self.assertRaises(InsufficientData):
+            Holdings([InvestmentPortfolio()], ['equities']).revalue(
+                [100], datetime(2021, 1, 1))
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Modules which importing the portfolio and return calculators mustn't import, as
+# they're slow to import or only needed by some features
+LAZY_MODULES = ['pandas', 'pyarrow', 'sqlite3', 'portfolio_manager.journal',
+                'portfolio_manager.binary_history', 'portfolio_manager.storage',
+                'portfolio_manager.columnar_io']
+
+
+class ImportTests(unittest.TestCase):
+    def test_heavy_modules_imported_lazily(self):
+        script = ('import sys\n'
+                  'import portfolio_manager.return_calculators\n'
+                  f'print([name for name in {LAZY_MODULES!r} if name in sys.modules])')
+        output = subprocess.run([sys.executable, '-c', script], check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True,
+                                env=dict(os.environ,
+                                         PYTHONPATH=os.pathsep.join(sys.path))).stdout
+        self.assertEqual('[]', output.strip())
@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime
+
+from portfolio_manager import batch, instrumentation
+from portfolio_manager.exceptions import InsufficientFunds
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (MoneyWeightedReturnCalculator,
+                                                  ReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
+
+
+class InstrumentationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache_size = ReturnCalculator.cache_info().maxsize
+        ReturnCalculator.set_cache_size(0)
+        instrumentation.reset()
+        instrumentation.enable()
+        self.addCleanup(instrumentation.disable)
+
+        self.portfolio = InvestmentPortfolio()
+        self.portfolio.deposit(1000, date=datetime(2020, 1, 1))
+        self.portfolio.update_portfolio_value(1100, datetime(2020, 6, 1))
+        self.portfolio.deposit(500, date=datetime(2021, 1, 1))
+
+    def tearDown(self) -> None:
+        ReturnCalculator.set_cache_size(self.cache_size)
+
+    def test_disabled_by_default_and_restores_methods(self):
+        instrumentation.disable()
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertIs(InvestmentPortfolio.__dict__['deposit'],
+                      InvestmentPortfolio.deposit)
+        self.assertFalse(hasattr(InvestmentPortfolio.deposit, '__wrapped__'))
+
+        instrumentation.reset()
+        self.portfolio.deposit(100, date=datetime(2021, 2, 1))
+        self.assertEqual({}, instrumentation.get_stats())
+
+    def test_call_counts_and_history_sizes(self):
+        with self.assertRaises(InsufficientFunds):
+            self.portfolio.withdraw(10 ** 6, date=datetime(2021, 2, 1))
+
+        stats = instrumentation.get_stats()
+        deposits = stats['InvestmentPortfolio.deposit']
+        self.assertEqual(2, deposits['count'])
+        self.assertEqual(0, deposits['errors'])
+        self.assertEqual(3, deposits['max_history_size'])
+        self.assertEqual(1, stats['InvestmentPortfolio.update_portfolio_value']['count'])
+        self.assertEqual(1, stats['InvestmentPortfolio.withdraw']['errors'])
+        self.assertGreaterEqual(deposits['total_seconds'], 0)
+        self.assertLessEqual(deposits['p50_seconds'], deposits['p99_seconds'])
+
+    def test_return_calculators(self):
+        TimeWeightedReturnCalculator().calculate_return(self.portfolio)
+        MoneyWeightedReturnCalculator().calculate_return(self.portfolio)
+
+        stats = instrumentation.get_stats()
+        self.assertEqual(
+            1, stats['TimeWeightedReturnCalculator.calculate_return']['count'])
+        self.assertEqual(
+            3, stats['MoneyWeightedReturnCalculator.calculate_return'][
+                'max_history_size'])
+        self.assertEqual(1, stats['xirr']['count'])
+        self.assertIsNone(stats['xirr']['max_history_size'])
+
+    def test_batch_functions(self):
+        # Called through the module, as instrumentation replaces module attributes
+        batch.money_weighted_returns([self.portfolio, self.portfolio])
+
+        stats = instrumentation.get_stats()
+        self.assertEqual(1, stats['money_weighted_returns']['count'])
+        self.assertEqual(1, stats['xirr']['count'])
+
+    def test_hooks(self):
+        records = []
+        instrumentation.add_hook(records.append)
+        self.addCleanup(instrumentation.remove_hook, records.append)
+        self.portfolio.update_portfolio_value(1600, datetime(2021, 2, 1))
+
+        names = [record.name for record in records]
+        self.assertIn('InvestmentPortfolio.update_portfolio_value', names)
+        self.assertIn('InvestmentPortfolio._update_portfolio_history', names)
+        record = records[names.index('InvestmentPortfolio.update_portfolio_value')]
+        self.assertEqual(4, record.history_size)
+        self.assertIsNone(record.error)
+
+    def test_prometheus(self):
+        text = instrumentation.to_prometheus()
+        self.assertIn('# TYPE portfolio_manager_calls_total counter\n', text)
+        self.assertIn('portfolio_manager_calls_total'
+                      '{method="InvestmentPortfolio.deposit"} 2\n', text)
+        self.assertIn('portfolio_manager_call_seconds'
+                      '{method="InvestmentPortfolio.deposit",quantile="0.99"}', text)
+        self.assertIn('portfolio_manager_call_seconds_count'
+                      '{method="InvestmentPortfolio.deposit"} 2\n', text)
+        self.assertIn('portfolio_manager_history_size_max'
+                      '{method="InvestmentPortfolio.deposit"} 3\n', text)
+        self.assertTrue(text.endswith('\n'))
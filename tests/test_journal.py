@@ -0,0 +1,164 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.journal import PortfolioJournal
+from portfolio_manager.portfolio import InvestmentPortfolio, load_portfolio
+
+
+class PortfolioJournalTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.portfolio = InvestmentPortfolio(name='journaled')
+        self.portfolio.deposit(100, date=datetime(2021, 1, 1))
+
+    def assert_portfolios_equal(self, expected: InvestmentPortfolio,
+                                actual: InvestmentPortfolio):
+        self.assertEqual(expected.portfolio_history, actual.portfolio_history)
+        self.assertEqual(expected.total_deposited, actual.total_deposited)
+        self.assertEqual(expected.current_portfolio_value,
+                         actual.current_portfolio_value)
+        self.assertEqual(expected.latest_transaction_date,
+                         actual.latest_transaction_date)
+        self.assertEqual(expected.history.time_weighted_growth,
+                         actual.history.time_weighted_growth)
+
+    def test_save_and_load(self):
+        portfolio = self.portfolio
+        portfolio.save_portfolio(self.directory.name, journal=True)
+        for day in range(2, 10):
+            portfolio.update_portfolio_value(100 + day, date=datetime(2021, 1, day))
+            portfolio.save_portfolio(self.directory.name, journal=True)
+        portfolio.deposit(50, 120, date=datetime(2021, 1, 10))
+        portfolio.save_portfolio(self.directory.name, journal=True)
+
+        # Only the first save wrote a checkpoint; the rest were appended
+        journal = portfolio._journal
+        self.assertEqual(10, journal._journaled_snapshots)
+        portfolio.close_journal()
+
+        loaded = load_portfolio('journaled', self.directory.name)
+        self.assert_portfolios_equal(portfolio, loaded)
+
+        # Saving the loaded portfolio continues the same journal
+        loaded.withdraw(20, date=datetime(2021, 1, 11))
+        loaded.save_portfolio(self.directory.name, journal=True)
+        self.assertEqual(11, loaded._journal._journaled_snapshots)
+        loaded.close_journal()
+        self.assertIsNone(loaded._journal)
+        self.assert_portfolios_equal(loaded, load_portfolio('journaled',
+                                                            self.directory.name))
+
+    def test_torn_write(self):
+        with PortfolioJournal('journaled', self.directory.name) as journal:
+            journal.save(self.portfolio)
+            self.portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+            journal.save(self.portfolio)
+            expected = self.portfolio.portfolio_history
+            self.portfolio.update_portfolio_value(120, date=datetime(2021, 1, 3))
+            journal.save(self.portfolio)
+
+        # Cut the last frame short, as if the process crashed while writing it
+        with open(journal.journal_path, 'r+b') as handle:
+            handle.truncate(os.path.getsize(journal.journal_path) - 5)
+
+        with PortfolioJournal('journaled', self.directory.name) as journal:
+            loaded = journal.load()
+            self.assertEqual(expected, loaded.portfolio_history)
+            self.assertEqual(110, loaded.current_portfolio_value)
+
+            # The incomplete frame is discarded, and later saves appended after it
+            loaded.update_portfolio_value(130, date=datetime(2021, 1, 3))
+            journal.save(loaded)
+        with PortfolioJournal('journaled', self.directory.name) as journal:
+            self.assertEqual(130, journal.load().current_portfolio_value)
+
+    def test_checkpoint(self):
+        with PortfolioJournal('journaled', self.directory.name,
+                              checkpoint_every=5) as journal:
+            for day in range(2, 9):
+                self.portfolio.update_portfolio_value(100 + day,
+                                                      date=datetime(2021, 1, day))
+                journal.save(self.portfolio)
+
+            # The first save wrote a checkpoint, the next five were compacted into a
+            # second checkpoint, then one more was appended
+            self.assertEqual(1, journal._journaled_snapshots)
+            self.assertEqual(2, journal._generation)
+
+            # Replacing the history can't be journaled, so writes a new checkpoint
+            self.portfolio.portfolio_history = self.portfolio.portfolio_history[:3]
+            journal.save(self.portfolio)
+            self.assertEqual(3, journal._generation)
+
+        with PortfolioJournal('journaled', self.directory.name) as journal:
+            loaded = journal.load()
+        self.assertEqual(3, len(loaded.history))
+        np.testing.assert_array_equal(self.portfolio.history.current_portfolio_value,
+                                      loaded.history.current_portfolio_value)
+
+    def test_stale_journal(self):
+        # A journal left behind by a crash between writing a checkpoint and starting
+        # its new journal belongs to the previous checkpoint, so is ignored
+        with PortfolioJournal('journaled', self.directory.name) as journal:
+            journal.save(self.portfolio)
+            self.portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+            journal.save(self.portfolio)
+            with open(journal.journal_path, 'rb') as handle:
+                stale_journal = handle.read()
+            journal.checkpoint(self.portfolio)
+        with open(journal.journal_path, 'wb') as handle:
+            handle.write(stale_journal)
+
+        with PortfolioJournal('journaled', self.directory.name) as journal:
+            self.assert_portfolios_equal(self.portfolio, journal.load())
+
+    def test_change_directory(self):
+        # The journal in the old directory is synced and closed, not leaked
+        self.portfolio.save_portfolio(self.directory.name, journal=True)
+        old_journal = self.portfolio._journal
+        with tempfile.TemporaryDirectory() as directory:
+            self.portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+            self.portfolio.save_portfolio(directory, journal=True)
+            self.assertIsNone(old_journal._file)
+            self.assertEqual(directory, self.portfolio._journal.directory)
+            self.portfolio.close_journal()
+            loaded = load_portfolio('journaled', directory)
+            loaded.close_journal()
+            self.assert_portfolios_equal(self.portfolio, loaded)
+
+    def test_mixed_formats(self):
+        # Whichever format was saved last is loaded
+        directory = self.directory.name
+        self.portfolio.save_portfolio(directory, journal=True)
+        self.portfolio.update_portfolio_value(150, date=datetime(2021, 1, 2))
+        self.portfolio.save_portfolio(directory)
+        self.assertFalse(os.path.exists(os.path.join(directory, 'journaled.checkpoint')))
+        self.assertIsNone(self.portfolio._journal)
+        self.assertEqual(150, load_portfolio('journaled', directory)
+                         .current_portfolio_value)
+
+        # And journaling again supersedes the pickle
+        self.portfolio.update_portfolio_value(160, date=datetime(2021, 1, 3))
+        self.portfolio.save_portfolio(directory, journal=True)
+        self.portfolio.close_journal()
+        self.assertFalse(os.path.exists(os.path.join(directory, 'journaled.pkl')))
+        loaded = load_portfolio('journaled', directory)
+        loaded.close_journal()
+        self.assert_portfolios_equal(self.portfolio, loaded)
+
+    def test_pickle_without_journal(self):
+        self.portfolio.save_portfolio(self.directory.name, journal=True)
+        self.portfolio.save_portfolio(self.directory.name)
+
+        loaded = load_portfolio('journaled.pkl', self.directory.name)
+        self.assertIsNone(loaded._journal)
+        self.assert_portfolios_equal(self.portfolio, loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from portfolio_manager import parallel
+from portfolio_manager.batch import (PackedHistories, money_weighted_returns,
+                                     simple_returns, time_weighted_returns)
+from portfolio_manager.parallel import ParallelReturnEngine
+from portfolio_manager.portfolio import InvestmentPortfolio
+from tests.helpers import make_portfolio
+
+
+class ParallelReturnEngineTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.portfolios = [make_portfolio(seed) for seed in range(25)]
+        self.portfolios.insert(4, InvestmentPortfolio())
+
+    def test_calculate(self):
+        packed = PackedHistories.from_portfolios(self.portfolios)
+        with ParallelReturnEngine(workers=2, chunk_size=4) as engine:
+            for batch_function in (simple_returns, time_weighted_returns,
+                                   money_weighted_returns):
+                for annualised in (False, True):
+                    np.testing.assert_array_equal(
+                        batch_function(packed, annualised=annualised),
+                        engine.calculate(batch_function, packed, annualised))
+
+            # Portfolios can be passed directly, and the same workers reused
+            np.testing.assert_array_equal(
+                time_weighted_returns(self.portfolios),
+                engine.calculate(time_weighted_returns, self.portfolios))
+            self.assertEqual(0, len(engine.calculate(simple_returns, [])))
+
+    def test_calculate_without_shared_memory(self):
+        # As on Python 3.7, where each chunk is pickled to its worker instead
+        with mock.patch.object(parallel, 'shared_memory', None), \
+                ParallelReturnEngine(workers=2, chunk_size=4) as engine:
+            for batch_function in (simple_returns, money_weighted_returns):
+                np.testing.assert_array_equal(
+                    batch_function(self.portfolios, annualised=True),
+                    engine.calculate(batch_function, self.portfolios, True))
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            ParallelReturnEngine(chunk_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
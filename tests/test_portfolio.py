@@ -1,10 +1,18 @@
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from unittest import mock
 
+import numpy as np
+import pandas as pd
+
 from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import (ModifiedDietzReturnCalculator,
+                                                  MoneyWeightedReturnCalculator,
+                                                  SimpleReturnCalculator,
+                                                  TimeWeightedReturnCalculator)
 from portfolio_manager.exceptions import (BackDatingError, InsufficientData,
                                           InsufficientFunds)
+from tests.helpers import make_portfolio
 
 
 class InvestmentPortfolioTests(unittest.TestCase):
@@ -141,6 +149,174 @@ class InvestmentPortfolioTests(unittest.TestCase):
         self.assertListEqual(expected_transaction_history,
                              self.test_portfolio.portfolio_history)
 
+    def test_apply_transactions(self):
+        # Applying transactions in bulk should match making them one at a time
+        self.test_portfolio.apply_transactions(
+            dates=[datetime(2021, 1, day) for day in range(1, 7)],
+            transaction_types=['deposit', 'deposit', 'update_portfolio_value',
+                               'withdrawal', 'withdrawal', 'deposit'],
+            amounts=[50, 20, np.nan, 10, 5, 15],
+            values=[np.nan, 55, 80, np.nan, 60, 0])
+
+        expected_portfolio = InvestmentPortfolio(name='expected_portfolio')
+        expected_portfolio.deposit(50, date=datetime(2021, 1, 1))
+        expected_portfolio.deposit(20, 55, date=datetime(2021, 1, 2))
+        expected_portfolio.update_portfolio_value(80, date=datetime(2021, 1, 3))
+        expected_portfolio.withdraw(10, date=datetime(2021, 1, 4))
+        expected_portfolio.withdraw(5, 60, date=datetime(2021, 1, 5))
+        expected_portfolio.deposit(15, date=datetime(2021, 1, 6))
+
+        self.assertListEqual(expected_portfolio.portfolio_history,
+                             self.test_portfolio.portfolio_history)
+        self.assertEqual(70, self.test_portfolio.total_deposited)
+        self.assertEqual(70, self.test_portfolio.current_portfolio_value)
+        self.assertEqual(datetime(2021, 1, 6),
+                         self.test_portfolio.latest_transaction_date)
+
+        # Further transactions can be made as normal
+        self.test_portfolio.deposit(5, date=datetime(2021, 1, 7))
+        self.assertEqual(75, self.test_portfolio.total_deposited)
+
+    def test_apply_transactions_errors(self):
+        # The first transaction can't be a value update
+        with self.assertRaises(InsufficientData):
+            self.test_portfolio.apply_transactions(
+                [datetime(2021, 1, 1)], ['update_portfolio_value'], values=[10])
+
+        # Withdrawals can't exceed the portfolio value at the time
+        with self.assertRaises(InsufficientFunds):
+            self.test_portfolio.apply_transactions(
+                [datetime(2021, 1, 1), datetime(2021, 1, 2), datetime(2021, 1, 3)],
+                ['deposit', 'update_portfolio_value', 'withdrawal'],
+                amounts=[10, np.nan, 9], values=[np.nan, 8, np.nan])
+
+        # Transactions must be strictly increasing in date
+        with self.assertRaises(BackDatingError):
+            self.test_portfolio.apply_transactions(
+                [datetime(2021, 1, 2), datetime(2021, 1, 1)], ['deposit', 'deposit'],
+                amounts=[10, 10])
+
+        # The earliest invalid transaction determines the error
+        with self.assertRaises(InsufficientFunds):
+            self.test_portfolio.apply_transactions(
+                [datetime(2021, 1, 2), datetime(2021, 1, 3), datetime(2021, 1, 1)],
+                ['deposit', 'withdrawal', 'deposit'], amounts=[10, 11, 10])
+
+        # Unknown transaction types aren't allowed
+        with self.assertRaises(ValueError):
+            self.test_portfolio.apply_transactions([datetime(2021, 1, 1)], ['gift'],
+                                                   amounts=[10])
+
+        # None of the invalid transactions should have been applied
+        self.assertListEqual([], self.test_portfolio.portfolio_history)
+        self.assertEqual(0, self.test_portfolio.total_deposited)
+
+        # Transactions can't be back-dated before existing ones either
+        self.test_portfolio.deposit(10, date=datetime(2021, 1, 5))
+        with self.assertRaises(BackDatingError):
+            self.test_portfolio.apply_transactions([datetime(2021, 1, 5)],
+                                                   ['deposit'], amounts=[10])
+
+    def test_apply_transactions_timezone_aware(self):
+        # The latest date is read back from the history as naive UTC, which later
+        # timezone-aware transactions must still be checked against
+        tz = timezone(timedelta(hours=5))
+        self.test_portfolio.apply_transactions(
+            [datetime(2021, 1, 1, tzinfo=tz), datetime(2021, 1, 2, tzinfo=tz)],
+            ['deposit', 'update_portfolio_value'], amounts=[100, np.nan],
+            values=[np.nan, 110])
+        self.test_portfolio.deposit(10, date=datetime(2021, 1, 3, tzinfo=tz))
+        self.assertEqual(110, self.test_portfolio.total_deposited)
+
+        # Naive dates are taken as UTC, so 2021-01-02 18:00 is before 2021-01-03 in UTC+5
+        with self.assertRaises(BackDatingError):
+            self.test_portfolio.withdraw(10, date=datetime(2021, 1, 2, 18))
+
+    def test_from_records(self):
+        records = pd.DataFrame({
+            'date': pd.date_range('2021-01-01', periods=3, freq='D'),
+            'transaction_type': ['deposit', 'update_portfolio_value', 'withdrawal'],
+            'amount': [100, np.nan, 30],
+            'value': [np.nan, 120, np.nan]
+        })
+        portfolio = InvestmentPortfolio.from_records(records, name='from_records')
+
+        self.assertEqual('from_records', portfolio.name)
+        self.assertEqual(70, portfolio.total_deposited)
+        self.assertEqual(90, portfolio.current_portfolio_value)
+        self.assertEqual([datetime(2021, 1, 1), datetime(2021, 1, 2),
+                          datetime(2021, 1, 3)],
+                         [snapshot['date'] for snapshot in portfolio.portfolio_history])
+
+    def test_compact_history(self):
+        def lifetime_returns(portfolio, calculators):
+            for calculator in calculators:
+                for annualised in (True, False):
+                    try:
+                        yield calculator.calculate_return(portfolio, annualised)
+                    except ValueError as error:
+                        # e.g. annualising a Modified Dietz loss of more than 100%
+                        yield str(error)
+
+        for seed in range(20):
+            for checkpoints in (None, 'daily', 'monthly', 'yearly'):
+                # The returns over the whole history are unchanged, including linked
+                # returns over the periods kept as checkpoints
+                calculators = [SimpleReturnCalculator(), TimeWeightedReturnCalculator(),
+                               MoneyWeightedReturnCalculator(),
+                               ModifiedDietzReturnCalculator()]
+                if checkpoints is not None:
+                    calculators.append(ModifiedDietzReturnCalculator(checkpoints))
+                portfolio = make_portfolio(seed)
+                expected = list(lifetime_returns(portfolio, calculators))
+                n_snapshots = len(portfolio.history)
+                version = portfolio.history_version
+
+                removed = portfolio.compact_history(checkpoints)
+                self.assertEqual(n_snapshots - removed, len(portfolio.history))
+                self.assertNotEqual(version, portfolio.history_version)
+                np.testing.assert_equal(expected,
+                                        list(lifetime_returns(portfolio, calculators)))
+
+    def test_point_in_time_queries(self):
+        self.test_portfolio.deposit(100, date=datetime(2021, 1, 1))
+        self.test_portfolio.update_portfolio_value(120, datetime(2021, 1, 5))
+        self.test_portfolio.deposit(50, date=datetime(2021, 1, 10))
+        self.test_portfolio.update_portfolio_value(150, datetime(2021, 1, 10, 12))
+
+        self.assertTrue(np.isnan(self.test_portfolio.value_at(datetime(2020, 12, 31))))
+        self.assertEqual(100, self.test_portfolio.value_at(datetime(2021, 1, 1)))
+        self.assertEqual(120, self.test_portfolio.value_at(datetime(2021, 1, 9)))
+        self.assertEqual(170, self.test_portfolio.value_at(datetime(2021, 1, 10)))
+        self.assertEqual(150, self.test_portfolio.value_at(datetime(2022, 1, 1)))
+        self.assertEqual(100, self.test_portfolio.deposited_at(datetime(2021, 1, 9)))
+        self.assertEqual(150, self.test_portfolio.deposited_at(datetime(2021, 1, 10)))
+
+        np.testing.assert_array_equal(
+            [np.nan, 120, 150],
+            self.test_portfolio.value_at([datetime(2020, 1, 1), datetime(2021, 1, 5),
+                                          datetime(2021, 2, 1)]))
+        np.testing.assert_array_equal(
+            [100, 150], self.test_portfolio.deposited_at(
+                np.array(['2021-01-09', '2021-01-11'], dtype='datetime64[D]')))
+
+        history = self.test_portfolio.history_between(datetime(2021, 1, 2),
+                                                      datetime(2021, 1, 10))
+        self.assertListEqual([datetime(2021, 1, 5), datetime(2021, 1, 10)],
+                             [record['date'] for record in history.to_records()])
+        self.assertTrue(np.shares_memory(history.dates,
+                                         self.test_portfolio.history.dates))
+        self.assertEqual(4, len(self.test_portfolio.history_between()))
+        self.assertEqual(0, len(self.test_portfolio.history_between(
+            datetime(2021, 1, 6), datetime(2021, 1, 7))))
+        self.assertEqual(0, len(self.test_portfolio.history_between(
+            datetime(2021, 1, 7), datetime(2021, 1, 6))))
+
+        # Recording snapshots in the returned history leaves the portfolio's unchanged
+        history.append(datetime(2021, 1, 11), 150, 160, 'update_portfolio_value')
+        self.assertEqual(3, len(history))
+        self.assertEqual(4, len(self.test_portfolio.history))
+
     def test_update_portfolio_history(self):
         # This method has been indirectly tested above multiple times so we only add a
         # simple test here
@@ -152,6 +328,19 @@ class InvestmentPortfolioTests(unittest.TestCase):
         self.assertListEqual(expected_transaction_history,
                              self.test_portfolio.portfolio_history)
 
+    def test_update_portfolio_history_out_of_order(self):
+        # Snapshots recorded out of order should still be stored by ascending date, with
+        # snapshots sharing a date kept in the order they were recorded
+        for day, transaction_type in [(1, 'first'), (3, 'third'), (2, 'second'),
+                                      (3, 'fourth'), (0, 'zeroth')]:
+            self.test_portfolio._update_portfolio_history(datetime(2021, 1, 1 + day),
+                                                          transaction_type)
+        actual = [snapshot['transaction_type']
+                  for snapshot in self.test_portfolio.portfolio_history]
+        self.assertListEqual(['zeroth', 'first', 'second', 'third', 'fourth'], actual)
+        self.assertEqual(datetime(2021, 1, 4),
+                         self.test_portfolio.latest_transaction_date)
+
     def test_backdate_error_check(self):
         # Test that an empty portfolio doesn't raise an error
         actual = self.test_portfolio._backdate_error_check(datetime(2020, 1, 1))
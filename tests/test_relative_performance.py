@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.relative_performance import (BenchmarkSeries,
+                                                    batch_relative_performance,
+                                                    calculate_relative_performance)
+from portfolio_manager.return_calculators import TimeWeightedReturnCalculator
+from portfolio_manager.risk_metrics import calculate_risk_metrics
+from tests.helpers import make_portfolio
+
+
+class RelativePerformanceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.portfolio = InvestmentPortfolio(name='test_portfolio')
+        self.portfolio.deposit(100, date=datetime(2021, 1, 1))
+        self.portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+        self.portfolio.update_portfolio_value(99, date=datetime(2021, 1, 3))
+        self.portfolio.deposit(100, date=datetime(2021, 1, 4))
+        self.portfolio.update_portfolio_value(209, date=datetime(2021, 1, 5))
+        self.benchmark = BenchmarkSeries(
+            [datetime(2021, 1, day) for day in (5, 1, 2, 3, 4)],
+            [1155, 1000, 1050, 1000, 1100], name='index')
+
+    def test_prices_at(self):
+        np.testing.assert_array_equal(
+            [np.nan, 1000, 1000, 1155],
+            self.benchmark.prices_at([datetime(2020, 12, 31), datetime(2021, 1, 1),
+                                      datetime(2021, 1, 1, 12), datetime(2021, 2, 1)]))
+        np.testing.assert_array_equal(
+            [1000, 1050, 1000, 1100, 1155],
+            self.benchmark.prices_at(self.portfolio.history.dates))
+        with self.assertRaises(ValueError):
+            BenchmarkSeries([datetime(2021, 1, 1)], [1, 2])
+
+    def test_calculate_relative_performance(self):
+        # The benchmark is left out over the deposit, as the portfolio is
+        returns = np.array([0.1, -0.1, 209 / 199 - 1])
+        benchmark_returns = np.array([0.05, 1000 / 1050 - 1, 0.05])
+        active_returns = returns - benchmark_returns
+        performance = calculate_relative_performance(self.portfolio, self.benchmark)
+        self.assertEqual(round((np.prod(1 + returns) - np.prod(1 + benchmark_returns))
+                               * 100, 2), performance.excess_return)
+        self.assertEqual(round(np.std(active_returns, ddof=1) * 100, 2),
+                         performance.tracking_error)
+        self.assertAlmostEqual(active_returns.mean() / np.std(active_returns, ddof=1),
+                               performance.information_ratio)
+
+        annualised = calculate_relative_performance(self.portfolio, self.benchmark,
+                                                    periods_per_year=4)
+        self.assertEqual(performance.excess_return, annualised.excess_return)
+        self.assertAlmostEqual(performance.information_ratio * 2,
+                               annualised.information_ratio)
+
+        # Before the benchmark starts, there's nothing to compare against
+        late_benchmark = BenchmarkSeries([datetime(2021, 1, 3)], [1000])
+        performance = calculate_relative_performance(self.portfolio, late_benchmark)
+        self.assertTrue(np.isnan(performance.excess_return))
+
+    def test_batch_relative_performance(self):
+        portfolios = [make_portfolio(seed) for seed in range(20)]
+        portfolios.insert(3, InvestmentPortfolio())
+        portfolios.insert(7, self.portfolio)
+
+        # Against a flat benchmark, the excess return is the time-weighted return and
+        # the tracking error is the volatility
+        flat = BenchmarkSeries([datetime(2000, 1, 1)], [100])
+        performance = batch_relative_performance(portfolios, flat)
+        self.assertTrue(np.isnan(performance.excess_return[3]))
+        for i, portfolio in enumerate(portfolios):
+            if i == 3:
+                continue
+            self.assertAlmostEqual(
+                TimeWeightedReturnCalculator().calculate_return(portfolio, False),
+                performance.excess_return[i], delta=0.011)
+            np.testing.assert_equal(calculate_risk_metrics(portfolio).volatility,
+                                    performance.tracking_error[i])
+
+        rng = np.random.default_rng(0)
+        benchmark = BenchmarkSeries(
+            np.datetime64('2020-01-01') + np.arange(1000),
+            np.cumprod(rng.uniform(0.98, 1.02, 1000)))
+        performance = batch_relative_performance(portfolios, benchmark, 12)
+        for i, portfolio in enumerate(portfolios):
+            np.testing.assert_allclose(
+                calculate_relative_performance(portfolio, benchmark, 12),
+                [metric[i] for metric in performance], rtol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
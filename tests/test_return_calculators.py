@@ -1,14 +1,17 @@
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock
 
-from numpy_financial import irr
+import numpy as np
+
 from portfolio_manager.exceptions import InsufficientData
 from portfolio_manager.portfolio import InvestmentPortfolio
 from portfolio_manager.return_calculators import (TimeWeightedReturnCalculator,
                                                   ReturnCalculator,
                                                   SimpleReturnCalculator,
-                                                  MoneyWeightedReturnCalculator)
+                                                  MoneyWeightedReturnCalculator,
+                                                  ModifiedDietzReturnCalculator)
+from tests.helpers import make_portfolio
 
 
 class ReturnCalculatorsTests(unittest.TestCase):
@@ -20,7 +23,7 @@ class ReturnCalculatorsTests(unittest.TestCase):
         mock_rc = MagicMock()
         mock_rc._get_portfolio_age.return_value = 0.9
         actual = ReturnCalculator.calculate_annualised_return(mock_rc, 'test', 13)
-        mock_rc._get_portfolio_age.assert_called_once_with('test')
+        mock_rc._get_portfolio_age.assert_called_once_with('test', None)
         expected = 14.54
         self.assertEqual(expected, actual)
 
@@ -28,7 +31,7 @@ class ReturnCalculatorsTests(unittest.TestCase):
         mock_rc = MagicMock()
         mock_rc._get_portfolio_age.return_value = 1
         actual = ReturnCalculator.calculate_annualised_return(mock_rc, 'test', -11)
-        mock_rc._get_portfolio_age.assert_called_once_with('test')
+        mock_rc._get_portfolio_age.assert_called_once_with('test', None)
         expected = -11
         self.assertEqual(expected, actual)
 
@@ -36,7 +39,7 @@ class ReturnCalculatorsTests(unittest.TestCase):
         mock_rc = MagicMock()
         mock_rc._get_portfolio_age.return_value = 2.5
         actual = ReturnCalculator.calculate_annualised_return(mock_rc, 'test', 120)
-        mock_rc._get_portfolio_age.assert_called_once_with('test')
+        mock_rc._get_portfolio_age.assert_called_once_with('test', None)
         expected = 37.08
         self.assertEqual(expected, actual)
 
@@ -91,6 +94,136 @@ class ReturnCalculatorsTests(unittest.TestCase):
         actual = ReturnCalculator._get_portfolio_age(self.test_portfolio)
         self.assertEqual(2.17, round(actual, 2))
 
+    def test_result_cache(self):
+        ReturnCalculator.cache_clear()
+        self.test_portfolio.deposit(100, date=datetime(2021, 1, 1))
+        self.test_portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+        calculator = SimpleReturnCalculator()
+
+        # Repeated calls on an unchanged portfolio hit the cache
+        self.assertEqual(10, calculator.calculate_return(self.test_portfolio, False))
+        self.assertEqual(10, calculator.calculate_return(self.test_portfolio, False))
+        self.assertEqual((1, 1), ReturnCalculator.cache_info()[:2])
+
+        # Different arguments and calculators are cached separately
+        calculator.calculate_return(self.test_portfolio, True)
+        TimeWeightedReturnCalculator().calculate_return(self.test_portfolio, False)
+        self.assertEqual((1, 3), ReturnCalculator.cache_info()[:2])
+
+        # Any change to the portfolio invalidates its cached results
+        self.test_portfolio.update_portfolio_value(120, date=datetime(2021, 1, 3))
+        self.assertEqual(20, calculator.calculate_return(self.test_portfolio, False))
+        self.test_portfolio.total_deposited = 60
+        self.assertEqual(100, calculator.calculate_return(self.test_portfolio, False))
+        self.assertEqual((1, 5, 1024, 5), ReturnCalculator.cache_info())
+
+        ReturnCalculator.cache_clear()
+        self.assertEqual((0, 0, 1024, 0), ReturnCalculator.cache_info())
+
+        # Including snapshots recorded through the history directly
+        calculator = TimeWeightedReturnCalculator()
+        self.assertEqual(20, calculator.calculate_return(self.test_portfolio, False))
+        self.test_portfolio.history.append(datetime(2021, 1, 4), 100, 150,
+                                           'update_portfolio_value')
+        self.assertEqual(50, calculator.calculate_return(self.test_portfolio, False))
+        self.test_portfolio.history.append_value(
+            self.test_portfolio.history.dates[-1] + 1, 200)
+        self.assertEqual(100, calculator.calculate_return(self.test_portfolio, False))
+
+        # Cached arrays are shared between callers, so can't be changed
+        as_of = (datetime(2021, 1, 2), datetime(2021, 1, 3))
+        returns = calculator.calculate_return(self.test_portfolio, False, as_of)
+        self.assertIs(returns, calculator.calculate_return(self.test_portfolio, False,
+                                                           as_of))
+        with self.assertRaises(ValueError):
+            returns[0] = 0
+
+    def test_result_cache_bounded(self):
+        ReturnCalculator.cache_clear()
+        ReturnCalculator.set_cache_size(2)
+        self.addCleanup(ReturnCalculator.set_cache_size, 1024)
+        self.test_portfolio.deposit(100, date=datetime(2021, 1, 1))
+        self.test_portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+        calculator = SimpleReturnCalculator()
+
+        # The least recently used result is evicted
+        calculator.calculate_return(self.test_portfolio, False)
+        calculator.calculate_return(self.test_portfolio, True)
+        calculator.calculate_return(self.test_portfolio, False)
+        TimeWeightedReturnCalculator().calculate_return(self.test_portfolio, False)
+        self.assertEqual((1, 3, 2, 2), ReturnCalculator.cache_info())
+        calculator.calculate_return(self.test_portfolio, False)
+        self.assertEqual(2, ReturnCalculator.cache_info().hits)
+        calculator.calculate_return(self.test_portfolio, True)
+        self.assertEqual(4, ReturnCalculator.cache_info().misses)
+
+        # A size of 0 disables the cache
+        ReturnCalculator.set_cache_size(0)
+        calculator.calculate_return(self.test_portfolio, True)
+        self.assertEqual((2, 4), ReturnCalculator.cache_info()[:2])
+
+    def test_as_of(self):
+        calculators = [SimpleReturnCalculator(), TimeWeightedReturnCalculator(),
+                       MoneyWeightedReturnCalculator(), ModifiedDietzReturnCalculator(),
+                       ModifiedDietzReturnCalculator('monthly')]
+        for seed in range(10):
+            portfolio = make_portfolio(seed)
+            snapshots = portfolio.portfolio_history
+            first, last = snapshots[0]['date'], snapshots[-1]['date']
+            as_of = [first - timedelta(days=1), first, first + timedelta(days=40),
+                     first + (last - first) / 2, last, last + timedelta(days=1)]
+            for calculator in calculators:
+                for annualised in (True, False):
+                    actual = calculator.calculate_return(portfolio, annualised, as_of)
+                    for date, returns in zip(as_of, actual):
+                        # The same as calculating the return of the portfolio as it was
+                        snapshots_then = [snapshot for snapshot in snapshots
+                                          if snapshot['date'] <= date]
+                        portfolio_then = InvestmentPortfolio(
+                            portfolio_history=snapshots_then,
+                            total_deposited=snapshots_then[-1]['total_deposited']
+                            if snapshots_then else 0,
+                            current_portfolio_value=snapshots_then[-1][
+                                'current_portfolio_value'] if snapshots_then else 0)
+                        try:
+                            expected = calculator.calculate_return(portfolio_then,
+                                                                   annualised)
+                        except (InsufficientData, ValueError):
+                            self.assertTrue(np.isnan(returns))
+                            continue
+                        if np.isnan(expected):
+                            self.assertTrue(np.isnan(returns))
+                            continue
+                        self.assertAlmostEqual(expected, returns, delta=0.011)
+                        self.assertEqual(returns, calculator.calculate_return(
+                            portfolio, annualised, date))
+
+                # As of the latest snapshot, the return is the current return
+                try:
+                    current = calculator.calculate_return(portfolio)
+                except ValueError:
+                    with self.assertRaises(ValueError):
+                        calculator.calculate_return(portfolio, as_of=last)
+                    continue
+                np.testing.assert_equal(current, calculator.calculate_return(
+                    portfolio, as_of=last))
+
+        with self.assertRaises(InsufficientData):
+            TimeWeightedReturnCalculator().calculate_return(portfolio, as_of=first)
+
+        # The age is up to the latest snapshot on or before the as-of date
+        penultimate = snapshots[-2]['date']
+        self.assertEqual((penultimate - first).days / 365.25,
+                         ReturnCalculator._get_portfolio_age(
+                             portfolio, penultimate + timedelta(hours=1)))
+
+        # Before the first snapshot there's no age, rather than the full lifetime
+        before = first - timedelta(days=1)
+        with self.assertRaises(InsufficientData):
+            ReturnCalculator._get_portfolio_age(portfolio, before)
+        np.testing.assert_equal([np.nan, 0], ReturnCalculator._get_portfolio_age(
+            portfolio, [before, first]))
+
 
 class SimpleReturnCalculatorTests(unittest.TestCase):
     def setUp(self) -> None:
@@ -171,7 +304,7 @@ class SimpleReturnCalculatorTests(unittest.TestCase):
 
     def test_calculate_return_positive_return(self):
         # Ensure the portfolio has non-empty history to prevent an error
-        test_data = ["I'm", "not", "empty"]
+        test_data = [{'date': datetime(2021, 1, day)} for day in range(1, 4)]
         self.test_portfolio.portfolio_history = test_data
 
         # Test 10% return
@@ -190,7 +323,7 @@ class SimpleReturnCalculatorTests(unittest.TestCase):
 
     def test_calculate_return_negative_return(self):
         # Ensure the portfolio has non-empty history to prevent an error
-        test_data = ["I'm", "not", "empty"]
+        test_data = [{'date': datetime(2021, 1, day)} for day in range(1, 4)]
         self.test_portfolio.portfolio_history = test_data
 
         # Test -10% return
@@ -396,6 +529,18 @@ class MoneyWeightedReturnCalculatorTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.mwr_calculator.calculate_return(self.test_portfolio, annualised=False)
 
+        # As does a history with no lifetime to measure time against
+        self.test_portfolio.portfolio_history = [
+            {'date': datetime(2021, 1, 1), 'total_deposited': 100,
+             'current_portfolio_value': 100, 'transaction_type': 'deposit'},
+            {'date': datetime(2021, 1, 1), 'total_deposited': 100,
+             'current_portfolio_value': 110, 'transaction_type': 'update_portfolio_value'},
+        ]
+        with self.assertRaises(ValueError):
+            self.mwr_calculator.calculate_return(self.test_portfolio, annualised=False)
+        self.assertTrue(np.isnan(self.mwr_calculator.calculate_return(
+            self.test_portfolio, False, [datetime(2021, 1, 1)])[0]))
+
     def test_calculate_return_single_period(self):
         # Test that a single sub-period reduces to the simple rate of return
         test_data = [
@@ -456,8 +601,9 @@ class MoneyWeightedReturnCalculatorTests(unittest.TestCase):
         self.test_portfolio.portfolio_history = test_data
         actual_output = self.mwr_calculator.calculate_return(self.test_portfolio,
                                                              annualised=False)
-        # Example from: https://www.investopedia.com/terms/m/money-weighted-return.asp
-        expected_output = 11.73
+        # Cash flows of -50 on 2019-01-01, +2 on 2020-01-01 and +67 on 2021-01-04,
+        # weighted by their dates. This is 17.69% annualised
+        expected_output = 38.72
         self.assertEqual(actual_output, expected_output)
 
     def test_calculate_return_multi_deposits(self):
@@ -504,7 +650,9 @@ class MoneyWeightedReturnCalculatorTests(unittest.TestCase):
         self.test_portfolio.portfolio_history = test_data
         actual_output = self.mwr_calculator.calculate_return(self.test_portfolio,
                                                              annualised=False)
-        expected_output = round(irr([-100, -100, -100, 500]) * 100, 2)
+        # Cash flows of -100 on 2020-01-01, 2020-01-03 and 2021-01-05, and +500 on
+        # 2021-01-05, weighted by their dates
+        expected_output = 100.38
         self.assertEqual(actual_output, expected_output)
 
     def test_calculate_return_negative_return(self):
@@ -545,9 +693,103 @@ class MoneyWeightedReturnCalculatorTests(unittest.TestCase):
         self.test_portfolio.portfolio_history = test_data
         actual_output = self.mwr_calculator.calculate_return(self.test_portfolio,
                                                              annualised=False)
-        expected_output = round(irr([-50, -50, -50, 80]) * 100, 2)
+        # Cash flows of -50 on 2020-01-01, 2020-06-01 and 2021-01-04, and +80 on
+        # 2021-01-04, weighted by their dates
+        expected_output = -79.44
         self.assertEqual(actual_output, expected_output)
 
 
+class ModifiedDietzReturnCalculatorTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_portfolio = InvestmentPortfolio(name="test_portfolio")
+        self.md_calculator = ModifiedDietzReturnCalculator()
+        self.test_portfolio.portfolio_history = [
+            {'date': datetime(2021, 1, day), 'total_deposited': total_deposited,
+             'current_portfolio_value': value, 'transaction_type': transaction_type}
+            for day, total_deposited, value, transaction_type in [
+                (1, 100, 100, 'deposit'),
+                (2, 100, 110, 'update_portfolio_value'),
+                (3, 200, 210, 'deposit'),
+                (4, 200, 215, 'update_portfolio_value'),
+                (5, 250, 265, 'deposit'),
+                (6, 250, 280, 'update_portfolio_value'),
+            ]
+        ]
+
+    def test_calculate_return_no_data(self):
+        with self.assertRaises(InsufficientData):
+            self.md_calculator.calculate_return(InvestmentPortfolio(), annualised=False)
+        with self.assertRaises(ValueError):
+            ModifiedDietzReturnCalculator('weekly')
+
+    def test_calculate_return_multi_deposits(self):
+        # Deposits of 100 and 50, weighted by the 3/5 and 1/5 of the period after them
+        actual_output = self.md_calculator.calculate_return(self.test_portfolio,
+                                                            annualised=False)
+        expected_output = round((280 - 100 - 150) / (100 + 100 * 3 / 5 + 50 / 5) * 100,
+                                2)
+        self.assertEqual(actual_output, expected_output)
+
+    def test_calculate_return_linked(self):
+        # Valued at every cash flow, the daily linked return is the time-weighted return
+        actual_output = ModifiedDietzReturnCalculator('daily').calculate_return(
+            self.test_portfolio, annualised=False)
+        expected_output = TimeWeightedReturnCalculator().calculate_return(
+            self.test_portfolio, annualised=False)
+        self.assertEqual(actual_output, expected_output)
+
+        # Over a single period, linking makes no difference
+        self.assertEqual(
+            self.md_calculator.calculate_return(self.test_portfolio),
+            ModifiedDietzReturnCalculator('monthly').calculate_return(self.test_portfolio))
+
+    def test_calculate_return_compacted(self):
+        portfolio = make_portfolio(0)
+        monthly = ModifiedDietzReturnCalculator('monthly')
+        expected = monthly.calculate_return(portfolio, annualised=False)
+
+        # Compacting with checkpoints at least as frequent as the period keeps the
+        # valuations each period's return needs
+        portfolio.compact_history(checkpoints='daily')
+        self.assertEqual(expected, monthly.calculate_return(portfolio, annualised=False))
+        portfolio.compact_history(checkpoints='monthly')
+        self.assertEqual(expected, monthly.calculate_return(portfolio, annualised=False))
+
+        # Without them, linked returns aren't supported
+        portfolio.compact_history(checkpoints='yearly')
+        with self.assertRaises(ValueError):
+            monthly.calculate_return(portfolio, annualised=False)
+        portfolio.compact_history(checkpoints='monthly')
+        with self.assertRaises(ValueError):
+            monthly.calculate_return(portfolio, annualised=False)
+        ModifiedDietzReturnCalculator('yearly').calculate_return(portfolio,
+                                                                 annualised=False)
+
+    def test_calculate_return_zero_length(self):
+        # As for the other calculators, a return over no time can't be annualised
+        portfolio = InvestmentPortfolio()
+        portfolio.deposit(100, date=datetime(2021, 1, 1))
+        portfolio.update_portfolio_value(110, date=datetime(2021, 1, 1, 12))
+        self.assertEqual(10, self.md_calculator.calculate_return(portfolio,
+                                                                 annualised=False))
+        for calculator in (self.md_calculator, ModifiedDietzReturnCalculator('daily'),
+                           TimeWeightedReturnCalculator()):
+            with self.assertRaises(ZeroDivisionError):
+                calculator.calculate_return(portfolio, annualised=True)
+
+    def test_calculate_return_no_capital(self):
+        # Withdrawing 200 half way through leaves no capital invested on average
+        self.test_portfolio.portfolio_history = [
+            {'date': datetime(2021, 1, 1), 'total_deposited': 100,
+             'current_portfolio_value': 100, 'transaction_type': 'deposit'},
+            {'date': datetime(2021, 1, 2), 'total_deposited': -100,
+             'current_portfolio_value': 0, 'transaction_type': 'withdrawal'},
+            {'date': datetime(2021, 1, 3), 'total_deposited': -100,
+             'current_portfolio_value': 0, 'transaction_type': 'update_portfolio_value'},
+        ]
+        with self.assertRaises(ValueError):
+            self.md_calculator.calculate_return(self.test_portfolio, annualised=False)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.risk_metrics import (RiskTracker, batch_risk_metrics,
+                                            calculate_risk_metrics)
+from tests.helpers import make_portfolio
+
+
+class RiskMetricsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.portfolio = InvestmentPortfolio(name='test_portfolio')
+        self.portfolio.deposit(100, date=datetime(2021, 1, 1))
+        self.portfolio.update_portfolio_value(110, date=datetime(2021, 1, 2))
+        self.portfolio.update_portfolio_value(99, date=datetime(2021, 1, 3))
+        self.portfolio.deposit(100, date=datetime(2021, 1, 4))
+        self.portfolio.update_portfolio_value(209, date=datetime(2021, 1, 5))
+
+    def assert_metrics_equal(self, expected, actual):
+        for field in expected._fields:
+            np.testing.assert_allclose(getattr(expected, field), getattr(actual, field),
+                                       rtol=1e-9, err_msg=field)
+
+    def test_calculate_risk_metrics(self):
+        # The deposit isn't a return, so the period returns are +10%, -10% and +5.03%
+        returns = np.array([0.1, -0.1, 209 / 199 - 1])
+        metrics = calculate_risk_metrics(self.portfolio, risk_free_rate=1)
+        self.assertEqual(round(np.std(returns, ddof=1) * 100, 2), metrics.volatility)
+        self.assertEqual(round(np.sqrt(0.01 / 3) * 100, 2), metrics.downside_deviation)
+        self.assertAlmostEqual((returns.mean() - 0.01) / np.std(returns, ddof=1),
+                               metrics.sharpe_ratio)
+        self.assertAlmostEqual(returns.mean() / np.sqrt(0.01 / 3), metrics.sortino_ratio)
+        self.assertEqual(10, metrics.max_drawdown)
+
+        annualised = calculate_risk_metrics(self.portfolio, risk_free_rate=1,
+                                            periods_per_year=4)
+        self.assertAlmostEqual(metrics.sharpe_ratio * 2, annualised.sharpe_ratio)
+        self.assertEqual(10, annualised.max_drawdown)
+
+        # Too few returns for a volatility, and no snapshots for a drawdown
+        single_deposit = InvestmentPortfolio()
+        single_deposit.deposit(100, date=datetime(2021, 1, 1))
+        metrics = calculate_risk_metrics(single_deposit)
+        self.assertTrue(np.isnan(metrics.volatility))
+        self.assertTrue(np.isnan(metrics.sharpe_ratio))
+        self.assertEqual(0, metrics.max_drawdown)
+        self.assertTrue(np.isnan(calculate_risk_metrics(InvestmentPortfolio())
+                                 .max_drawdown))
+
+    def test_batch_risk_metrics(self):
+        portfolios = [make_portfolio(seed) for seed in range(20)]
+        portfolios.insert(3, InvestmentPortfolio())
+        portfolios.insert(7, self.portfolio)
+        metrics = batch_risk_metrics(portfolios, risk_free_rate=0.1,
+                                     minimum_acceptable_return=0.5)
+        for i, portfolio in enumerate(portfolios):
+            # The same as the metrics from the portfolio's cumulative growth
+            history = portfolio.history
+            growth = history.cumulative_growth
+            is_return = np.diff(history.total_deposited) == 0
+            returns = (growth[1:] / growth[:-1] - 1)[is_return]
+            if len(returns) > 1:
+                volatility = np.std(returns, ddof=1)
+                self.assertAlmostEqual(round(volatility * 100, 2),
+                                       metrics.volatility[i])
+                self.assertAlmostEqual((returns.mean() - 0.001) / volatility,
+                                       metrics.sharpe_ratio[i])
+            if len(history):
+                drawdowns = 1 - growth / np.maximum.accumulate(growth)
+                self.assertAlmostEqual(round(drawdowns.max() * 100, 2),
+                                       metrics.max_drawdown[i])
+            self.assert_metrics_equal(
+                calculate_risk_metrics(portfolio, 0.1, 0.5),
+                type(metrics)(*(metric[i] for metric in metrics)))
+
+    def test_risk_tracker(self):
+        portfolio = make_portfolio(0)
+        tracker = RiskTracker(portfolio, risk_free_rate=0.1, periods_per_year=12)
+        self.assert_metrics_equal(calculate_risk_metrics(portfolio, 0.1, 0, 12),
+                                  tracker.metrics)
+
+        # Folds in each new valuation, without recalculating from the start
+        rng = np.random.default_rng(0)
+        date = portfolio.latest_transaction_date
+        for value in rng.uniform(100, 200, 20):
+            date += timedelta(days=1)
+            portfolio.update_portfolio_value(value, date=date)
+            self.assert_metrics_equal(calculate_risk_metrics(portfolio, 0.1, 0, 12),
+                                      tracker.metrics)
+        portfolio.deposit(100, date=date + timedelta(days=1))
+        self.assert_metrics_equal(calculate_risk_metrics(portfolio, 0.1, 0, 12),
+                                  tracker.metrics)
+
+        # Recalculates if the history changes before the latest snapshot
+        portfolio.compact_history()
+        self.assert_metrics_equal(calculate_risk_metrics(portfolio, 0.1, 0, 12),
+                                  tracker.metrics)
+        history = portfolio.history
+        history.append(history.date_at(1), history.total_deposited[1], 1,
+                       'update_portfolio_value')
+        portfolio.history = history
+        self.assert_metrics_equal(calculate_risk_metrics(portfolio, 0.1, 0, 12),
+                                  tracker.metrics)
+
+        empty = RiskTracker(InvestmentPortfolio())
+        self.assertTrue(np.isnan(empty.metrics.max_drawdown))
+
+
+if __name__ == '__main__':
+    unittest.main()
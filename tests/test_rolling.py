@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from portfolio_manager.history import from_epoch, to_epoch
+from portfolio_manager.portfolio import InvestmentPortfolio
+from portfolio_manager.return_calculators import TimeWeightedReturnCalculator
+from portfolio_manager.rolling import ONE_MONTH, ONE_YEAR, RollingReturns
+from tests.helpers import make_portfolio
+
+
+class RollingReturnsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.portfolio = make_portfolio(1)
+        self.rolling = RollingReturns(self.portfolio)
+
+    def windowed_return(self, start: int, end: int) -> float:
+        """ The time-weighted return of snapshots [start, end], one window at a time. """
+        if start == end:
+            return 0
+        window = InvestmentPortfolio(
+            portfolio_history=self.portfolio.portfolio_history[start:end + 1])
+        return TimeWeightedReturnCalculator().calculate_return(window, annualised=False)
+
+    def test_time_weighted_returns(self):
+        dates = self.rolling.dates
+        for window in (ONE_MONTH, timedelta(days=45)):
+            returns = self.rolling.time_weighted_returns(window)
+            self.assertEqual(len(dates), len(returns))
+            for end, date in enumerate(dates):
+                if window == ONE_MONTH:
+                    window_start = from_epoch(date)
+                    month = window_start.month - 1 or 12
+                    year = window_start.year - (month == 12)
+                    try:
+                        window_start = window_start.replace(year=year, month=month)
+                    except ValueError:
+                        window_start = window_start.replace(year=year, month=month + 1,
+                                                            day=1) - timedelta(days=1)
+                else:
+                    window_start = from_epoch(date) - window
+
+                start = np.searchsorted(dates, to_epoch(window_start), side='right') - 1
+                if start < 0:
+                    self.assertTrue(np.isnan(returns[end]))
+                else:
+                    self.assertAlmostEqual(self.windowed_return(start, end),
+                                           returns[end], delta=0.011)
+
+    def test_calendar_months(self):
+        portfolio = InvestmentPortfolio()
+        portfolio.deposit(100, date=datetime(2020, 1, 31))
+        portfolio.update_portfolio_value(110, date=datetime(2020, 2, 29))
+        portfolio.update_portfolio_value(121, date=datetime(2020, 3, 31))
+        portfolio.deposit(100, date=datetime(2021, 1, 31))
+        portfolio.update_portfolio_value(442, date=datetime(2021, 2, 28))
+
+        # One month before 29th February is 29th January, before the first snapshot,
+        # and one month before 31st March is clamped to 29th February
+        rolling = RollingReturns(portfolio)
+        np.testing.assert_array_equal([np.nan, np.nan, 10, 0, 100],
+                                      rolling.time_weighted_returns(ONE_MONTH))
+        np.testing.assert_array_equal([np.nan, np.nan, np.nan, 21, 142],
+                                      rolling.time_weighted_returns(ONE_YEAR))
+
+        # A two-month window annualised over a sixth of a year
+        np.testing.assert_array_equal(
+            [np.nan, np.nan, 213.84, 0, 6300],
+            rolling.time_weighted_returns(2, annualised=True))
+
+    def test_empty(self):
+        rolling = RollingReturns(InvestmentPortfolio())
+        self.assertEqual(0, len(rolling.time_weighted_returns(ONE_YEAR)))
+
+
+if __name__ == "__main__":
+    unittest.main()
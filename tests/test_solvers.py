@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+
+from portfolio_manager.solvers import xirr
+
+
+class XirrTests(unittest.TestCase):
+    def test_single_payment(self):
+        # A single payment in and out reduces to the compound growth rate
+        self.assertAlmostEqual(0.1, xirr([-100, 110], [0, 1]))
+        self.assertAlmostEqual(0.1, xirr([-100, 121], [0, 2]))
+        self.assertAlmostEqual(-0.5, xirr([-100, 50], [3, 4]))
+
+    def test_irregular_payments(self):
+        cash_flows = [-1000, -500, 200, 1500]
+        times = [0, 0.25, 1.1, 2.5]
+        rate = xirr(cash_flows, times)
+        npv = sum(cash_flow / (1 + rate) ** time
+                  for cash_flow, time in zip(cash_flows, times))
+        self.assertAlmostEqual(0, npv, places=8)
+
+    def test_equally_spaced_payments(self):
+        # Regularly spaced cash flows give the usual internal rate of return
+        rate = xirr([-50, 2, 67], [0, 1, 2])
+        self.assertAlmostEqual(0, -50 + 2 / (1 + rate) + 67 / (1 + rate) ** 2)
+
+    def test_no_rate(self):
+        # Cash flows all of the same sign, or all at the same time, have no rate
+        self.assertTrue(np.isnan(xirr([100, 110], [0, 1])))
+        self.assertTrue(np.isnan(xirr([-100, 110], [1, 1])))
+
+    def test_many_series(self):
+        # Series are solved together and returned in order
+        cash_flows = [-100, 110, -100, 121, -100, 50, 100, 110]
+        offsets = [0, 2, 4, 6]
+        times = [0, 1, 0, 2, 3, 4, 0, 1]
+        expected = [0.1, 0.1, -0.5, np.nan]
+        np.testing.assert_allclose(expected, xirr(cash_flows, times, offsets))
+
+        # Every series must have at least one cash flow
+        with self.assertRaises(ValueError):
+            xirr(cash_flows, times, [0, 2, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from portfolio_manager.portfolio import InvestmentPortfolio, load_portfolio
+from portfolio_manager.storage import SQLiteStorage
+from tests.helpers import make_portfolio
+
+
+class SQLiteStorageTests(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'portfolios.db')
+        self.storage = SQLiteStorage(self.path, pool_size=2)
+        self.addCleanup(self.storage.close)
+
+        self.portfolio = make_portfolio(3)
+        self.portfolio.name = 'sqlite'
+
+    def count_snapshots(self) -> int:
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0]
+
+    def assert_portfolios_equal(self, expected: InvestmentPortfolio,
+                                actual: InvestmentPortfolio):
+        self.assertEqual(expected.name, actual.name)
+        self.assertEqual(expected.portfolio_history, actual.portfolio_history)
+        self.assertEqual(expected.total_deposited, actual.total_deposited)
+        self.assertEqual(expected.current_portfolio_value,
+                         actual.current_portfolio_value)
+        self.assertEqual(expected.latest_transaction_date,
+                         actual.latest_transaction_date)
+        self.assertEqual(expected.history.time_weighted_growth,
+                         actual.history.time_weighted_growth)
+
+    def test_save_and_load(self):
+        self.portfolio.save_portfolio(storage=self.storage)
+        loaded = load_portfolio('sqlite', storage=self.storage)
+        self.assert_portfolios_equal(self.portfolio, loaded)
+
+        with sqlite3.connect(self.path) as connection:
+            self.assertEqual('wal', connection.execute(
+                'PRAGMA journal_mode').fetchone()[0])
+
+        with self.assertRaises(KeyError):
+            self.storage.load('missing')
+
+    def test_append(self):
+        self.storage.save(self.portfolio)
+        n_snapshots = len(self.portfolio.history)
+
+        # Saving again only inserts the new snapshots
+        date = self.portfolio.latest_transaction_date.replace(year=2030)
+        self.portfolio.update_portfolio_value(500, date=date)
+        self.storage.save(self.portfolio)
+        self.assertEqual(n_snapshots + 1, self.count_snapshots())
+        self.assert_portfolios_equal(self.portfolio, self.storage.load('sqlite'))
+
+        # The loaded portfolio can be appended to and saved in turn
+        loaded = self.storage.load('sqlite')
+        loaded.withdraw(100, date=date.replace(year=2031))
+        self.storage.save(loaded)
+        self.assertEqual(n_snapshots + 2, self.count_snapshots())
+        self.assert_portfolios_equal(loaded, self.storage.load('sqlite'))
+
+    def test_rewrite(self):
+        self.storage.save(self.portfolio)
+
+        # Replacing the history rewrites the saved snapshots
+        self.portfolio.portfolio_history = self.portfolio.portfolio_history[:-3]
+        self.storage.save(self.portfolio)
+        self.assertEqual(len(self.portfolio.history), self.count_snapshots())
+        self.assert_portfolios_equal(self.portfolio, self.storage.load('sqlite'))
+
+    def test_save_many(self):
+        portfolios = [make_portfolio(seed) for seed in range(10)]
+        for i, portfolio in enumerate(portfolios):
+            portfolio.name = f'portfolio_{i}'
+        self.storage.save_many(portfolios)
+
+        self.assertEqual([f'portfolio_{i}' for i in range(10)],
+                         self.storage.list_portfolios())
+        self.assert_portfolios_equal(portfolios[4], self.storage.load('portfolio_4'))
+
+        self.storage.delete('portfolio_4')
+        self.assertNotIn('portfolio_4', self.storage.list_portfolios())
+        self.assertEqual(sum(len(portfolio.history) for portfolio in portfolios)
+                         - len(portfolios[4].history), self.count_snapshots())
+
+    def test_threads(self):
+        def save(i: int):
+            portfolio = InvestmentPortfolio(name=f'thread_{i}')
+            for day in range(1, 11):
+                portfolio.deposit(100, date=datetime(2021, 1, day))
+                self.storage.save(portfolio)
+
+        threads = [threading.Thread(target=save, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(4, len(self.storage.list_portfolios()))
+        self.assertEqual(40, self.count_snapshots())
+        self.assertLessEqual(self.storage._n_connections, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()